@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+from Prism_NextCloudLinks_Client import NextcloudError
+from Prism_NextCloudLinks_Decoder import iter_ocs_records
+from Prism_NextCloudLinks_Shares import normalize_share, is_public_share, path_in_root
+
+
+# Actividad de la app de compartir (crear, borrar, caducar enlaces)
+ACTIVITY_ENDPOINT = "/ocs/v2.php/apps/activity/api/v2/activity/files_sharing"
+ACTIVITY_PAGE_SIZE = 200
+MAX_ACTIVITY_PAGES = 5
+# Con más rutas cambiadas sale más barato descargar el listado entero
+MAX_DELTA_PATHS = 200
+# Cada cuánto se recarga todo aunque haya feed: cubre lo que la actividad no
+# registra (cambios de caducidad, ficheros borrados o movidos)
+FULL_RELOAD_SECONDS = 3600
+
+
+class ActivityUnavailable(NextcloudError):
+    # La app de actividad no está instalada o no responde
+    pass
+
+
+class ActivityGap(NextcloudError):
+    # El feed no cubre todo lo ocurrido desde la última sincronización
+    pass
+
+
+def _activity_page(client, since, limit, sort="asc"):
+    # (código HTTP, actividades, cabeceras)
+    params = {"format": "json", "since": since, "limit": limit, "sort": sort}
+    response = client.get(ACTIVITY_ENDPOINT, params=params, timeout=20, stream=True)
+    if response.status_code != 200:
+        response.close()
+        return response.status_code, [], response.headers
+    return 200, list(iter_ocs_records(response)), response.headers
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def latest_activity_id(client):
+    # Marca de agua actual del feed (0 si está vacío). Se pide antes del
+    # listado completo, así lo que pase mientras se descarga entra en el siguiente delta
+    status, activities, headers = _activity_page(client, 0, 1, sort="desc")
+    if status == 304:
+        return 0
+    if status != 200:
+        raise ActivityUnavailable(f"Activity feed not available: HTTP {status}")
+    if activities:
+        return int(activities[0].get("activity_id") or 0)
+    return _header_int(headers, "X-Activity-Last-Given") or 0
+
+
+def changed_paths(client, since, root, page_size=ACTIVITY_PAGE_SIZE, max_pages=MAX_ACTIVITY_PAGES):
+    # (rutas dentro de `root` con actividad de enlaces desde `since`, nueva marca).
+    # Lanza ActivityGap si el feed ya no tiene todo lo ocurrido desde `since`
+    # o si hay tantos cambios que conviene recargar entero.
+    paths = set()
+    for page in range(max_pages):
+        status, activities, headers = _activity_page(client, since, page_size)
+        if status == 304:
+            return paths, since
+        if status != 200:
+            raise ActivityUnavailable(f"Activity feed not available: HTTP {status}")
+
+        first_known = _header_int(headers, "X-Activity-First-Known")
+        if page == 0 and since and first_known is not None and first_known > since:
+            # La última actividad vista ya no está: el servidor ha borrado la
+            # antigua y puede faltar parte de lo ocurrido desde entonces
+            raise ActivityGap(f"Activity feed starts at {first_known}, last sync was {since}")
+
+        for activity in activities:
+            since = max(since, int(activity.get("activity_id") or 0))
+            for path in _activity_paths(activity):
+                if path_in_root(path, root):
+                    paths.add(path)
+        since = max(since, _header_int(headers, "X-Activity-Last-Given") or 0)
+
+        if len(paths) > MAX_DELTA_PATHS:
+            raise ActivityGap(f"{len(paths)} changed paths")
+        if len(activities) < page_size:
+            return paths, since
+
+    raise ActivityGap(f"More than {max_pages * page_size} activities since {since}")
+
+
+def _activity_paths(activity):
+    # Rutas de la actividad (relativas a la raíz del usuario, como las de los shares)
+    paths = set()
+    if activity.get("object_name"):
+        paths.add("/" + activity["object_name"].strip("/"))
+    objects = activity.get("objects")
+    if isinstance(objects, dict):
+        paths.update("/" + name.strip("/") for name in objects.values() if isinstance(name, str) and name)
+    return paths
+
+
+def fetch_path_shares(client, paths, max_workers=None):
+    # {ruta: shares públicos actuales} pidiendo cada ruta en paralelo
+    def fetch(path):
+        response = client.get_shares(path, reshares=False)
+        if response.status_code == 404:
+            # Fichero borrado o movido: ya no tiene enlaces
+            response.close()
+            return path, []
+        if response.status_code != 200:
+            raise NextcloudError(f"Error getting shares of {path}: HTTP {response.status_code}\n{response.text[:200]}")
+        return path, [normalize_share(s) for s in iter_ocs_records(response) if is_public_share(s)]
+
+    if not paths:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers or client.pool_maxsize, len(paths))) as pool:
+        return dict(pool.map(fetch, sorted(paths)))
+
+
+def apply_path_changes(shares, changes):
+    # Sustituye en `shares` los de cada ruta de `changes` por su lista actual
+    kept = [share for share in shares if share['path'] not in changes]
+    return kept + [share for path_shares in changes.values() for share in path_shares]
+
+
+def delta_refresh(client, shares, root, since):
+    # (shares actualizados, nueva marca, rutas cambiadas). Unas pocas
+    # peticiones pequeñas en vez del listado completo; ActivityGap o
+    # ActivityUnavailable si hay que recargar entero.
+    paths, since = changed_paths(client, since, root)
+    if not paths:
+        return shares, since, 0
+    return apply_path_changes(shares, fetch_path_shares(client, paths)), since, len(paths)
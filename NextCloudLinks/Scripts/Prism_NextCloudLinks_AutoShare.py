@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import fnmatch
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from Prism_NextCloudLinks_Health import backoff_delay
+
+
+EVENT_RENDER = "render"
+EVENT_PLAYBLAST = "playblast"
+EVENT_EXPORT = "export"
+AUTO_SHARE_EVENTS = (EVENT_RENDER, EVENT_PLAYBLAST, EVENT_EXPORT)
+
+TARGET_FOLDER = "folder"
+TARGET_FILE = "file"
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+QUEUE_FILENAME = "NextcloudAutoShare.db"
+QUEUE_SCHEMA_VERSION = 2
+MAX_ATTEMPTS = 20
+# Reserva de un trabajo "running": el proceso que lo tiene la renueva mientras
+# sigue vivo; si caduca, el proceso se cerró y el trabajo vuelve a la cola
+LEASE_SECONDS = 120
+LEASE_RENEW_SECONDS = 30
+# Los trabajos terminados se guardan un mes para el diálogo y después se borran
+FINISHED_RETENTION_SECONDS = 30 * 24 * 3600
+PURGE_INTERVAL_SECONDS = 3600
+DEFAULT_BATCH_SIZE = 100
+# Espera tras el primer aviso para juntar en un lote las salidas de una ráfaga
+BATCH_WINDOW_SECONDS = 2.0
+RULE_FIELD_SEPARATOR = "|"
+
+# "####", "%04d", "$F4", "<frame>"... en las rutas de salida de render
+FRAME_PATTERN = re.compile(r"#+|%0?\d*d|\$F\d*|<frame>|@+", re.IGNORECASE)
+
+
+def parse_auto_share_rules(text):
+    # Una regla por línea: "eventos | patrón de ruta | permisos | duración | folder/file"
+    # p. ej. "render,playblast | */Playblasts/* | ONLY READ | 1 MONTH | folder"
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        fields = [field.strip() for field in line.split(RULE_FIELD_SEPARATOR)]
+        fields += [""] * (5 - len(fields))
+        events = [event.strip().lower() for event in fields[0].split(',')]
+        events = [event for event in events if event in AUTO_SHARE_EVENTS]
+        if not events:
+            continue
+
+        rules.append({
+            "events": events,
+            "pattern": fields[1] or "*",
+            "permissions": fields[2] or "ONLY READ",
+            "expiry": fields[3] or "1 MONTH",
+            "target": TARGET_FILE if fields[4].lower() == TARGET_FILE else TARGET_FOLDER
+        })
+
+    return rules
+
+
+def format_auto_share_rules(rules):
+    return "\n".join(
+        f" {RULE_FIELD_SEPARATOR} ".join([
+            ",".join(rule["events"]), rule["pattern"], rule["permissions"], rule["expiry"], rule["target"]
+        ]) for rule in rules
+    )
+
+
+def match_auto_share_rule(rules, event, local_path):
+    # Primera regla del evento cuyo patrón (glob, sin distinguir mayúsculas) cubre la ruta
+    normalized = local_path.replace('\\', '/').lower()
+    for rule in rules:
+        if event in rule["events"] and fnmatch.fnmatchcase(normalized, rule["pattern"].replace('\\', '/').lower()):
+            return rule
+    return None
+
+
+def callback_output_paths(kwargs):
+    # Rutas de salida de los callbacks postRender/postPlayblast/postExport de Prism
+    values = [kwargs.get(key) for key in ("outputpath", "outputPath", "outputName")]
+    settings = kwargs.get("settings")
+    if isinstance(settings, dict):
+        values.append(settings.get("outputName"))
+
+    paths = []
+    for value in values:
+        for path in value if isinstance(value, (list, tuple)) else [value]:
+            if isinstance(path, str) and path and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def share_target(local_path, rule):
+    # Lo que se comparte: la carpeta de la versión, o el fichero si la regla lo
+    # pide y la ruta no es una secuencia con marcador de frame
+    if os.path.isdir(local_path):
+        return local_path
+    if rule["target"] == TARGET_FILE and not FRAME_PATTERN.search(os.path.basename(local_path)):
+        return local_path
+    return os.path.dirname(local_path)
+
+
+def retry_delay(attempts):
+    # Reintentos espaciados hasta media hora: la red o el cliente de sincronización tardan en volver
+    return max(5.0, backoff_delay(attempts, base=15.0, cap=1800.0))
+
+
+class ShareJobQueue(object):
+    # Cola de enlaces pendientes en SQLite, para que sobreviva a cierres de
+    # Prism y cortes de red. Un trabajo igual a otro todavía pendiente no se
+    # duplica. Varios procesos (Prism y los DCC) pueden usar el mismo fichero:
+    # cada lote se reserva con un identificador propio.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 1:
+                # Sin perder lo pendiente de la versión anterior
+                conn.executescript(f"""
+                    ALTER TABLE jobs ADD COLUMN remote_root TEXT;
+                    ALTER TABLE jobs ADD COLUMN lease_until REAL;
+                    PRAGMA user_version = {QUEUE_SCHEMA_VERSION};
+                """)
+            elif version != QUEUE_SCHEMA_VERSION:
+                conn.executescript(f"""
+                    DROP TABLE IF EXISTS jobs;
+                    CREATE TABLE jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        local_path TEXT, nc_path TEXT, permissions TEXT, expiry TEXT, event TEXT,
+                        state TEXT, attempts INTEGER DEFAULT 0, next_attempt REAL, owner TEXT,
+                        url TEXT, error TEXT, created REAL, updated REAL, remote_root TEXT, lease_until REAL
+                    );
+                    CREATE UNIQUE INDEX jobs_pending ON jobs (nc_path, permissions, expiry)
+                        WHERE state IN ('{JOB_PENDING}', '{JOB_RUNNING}');
+                    CREATE INDEX jobs_due ON jobs (state, next_attempt);
+                    PRAGMA user_version = {QUEUE_SCHEMA_VERSION};
+                """)
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, jobs):
+        # jobs: [{local_path, nc_path, permissions, expiry, event, remote_root}]. Devuelve cuántos son nuevos
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (local_path, nc_path, permissions, expiry, event, remote_root, "
+                    "state, next_attempt, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(job["local_path"], job["nc_path"], job["permissions"], job["expiry"], job["event"],
+                      job.get("remote_root"), JOB_PENDING, now, now, now) for job in jobs]
+                )
+                return conn.total_changes - before
+
+    def claim(self, limit=DEFAULT_BATCH_SIZE):
+        # Reserva hasta `limit` trabajos vencidos para este proceso durante
+        # LEASE_SECONDS; renew_leases la alarga mientras se procesan
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # Lo que dejó a medias un proceso que ya no renueva su reserva vuelve a la cola
+                conn.execute(
+                    "UPDATE jobs SET state=?, owner=NULL WHERE state=? AND (lease_until IS NULL OR lease_until<?)",
+                    (JOB_PENDING, JOB_RUNNING, now)
+                )
+                conn.execute(
+                    "UPDATE jobs SET state=?, owner=?, lease_until=?, updated=? WHERE id IN ("
+                    "SELECT id FROM jobs WHERE state=? AND next_attempt<=? ORDER BY id LIMIT ?)",
+                    (JOB_RUNNING, self.owner, now + LEASE_SECONDS, now, JOB_PENDING, now, limit)
+                )
+                rows = conn.execute(
+                    "SELECT id, local_path, nc_path, permissions, expiry, event, remote_root, attempts FROM jobs "
+                    "WHERE state=? AND owner=? ORDER BY id", (JOB_RUNNING, self.owner)
+                ).fetchall()
+
+        fields = ("id", "local_path", "nc_path", "permissions", "expiry", "event", "remote_root", "attempts")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def renew_leases(self):
+        # Alarga la reserva de los trabajos que este proceso tiene en curso
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(
+                    "UPDATE jobs SET lease_until=? WHERE state=? AND owner=?",
+                    (time.time() + LEASE_SECONDS, JOB_RUNNING, self.owner)
+                ).rowcount
+
+    def finish(self, results):
+        # results: [(trabajo, url, error)]. Con error se reintenta más tarde hasta MAX_ATTEMPTS
+        now = time.time()
+        updates = []
+        for job, url, error in results:
+            attempts = job["attempts"] + (1 if error else 0)
+            if not error:
+                state = JOB_DONE
+            elif attempts >= MAX_ATTEMPTS:
+                state = JOB_FAILED
+            else:
+                state = JOB_PENDING
+            updates.append((state, attempts, now + retry_delay(attempts) if error else now,
+                            url or None, error or None, now, job["id"], self.owner))
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # Solo los que siguen reservados por este proceso
+                conn.executemany(
+                    "UPDATE jobs SET state=?, attempts=?, next_attempt=?, url=?, error=?, updated=?, "
+                    "lease_until=NULL WHERE id=? AND owner=?",
+                    updates
+                )
+
+    def next_due(self):
+        # Momento del próximo trabajo pendiente, o None si la cola está vacía
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT MIN(next_attempt) FROM jobs WHERE state=?", (JOB_PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def has_pending(self):
+        # True si queda algo por hacer (pendiente o a medias de otra sesión)
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM jobs WHERE state IN (?, ?) LIMIT 1", (JOB_PENDING, JOB_RUNNING)
+            ).fetchone()
+        return row is not None
+
+    def purge_finished(self, older_than=FINISHED_RETENTION_SECONDS):
+        # Borra los trabajos hechos o fallidos que llevan más de `older_than` segundos terminados
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(
+                    "DELETE FROM jobs WHERE state IN (?, ?) AND updated<?",
+                    (JOB_DONE, JOB_FAILED, time.time() - older_than)
+                ).rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def recent(self, limit=500):
+        fields = ("id", "local_path", "nc_path", "event", "state", "attempts", "url", "error", "updated")
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT {', '.join(fields)} FROM jobs ORDER BY updated DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(zip(fields, row)) for row in rows]
+
+    def retry_failed(self):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(
+                    "UPDATE OR IGNORE jobs SET state=?, attempts=0, next_attempt=?, updated=? WHERE state=?",
+                    (JOB_PENDING, now, now, JOB_FAILED)
+                ).rowcount
+
+    def clear_finished(self):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(
+                    "DELETE FROM jobs WHERE state IN (?, ?)", (JOB_DONE, JOB_FAILED)
+                ).rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class AutoShareWorker(object):
+    # Hilo que vacía la cola por lotes. `process_batch(trabajos)` devuelve
+    # [(trabajo, url, error)]; lo que falla vuelve a la cola con espera creciente.
+    def __init__(self, queue, process_batch, batch_size=DEFAULT_BATCH_SIZE, batch_window=BATCH_WINDOW_SECONDS):
+        self.queue = queue
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.on_batch = None
+        self._wake = threading.Event()
+        self._flush = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lease_thread = None
+        self._unfinished = None
+        self._purged_at = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="NextcloudAutoShare", daemon=True)
+        self._thread.start()
+        if not (self._lease_thread and self._lease_thread.is_alive()):
+            self._lease_thread = threading.Thread(target=self._renew_leases, name="NextcloudAutoShareLease", daemon=True)
+            self._lease_thread.start()
+
+    def wake(self, flush=False):
+        # flush=True cuando termina una publicación: no hace falta esperar la ventana del lote
+        if flush:
+            self._flush.set()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        # Ningún error para el hilo: con la base de datos bloqueada por otro
+        # proceso (o el disco lleno) se espera cada vez más y se sigue
+        errors = 0
+        while not self._stop.is_set():
+            try:
+                self._step()
+                errors = 0
+            except Exception as e:
+                errors += 1
+                print(f"NextCloudLinks: error en la cola de enlaces: {str(e)}")
+                self._stop.wait(max(1.0, backoff_delay(errors, base=1.0, cap=60.0)))
+
+    def _renew_leases(self):
+        # Mientras el proceso vive, otro no puede quitarle un lote aunque tarde
+        # (subidas grandes, servidor lento)
+        while not self._stop.wait(LEASE_RENEW_SECONDS):
+            try:
+                self.queue.renew_leases()
+            except Exception as e:
+                print(f"NextCloudLinks: no se pudo renovar la reserva de la cola de enlaces: {str(e)}")
+
+    def _step(self):
+        if self._unfinished:
+            # Lote ya compartido cuyo resultado no se pudo guardar: se guarda
+            # antes de reservar otro, así no se pierden las URLs
+            results = self._unfinished
+            self.queue.finish(results)
+            self._unfinished = None
+            if self.on_batch:
+                self.on_batch(results)
+            return
+
+        jobs = self.queue.claim(self.batch_size)
+        if jobs:
+            try:
+                results = self.process_batch(jobs)
+            except Exception as e:
+                results = [(job, "", str(e)) for job in jobs]
+            self._unfinished = results
+            return
+
+        if self._purged_at is None or time.monotonic() - self._purged_at >= PURGE_INTERVAL_SECONDS:
+            # Con la cola vacía: que la tabla no crezca sin límite
+            self._purged_at = time.monotonic()
+            self.queue.purge_finished()
+
+        next_due = self.queue.next_due()
+        timeout = 60.0 if next_due is None else min(60.0, max(0.5, next_due - time.time()))
+        if self._wake.wait(timeout) and not self._flush.is_set():
+            # Juntar el resto de la ráfaga antes de reservar el lote
+            self._flush.wait(self.batch_window)
+        self._wake.clear()
+        self._flush.clear()
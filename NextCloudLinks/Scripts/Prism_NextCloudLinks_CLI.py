@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+# Enlaces públicos desde la línea de comandos, sin Prism ni Qt (granja, scripts
+# de post-render). Ejemplos:
+#
+#   python Prism_NextCloudLinks_CLI.py --prefs Prism.json --project P:/proyectos/show "P:/proyectos/show/**/*.mp4"
+#   find renders -name "*.exr" | python Prism_NextCloudLinks_CLI.py --map "/mnt/proj -> /PROYECTOS" --format csv -
+
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+from Prism_NextCloudLinks_Client import NextcloudOCSClient, NextcloudError
+from Prism_NextCloudLinks_Engine import ShareEngine, load_user_prefs, STATUS_ERROR
+from Prism_NextCloudLinks_PathMap import PathMapper, project_rules, parse_rules
+from Prism_NextCloudLinks_Shares import PERMISSION_PRESETS, EXPIRY_PRESETS, expire_date_for
+from Prism_NextCloudLinks_Upload import DEFAULT_CHUNK_SIZE
+
+
+RESULT_FIELDS = ("path", "remote", "url", "status", "error")
+PROJECT_CONFIG = os.path.join("00_Pipeline", "pipeline.json")
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Create or reuse Nextcloud public links for local paths and print them as JSON or CSV."
+    )
+    parser.add_argument("paths", nargs="*",
+                        help="Local paths or glob patterns ('**' is recursive). '-' or no paths reads one path per line from stdin.")
+    parser.add_argument("--permissions", default="ONLY READ", choices=list(PERMISSION_PRESETS))
+    parser.add_argument("--expiry", default="1 MONTH", choices=list(EXPIRY_PRESETS))
+    parser.add_argument("--format", default="json", choices=("json", "csv"))
+    parser.add_argument("--prefs", default=os.environ.get("PRISM_NEXTCLOUD_PREFS"),
+                        help="Prism user preferences json with the saved Nextcloud credentials and settings.")
+    parser.add_argument("--url", default=os.environ.get("NEXTCLOUD_URL"))
+    parser.add_argument("--user", default=os.environ.get("NEXTCLOUD_USER"))
+    parser.add_argument("--password", default=os.environ.get("NEXTCLOUD_PASSWORD"),
+                        help="Defaults to $NEXTCLOUD_PASSWORD; avoid passing it on the command line.")
+    parser.add_argument("--project", help="Prism project folder: uses its path mappings and the default /PROYECTOS rule.")
+    parser.add_argument("--map", action="append", default=[], metavar="'LOCAL -> REMOTE'",
+                        help="Extra path mapping rule. Can be repeated.")
+    parser.add_argument("--mappings", metavar="FILE", help="File with one 'local -> remote' rule per line.")
+    parser.add_argument("--upload", action="store_true", help="Upload missing files before sharing.")
+    parser.add_argument("--verify", action="store_true", help="Compare the server copy with the local files before sharing.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests (default 8).")
+    return parser
+
+
+def expand_paths(patterns, stdin=None):
+    # Rutas de los argumentos (con globs) o de stdin, sin repetir y en orden
+    if not patterns or patterns == ["-"]:
+        patterns = [line.strip() for line in (stdin or sys.stdin) if line.strip()]
+
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def load_project_rules(project_path):
+    # Reglas "nextcloud/path_mappings" de la configuración del proyecto (si es json)
+    config_file = os.path.join(project_path, PROJECT_CONFIG)
+    if not os.path.exists(config_file):
+        return []
+
+    with open(config_file, 'r') as f:
+        rules = json.load(f).get("nextcloud", {}).get("path_mappings") or []
+    return [rule for rule in rules if rule.get("local") and rule.get("remote")]
+
+
+def build_mapper(args):
+    rules = [rule for text in args.map for rule in parse_rules(text)]
+    if args.mappings:
+        with open(args.mappings, 'r') as f:
+            rules += parse_rules(f.read())
+    if args.project:
+        rules = project_rules(rules + load_project_rules(args.project), args.project)
+    return PathMapper(rules)
+
+
+def write_results(results, output_format, stream):
+    if output_format == "csv":
+        writer = csv.DictWriter(stream, fieldnames=RESULT_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(results)
+    else:
+        json.dump(results, stream, indent=2, ensure_ascii=False)
+        stream.write("\n")
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    args = build_parser().parse_args(argv)
+
+    credentials, settings = ("", "", ""), {}
+    try:
+        if args.prefs:
+            credentials, settings = load_user_prefs(args.prefs)
+        user = args.user or credentials[0]
+        password = args.password or credentials[1]
+        url = args.url or credentials[2]
+        if not all([url, user, password]):
+            raise NextcloudError("Nextcloud url, user and password are required (--prefs, arguments or NEXTCLOUD_* variables)")
+
+        mapper = build_mapper(args)
+        if not mapper.rules:
+            raise NextcloudError("No path mapping rules: use --project, --map or --mappings")
+
+        paths = expand_paths(args.paths, stdin)
+    except (OSError, ValueError, NextcloudError) as e:
+        print(f"error: {str(e)}", file=stderr)
+        return EXIT_USAGE
+
+    workers = max(1, args.workers)
+    client = NextcloudOCSClient(url, user, password, pool_maxsize=workers)
+    chunk_size = settings.get("upload_chunk_mb", DEFAULT_CHUNK_SIZE // (1024 * 1024)) * 1024 * 1024
+    try:
+        engine = ShareEngine(client, mapper, chunk_size=chunk_size)
+        results = engine.share_paths(
+            paths, PERMISSION_PRESETS[args.permissions], expire_date_for(args.expiry),
+            upload=args.upload, verify=args.verify, max_workers=workers
+        )
+    finally:
+        client.close()
+
+    write_results(results, args.format, stdout)
+    failed = sum(1 for result in results if result["status"] == STATUS_ERROR)
+    print(f"{len(results) - failed} links, {failed} errors", file=stderr)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+
+from Prism_NextCloudLinks_Health import ConnectionHealth, backoff_delay
+from Prism_NextCloudLinks_WebDAV import DAV_FILES_ROOT, DAV_UPLOADS_ROOT, PROPFIND_BODY, parse_multistatus
+
+
+OCS_SHARES_ENDPOINT = "/ocs/v2.php/apps/files_sharing/api/v1/shares"
+STATUS_ENDPOINT = "/status.php"
+# Solo se reintentan las peticiones que no cambian nada en el servidor
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PROPFIND")
+RETRY_STATUS = (502, 503, 504)
+
+
+class NextcloudError(Exception):
+    pass
+
+
+class NextcloudAPIError(NextcloudError):
+    # El servidor respondió con un error HTTP/OCS
+    pass
+
+
+class NextcloudScopeRejected(NextcloudError):
+    # El servidor no acepta la consulta de shares limitada a una carpeta
+    pass
+
+
+class NextcloudUnavailable(NextcloudError):
+    # Circuito abierto: el servidor no responde y no se intenta hasta que vuelva
+    pass
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    # Las llamadas simultáneas con la misma clave (endpoint, consulta) comparten
+    # una sola ejecución: la primera hace la petición y las demás esperan su
+    # resultado ya decodificado (o su excepción).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        # (resultado, True si se ha reutilizado una llamada en curso)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.result, False
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+
+class NextcloudOCSClient(object):
+    # Cliente OCS reutilizable: una sola requests.Session con pool de
+    # conexiones keep-alive, auth y cabeceras compartidas por todas las llamadas.
+    def __init__(self, url, user, password, pool_maxsize=8, timeout=20, metrics=None,
+                 retries=2, probe_interval=5.0):
+        # requests se importa al crear el primer cliente, no al cargar el plugin
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url.rstrip('/')
+        self.user = user
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.metrics = metrics
+        self.retries = retries
+        self.probe_interval = probe_interval
+        self._network_errors = (requests.ConnectionError, requests.Timeout)
+        self._connect_errors = requests.ConnectionError
+
+        self.health = ConnectionHealth()
+        self.health.on_open = self._start_probe
+        self._probe_thread = None
+        self._probe_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        self.session.headers.update({
+            "OCS-APIRequest": "true",
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip"
+        })
+
+        # Un único host: limitar el pool por host y bloquear en vez de abrir
+        # conexiones extra cuando todas están ocupadas
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def matches(self, url, user, password):
+        return (self.url, self.user, self.session.auth) == (url.rstrip('/'), user, (user, password))
+
+    @staticmethod
+    def operation_name(method, path, params=None):
+        # Nombre estable para las métricas: "GET shares?subfiles", "DELETE shares/{id}"...
+        if path.startswith(DAV_FILES_ROOT):
+            return f"{method} dav/files"
+        if path.startswith(DAV_UPLOADS_ROOT):
+            return f"{method} dav/uploads" + ("/.file" if path.endswith("/.file") else "")
+        name = path.replace(OCS_SHARES_ENDPOINT, "shares")
+        name = re.sub(r"/\d+$", "/{id}", name)
+        if params and params.get("path"):
+            name += "?subfiles" if params.get("subfiles") else "?path"
+        return f"{method} {name}"
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.count(name)
+
+    def request(self, method, path, timeout=None, retries=None, adaptive=True, breaker=True, **kwargs):
+        # `timeout` es el tiempo total de la llamada, reintentos incluidos; cada
+        # intento usa la latencia aprendida (adaptive=False para operaciones de
+        # duración muy variable). Las peticiones idempotentes se reintentan con
+        # backoff y jitter si falla la conexión, si una respuesta tarda más de lo
+        # normal o si el servidor responde 502/503/504, mientras quede tiempo;
+        # `retries` fuerza el número de reintentos para las que el llamador sabe
+        # que se pueden repetir. Un fallo de conexión cuenta para el circuito; si
+        # se agota el tiempo total sin respuesta el circuito se abre al momento
+        # (breaker=False para transferencias de datos, cuyo fallo depende más de
+        # la red local que del servidor).
+        op = self.operation_name(method, path, kwargs.get("params"))
+        attempts = 1
+        if retries is not None:
+            attempts += retries
+        elif method in IDEMPOTENT_METHODS:
+            attempts += self.retries
+
+        budget = timeout or self.timeout
+        deadline = time.monotonic() + budget
+        # Sin reintentos no tiene sentido cortar antes: el intento usa todo el tiempo
+        learned = self.health.timeout(op, budget) if adaptive and attempts > 1 else budget
+        for attempt in range(attempts):
+            if attempt:
+                self._count("health.retries")
+                time.sleep(min(backoff_delay(attempt), max(0.0, deadline - time.monotonic() - self.health.min_timeout)))
+
+            allowed, retry_in = self.health.allow_request()
+            if not allowed:
+                self._count("health.fail_fast")
+                raise NextcloudUnavailable(
+                    f"Servidor de Nextcloud no disponible ({self.health.last_error}).\n"
+                    f"Se volverá a intentar en {retry_in:.0f} s."
+                )
+
+            remaining = deadline - time.monotonic()
+            last_attempt = attempt + 1 >= attempts
+            request_timeout = min(learned, remaining)
+            if last_attempt or remaining - request_timeout < self.health.min_timeout:
+                # Lo que queda no da para otro intento lento: este espera hasta el final
+                request_timeout = remaining
+
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, self.url + path, timeout=request_timeout, **kwargs)
+            except self._network_errors as e:
+                if self.metrics is not None:
+                    self.metrics.record_request(op, 0, (time.perf_counter() - started) * 1000, error=type(e).__name__)
+                if isinstance(e, self._connect_errors):
+                    # Sin conexión: cada intento fallido cuenta
+                    if breaker:
+                        self.health.record_failure(type(e).__name__)
+                    else:
+                        self.health.end_trial()
+                    if last_attempt or deadline - time.monotonic() < self.health.min_timeout:
+                        raise
+                    continue
+                if request_timeout >= remaining:
+                    # Ninguna respuesta en todo el tiempo de la llamada: servidor caído
+                    if breaker:
+                        self.health.record_failure(type(e).__name__, trip=True)
+                    else:
+                        self.health.end_trial()
+                    raise
+                # Un timeout con la latencia aprendida solo dice que esta
+                # respuesta es lenta: se reintenta con el tiempo que queda
+                self.health.end_trial()
+                learned = budget
+                continue
+            except Exception:
+                # Error local (URL mal formada...): no dice nada del servidor
+                self.health.end_trial()
+                raise
+
+            headers_done = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.record_request(op, response.status_code, (headers_done - started) * 1000)
+            if response.status_code in RETRY_STATUS:
+                if not last_attempt and deadline - time.monotonic() >= self.health.min_timeout:
+                    self.health.end_trial()
+                    response.close()
+                    continue
+                if breaker:
+                    self.health.record_failure(f"HTTP {response.status_code}")
+                else:
+                    self.health.end_trial()
+            elif adaptive:
+                self.health.record_success(op, headers_done - started)
+            else:
+                self.health.record_success()
+            break
+
+        if self.metrics is None:
+            return response
+
+        if kwargs.get("stream"):
+            # El cuerpo se mide cuando el decodificador termina de leerlo
+            response.nc_finished = lambda records=None: self.metrics.record_download(
+                op, (time.perf_counter() - headers_done) * 1000, self._wire_bytes(response), records
+            )
+        else:
+            self.metrics.record_download(op, 0.0, len(response.content))
+        return response
+
+    @staticmethod
+    def _wire_bytes(response):
+        # Bytes leídos de la red (comprimidos) si urllib3 los expone
+        try:
+            return response.raw.tell()
+        except Exception:
+            return 0
+
+    def get(self, path, params=None, timeout=None, **kwargs):
+        return self.request("GET", path, params=params, timeout=timeout, **kwargs)
+
+    def post(self, path, data=None, timeout=None, **kwargs):
+        return self.request("POST", path, data=data, timeout=timeout, **kwargs)
+
+    def put(self, path, data=None, timeout=None, **kwargs):
+        return self.request("PUT", path, data=data, timeout=timeout, **kwargs)
+
+    def delete(self, path, timeout=None, **kwargs):
+        return self.request("DELETE", path, timeout=timeout, **kwargs)
+
+    def get_shares(self, path=None, reshares=True, subfiles=False, timeout=None, headers=None):
+        # Respuesta en streaming: se decodifica con iter_ocs_records según llega
+        params = {"format": "json"}
+        if path:
+            params["path"] = path
+            if reshares:
+                params["reshares"] = "true"
+            if subfiles:
+                params["subfiles"] = "true"
+
+        return self.get(OCS_SHARES_ENDPOINT, params=params, timeout=timeout, stream=True, headers=headers)
+
+    def get_folder_page(self, folder, timeout=None):
+        # (código HTTP, shares de la carpeta o texto del error) de ?path=<carpeta>&subfiles=true
+        from Prism_NextCloudLinks_Decoder import iter_ocs_records
+
+        response = self.get_shares(folder, subfiles=True, timeout=timeout)
+        if response.status_code != 200:
+            return response.status_code, response.text[:200]
+
+        return 200, list(iter_ocs_records(response))
+
+    def iter_folder_shares(self, folders, max_workers=None, timeout=None):
+        # Pide las páginas de cada carpeta en paralelo, sin superar el pool de
+        # conexiones, y las devuelve (carpeta, código, datos) según llegan
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_maxsize) as executor:
+            futures = {
+                executor.submit(self.get_folder_page, folder, timeout): folder
+                for folder in folders
+            }
+            for future in as_completed(futures):
+                yield (futures[future],) + future.result()
+
+    def create_share(self, path, permissions, expire_date=None, share_type="3", timeout=None):
+        data = {
+            "path": path,
+            "shareType": share_type,
+            "permissions": permissions
+        }
+        if expire_date:
+            data["expireDate"] = expire_date
+
+        return self.post(OCS_SHARES_ENDPOINT, data=data, timeout=timeout, params={"format": "json"})
+
+    def dav_files_path(self, nc_path=""):
+        return f"{DAV_FILES_ROOT}/{quote(self.user, safe='')}{quote(nc_path)}"
+
+    def dav_uploads_path(self, upload_id):
+        return f"{DAV_UPLOADS_ROOT}/{quote(self.user, safe='')}/{upload_id}"
+
+    def propfind(self, dav_path, depth="1", timeout=None, adaptive=True):
+        return self.request(
+            "PROPFIND", dav_path, data=PROPFIND_BODY, timeout=timeout, adaptive=adaptive,
+            headers={"Depth": depth, "Content-Type": "application/xml; charset=utf-8"}
+        )
+
+    def stat(self, nc_path, depth="0", timeout=None, adaptive=True):
+        # (código HTTP, entradas de WebDAV) de un fichero o carpeta de Nextcloud
+        response = self.propfind(self.dav_files_path(nc_path), depth, timeout, adaptive)
+        if response.status_code != 207:
+            return response.status_code, []
+
+        return 207, parse_multistatus(response.content, f"{DAV_FILES_ROOT}/{self.user}")
+
+    def update_share(self, share_id, timeout=None, **fields):
+        # Campos de la API: expireDate, permissions, password, note...
+        return self.put(f"{OCS_SHARES_ENDPOINT}/{share_id}", data=fields, timeout=timeout,
+                        params={"format": "json"})
+
+    def delete_share(self, share_id, timeout=None):
+        return self.delete(f"{OCS_SHARES_ENDPOINT}/{share_id}", timeout=timeout, params={"format": "json"})
+
+    def _start_probe(self):
+        # Al abrirse el circuito, un hilo comprueba status.php hasta que el servidor vuelve
+        self._count("health.circuit_opened")
+        with self._probe_lock:
+            if self._closed.is_set() or (self._probe_thread and self._probe_thread.is_alive()):
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="NextcloudProbe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while not self._closed.wait(self.probe_interval * random.uniform(0.8, 1.2)):
+            if self.health.is_available():
+                return
+
+            try:
+                response = self.session.get(self.url + STATUS_ENDPOINT, timeout=self.health.min_timeout)
+            except Exception:
+                continue
+
+            if response.status_code == 200:
+                self.health.record_success()
+                self._count("health.recovered")
+                return
+
+    def close(self):
+        self._closed.set()
+        self.session.close()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from datetime import date, timedelta
+
+from Prism_NextCloudLinks_Maintenance import parse_expiration
+
+
+READ_ONLY_PERMISSIONS = "1"
+# Raíz bajo la que se guarda en disco el listado completo de la cuenta
+ACCOUNT_ROOT = "/"
+
+
+def summarize_shares(shares, today=None, week_days=7):
+    # Recuento de un proyecto para el panel: enlaces, caducan esta semana, lectura y escritura
+    today = today or date.today()
+    week_end = today + timedelta(days=week_days)
+    summary = {"links": 0, "expiring": 0, "expired": 0, "read": 0, "write": 0}
+    for share in shares:
+        summary["links"] += 1
+        if str(share.get('permissions')) == READ_ONLY_PERMISSIONS:
+            summary["read"] += 1
+        else:
+            summary["write"] += 1
+
+        expiration = parse_expiration(share.get('expiration'))
+        if expiration is None:
+            continue
+        if expiration < today:
+            summary["expired"] += 1
+        elif expiration <= week_end:
+            summary["expiring"] += 1
+
+    return summary
+
+
+def bucket_shares_by_root(shares, roots, deepest_only=True):
+    # {raíz: [shares]}. deepest_only=True: cada share solo en la raíz más
+    # profunda que lo contiene (para los recuentos del panel, así no cuenta en
+    # dos proyectos anidados); False: en todas, el listado completo de cada
+    # proyecto para el índice y la caché
+    roots = {root.rstrip('/') or '/' for root in roots}
+    buckets = {root: [] for root in roots}
+    for share in shares:
+        parts = share.get('path', '').split('/')
+        for depth in range(len(parts), 0, -1):
+            root = '/'.join(parts[:depth]) or '/'
+            if root in buckets:
+                buckets[root].append(share)
+                if deepest_only:
+                    break
+
+    return buckets
+
+
+def aggregate_projects(projects, load_shares):
+    # Shares de cada proyecto con `load_shares(proyecto)` (ya en memoria) y
+    # [(proyecto, shares, resumen, error)] en el orden de entrada
+    rows = []
+    for project in projects:
+        try:
+            shares = load_shares(project)
+            rows.append((project, shares, summarize_shares(shares), ""))
+        except Exception as e:
+            rows.append((project, [], None, str(e)))
+
+    return rows
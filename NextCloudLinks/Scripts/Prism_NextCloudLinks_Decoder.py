@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import codecs
+import json
+
+from Prism_NextCloudLinks_Client import NextcloudError
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class NextcloudDecodeError(NextcloudError):
+    pass
+
+
+def iter_ocs_records(response, chunk_size=CHUNK_SIZE):
+    # Devuelve uno a uno los elementos de ocs.data según se descarga la
+    # respuesta (JSON o XML), sin cargar el cuerpo entero en memoria. Si
+    # ocs.data es un único objeto se devuelve ese objeto.
+    count = 0
+    try:
+        content_type = response.headers.get("Content-Type", "")
+        if "xml" in content_type:
+            records = iter_xml_records(response.iter_content(chunk_size))
+        else:
+            records = iter_json_records(response.iter_content(chunk_size))
+
+        for record in records:
+            count += 1
+            yield record
+    finally:
+        response.close()
+        # Métricas de descarga que deja el cliente en las respuestas en streaming
+        finished = getattr(response, "nc_finished", None)
+        if finished:
+            finished(count)
+
+
+def decode_ocs_object(response):
+    # ocs.data de una respuesta de un solo objeto (p. ej. al crear un share)
+    for record in iter_ocs_records(response):
+        return record
+    return {}
+
+
+class _TextStream(object):
+    # Buffer de texto sobre los trozos de la descarga
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.finished = False
+
+    def read_more(self, keep_from=None):
+        # Descarta lo ya consumido (salvo desde keep_from) y añade el siguiente trozo
+        keep_from = self.pos if keep_from is None else keep_from
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            if self.finished:
+                raise NextcloudDecodeError("Truncated OCS response")
+            self.finished = True
+            text = self.decoder.decode(b"", final=True)
+        else:
+            text = self.decoder.decode(chunk)
+
+        self.buffer = self.buffer[keep_from:] + text
+        self.pos -= keep_from
+
+    def skip(self, chars):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.read_more()
+
+    def decode_value(self, decoder):
+        # raw_decode del siguiente valor; si está incompleto, leer más y reintentar
+        while True:
+            try:
+                value, self.pos = decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except ValueError:
+                self.read_more()
+
+
+def iter_json_records(chunks):
+    stream = _TextStream(chunks)
+    decoder = json.JSONDecoder()
+
+    # 1. Buscar la clave "data" dentro de "ocs" (profundidad 2) sin parsear el resto
+    depth = 0
+    in_string = False
+    escape = False
+    string_start = 0
+    last_string = None
+    while True:
+        if stream.pos >= len(stream.buffer):
+            # Conservar la cadena empezada al recortar el buffer
+            keep_from = string_start if in_string else stream.pos
+            stream.read_more(keep_from)
+            string_start -= keep_from
+            continue
+
+        char = stream.buffer[stream.pos]
+        stream.pos += 1
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+                last_string = stream.buffer[string_start:stream.pos - 1]
+        elif char == '"':
+            in_string = True
+            string_start = stream.pos
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+        elif char == ":" and depth == 2 and last_string == "data":
+            break
+
+    # 2. Si data es un objeto se devuelve tal cual
+    if stream.skip(" \t\r\n") != "[":
+        record = stream.decode_value(decoder)
+        if isinstance(record, dict):
+            yield record
+        return
+
+    # 3. Si es una lista, decodificar los elementos de uno en uno
+    stream.pos += 1
+    while stream.skip(" \t\r\n,") != "]":
+        yield stream.decode_value(decoder)
+
+
+def iter_xml_records(chunks):
+    # XML de OCS: <ocs><meta/><data><element>...</element>...</data></ocs>.
+    # Cada <element> se convierte en dict y se libera en cuanto se cierra.
+    import xml.etree.ElementTree as ET
+
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack = []
+    found_elements = False
+
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    stack.append(element)
+                    continue
+
+                stack.pop()
+                parent = stack[-1] if stack else None
+                parent_tag = parent.tag if parent is not None else None
+                if element.tag == "element" and parent_tag == "data":
+                    found_elements = True
+                    yield {child.tag: child.text for child in element}
+                    parent.remove(element)
+                elif element.tag == "data" and parent_tag == "ocs":
+                    if not found_elements and len(element):
+                        yield {child.tag: child.text for child in element}
+                    return
+        parser.close()
+    except ET.ParseError as e:
+        raise NextcloudDecodeError(f"Could not parse OCS XML response: {str(e)}")
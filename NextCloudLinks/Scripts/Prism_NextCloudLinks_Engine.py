@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import base64
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+
+from Prism_NextCloudLinks_Client import NextcloudAPIError, NextcloudError, SingleFlight, OCS_SHARES_ENDPOINT
+from Prism_NextCloudLinks_Decoder import iter_ocs_records, decode_ocs_object
+from Prism_NextCloudLinks_Shares import ShareIndex, normalize_share, is_public_share, path_in_root
+from Prism_NextCloudLinks_Upload import ChunkedUploader, DEFAULT_CHUNK_SIZE
+from Prism_NextCloudLinks_Verify import ShareVerifier, ChecksumCache, verification_problems
+
+
+STATUS_CREATED = "created"
+STATUS_REUSED = "reused"
+STATUS_ERROR = "error"
+
+# Con más rutas que esto se descarga el listado de la cuenta una vez en vez de
+# consultar los shares ruta a ruta
+PREFETCH_THRESHOLD = 20
+
+
+def encryption_key():
+    system_info = os.path.join(os.path.expanduser("~"), os.name, sys.platform)
+    return hashlib.sha256(system_info.encode()).hexdigest()[:16]
+
+
+def encrypt_password(text, key):
+    if not text:
+        return ""
+    encrypted_bytes = [ord(c) ^ ord(k) for c, k in zip(text, cycle(key))]
+    return base64.b64encode(bytes(encrypted_bytes)).decode('utf-8')
+
+
+def decrypt_password(encrypted_text, key):
+    if not encrypted_text:
+        return ""
+    try:
+        encrypted_bytes = base64.b64decode(encrypted_text.encode('utf-8'))
+        decrypted_bytes = [b ^ ord(k) for b, k in zip(encrypted_bytes, cycle(key))]
+        return ''.join(chr(b) for b in decrypted_bytes)
+    except Exception:
+        return encrypted_text
+
+
+def load_user_prefs(config_file):
+    # ((usuario, contraseña, url), ajustes) del json de preferencias de Prism
+    with open(config_file, 'r') as f:
+        config_data = json.load(f)
+
+    credentials = config_data.get("Nextcloud_credentials", {})
+    password = decrypt_password(credentials.get("nextcloud_password", ""), encryption_key())
+    return (
+        (credentials.get("nextcloud_username", ""), password, credentials.get("nextcloud_url", "")),
+        config_data.get("Nextcloud_settings", {})
+    )
+
+
+def find_reusable_share(shares, permissions, expire_date=None):
+    # URL de un share con los mismos permisos y la misma caducidad, o None
+    for share in shares:
+        if share['permissions'] != permissions:
+            continue
+        current_expire = share['expiration']
+        if expire_date is None:
+            if current_expire:
+                continue
+        elif not current_expire or not current_expire.startswith(expire_date):
+            continue
+        return share['url']
+
+    return None
+
+
+class ShareEngine(object):
+    # Crea o reutiliza enlaces públicos sin depender de Qt. Lo usan el plugin
+    # (con su índice, métricas y single-flight) y la línea de comandos.
+    # `on_created(share)` recibe cada share nuevo, p. ej. para la caché en disco.
+    def __init__(self, client, mapper, index=None, metrics=None, inflight=None, on_created=None,
+                 checksum_cache=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.client = client
+        self.mapper = mapper
+        self.index = index if index is not None else ShareIndex()
+        self.metrics = metrics
+        self.inflight = inflight or SingleFlight()
+        self.on_created = on_created
+        self.checksum_cache = checksum_cache if checksum_cache is not None else ChecksumCache()
+        self.chunk_size = chunk_size
+
+    def _count(self, name, value=1):
+        if self.metrics:
+            self.metrics.count(name, value)
+
+    def to_remote(self, path):
+        nc_path = self.mapper.to_remote(path)
+        if not nc_path:
+            raise NextcloudError(f"La ruta no está dentro de ninguna carpeta de Nextcloud configurada:\n{path}")
+        return nc_path
+
+    def path_shares(self, nc_path):
+        # Shares públicos de una ruta: desde el índice si la cubre, si no desde el servidor
+        shares = self.index.lookup(nc_path)
+        self._count("cache.path." + ("miss" if shares is None else "hit"))
+        if shares is not None:
+            return shares
+
+        shares, joined = self.inflight.do((OCS_SHARES_ENDPOINT, "path", nc_path), self._fetch_path_shares, nc_path)
+        if joined:
+            self._count("singleflight.path.joined")
+        return shares
+
+    def _fetch_path_shares(self, nc_path):
+        response = self.client.get_shares(nc_path)
+        if response.status_code != 200:
+            raise NextcloudAPIError(f"Error en la API (HTTP {response.status_code}):\n{response.text[:200]}")
+
+        shares = [normalize_share(s) for s in iter_ocs_records(response) if is_public_share(s)]
+        self.index.store_path(nc_path, shares)
+        return shares
+
+    def existing_share(self, nc_path, permissions, expire_date=None):
+        try:
+            return find_reusable_share(self.path_shares(nc_path), permissions, expire_date)
+        except NextcloudError:
+            return None
+
+    def create_share(self, nc_path, permissions, expire_date=None):
+        # Crear nuevo share (shareType 3 = enlace público)
+        response = self.client.create_share(nc_path, permissions, expire_date)
+        if response.status_code != 200:
+            raise NextcloudAPIError(
+                f"Error en la API (HTTP {response.status_code}):\n"
+                f"Respuesta: {response.text[:200]}{'...' if len(response.text) > 200 else ''}"
+            )
+
+        share_data = decode_ocs_object(response)
+        if not share_data.get('url'):
+            raise NextcloudError("No se pudo extraer el enlace de la respuesta")
+
+        # Actualizar el índice con el share recién creado
+        share_data = dict(share_data, share_type='3')
+        share_data.setdefault('path', nc_path)
+        share_data.setdefault('permissions', permissions)
+        share_data.setdefault('expiration', expire_date)
+        share = normalize_share(share_data)
+        self.index.add(share)
+        if self.on_created:
+            self.on_created(share)
+        return share
+
+    def share(self, nc_path, permissions="1", expire_date=None):
+        # (url, reutilizado). Dos peticiones iguales a la vez comparten la
+        # misma consulta y crean un único enlace
+        key = (OCS_SHARES_ENDPOINT, "share", nc_path, permissions, expire_date)
+        (url, reused), _ = self.inflight.do(key, self._share, nc_path, permissions, expire_date)
+        return url, reused
+
+    def _share(self, nc_path, permissions, expire_date):
+        url = self.existing_share(nc_path, permissions, expire_date)
+        if url:
+            self._count("share_link.reused")
+            return url, True
+
+        self._count("share_link.created")
+        return self.create_share(nc_path, permissions, expire_date)['url'], False
+
+    def upload_missing(self, path, nc_path, on_progress=None, chunk_size=None):
+        # Sube por WebDAV lo que no esté en el servidor (o tenga otro tamaño)
+        uploader = ChunkedUploader(self.client, chunk_size=chunk_size or self.chunk_size, on_progress=on_progress)
+        uploaded = uploader.upload(path, nc_path)
+        self._count("upload.files", len(uploaded))
+        return uploaded
+
+    def verify(self, path, nc_path, on_progress=None):
+        # Lanza NextcloudError con los ficheros que no coinciden con el servidor
+        results = ShareVerifier(self.client, self.checksum_cache, on_progress=on_progress).verify(path, nc_path)
+        problems = verification_problems(results)
+        self._count("verify.files", len(results))
+        self._count("verify.hashed", sum(1 for result in results if result["method"] != "size"))
+        if problems:
+            self._count("verify.problems", len(problems))
+            lines = [f"{os.path.basename(result['local'])}: {result['detail']}" for result in problems[:10]]
+            if len(problems) > 10:
+                lines.append(f"... y {len(problems) - 10} más")
+            raise NextcloudError("La copia en Nextcloud no coincide con la local:\n" + "\n".join(lines))
+        return results
+
+    def prefetch(self, remote_roots):
+        # Un único listado de la cuenta para muchas rutas: rellena el índice de
+        # cada raíz y las consultas posteriores ya no van al servidor
+        roots = sorted({root.rstrip('/') or '/' for root in remote_roots})
+        response = self.client.get_shares(timeout=60)
+        if response.status_code != 200:
+            raise NextcloudError(f"Error getting all shares: HTTP {response.status_code}\n{response.text[:200]}")
+
+        by_root = {root: [] for root in roots}
+        for share in iter_ocs_records(response):
+            if not is_public_share(share):
+                continue
+            for root in roots:
+                if path_in_root(share.get('path', ''), root):
+                    by_root[root].append(normalize_share(share))
+                    break
+
+        for root, shares in by_root.items():
+            self.index.fill(root, shares)
+        return sum(len(shares) for shares in by_root.values())
+
+    def share_path(self, path, permissions="1", expire_date=None, upload=False, verify=False):
+        # Resultado de una ruta local: {path, remote, url, status, error}
+        result = {"path": path, "remote": "", "url": "", "status": STATUS_ERROR, "error": ""}
+        try:
+            if not os.path.exists(path):
+                raise NextcloudError(f"Ruta inválida o no existe:\n{path}")
+            result["remote"] = nc_path = self.to_remote(path)
+            if upload:
+                self.upload_missing(path, nc_path)
+            if verify:
+                self.verify(path, nc_path)
+            result["url"], reused = self.share(nc_path, permissions, expire_date)
+            result["status"] = STATUS_REUSED if reused else STATUS_CREATED
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    def share_paths(self, paths, permissions="1", expire_date=None, upload=False, verify=False,
+                    max_workers=None, on_result=None):
+        # Enlaces de muchas rutas en paralelo (tantos hilos como conexiones del
+        # cliente). Devuelve los resultados en el orden de entrada
+        if len(paths) > PREFETCH_THRESHOLD:
+            roots = set()
+            for path in paths:
+                nc_path = self.mapper.to_remote(path)
+                if nc_path:
+                    roots.add(nc_path.rsplit('/', 1)[0] or '/')
+            try:
+                self.prefetch(self._common_roots(roots))
+            except Exception as e:
+                # Sin listado se consulta ruta a ruta
+                print(f"Error listando los enlaces de la cuenta: {str(e)}", file=sys.stderr)
+
+        def run(path):
+            result = self.share_path(path, permissions, expire_date, upload, verify)
+            if on_result:
+                on_result(result)
+            return result
+
+        if not paths:
+            return []
+
+        workers = min(max_workers or self.client.pool_maxsize, len(paths))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, paths))
+
+    @staticmethod
+    def _common_roots(folders):
+        # Quita las carpetas que ya están dentro de otra de la lista
+        roots = []
+        for folder in sorted(folders, key=lambda f: (f.count('/'), f)):
+            if not any(path_in_root(folder, root) for root in roots):
+                roots.append(folder)
+        return roots
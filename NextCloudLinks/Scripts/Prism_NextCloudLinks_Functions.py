@@ -32,32 +32,1058 @@
 # along with Prism.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import time
+
+_import_started = time.perf_counter()
+
 from qtpy.QtCore import *
 from qtpy.QtGui import *
 from qtpy.QtWidgets import *
 import os
-import requests
-import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 import sys
-import base64
-import hashlib
-from itertools import cycle
+import threading
 
 from PrismUtils.Decorators import err_catcher_plugin as err_catcher
 
+from Prism_NextCloudLinks_Client import (
+    NextcloudOCSClient, NextcloudError, NextcloudAPIError, NextcloudScopeRejected, SingleFlight,
+    OCS_SHARES_ENDPOINT, STATUS_ENDPOINT
+)
+from Prism_NextCloudLinks_Shares import (
+    ShareIndex, normalize_share, is_public_share, path_in_root, expire_date_for, share_signature,
+    DEFAULT_SHARE_CACHE_TTL, PERMISSION_PRESETS, EXPIRY_PRESETS
+)
+from Prism_NextCloudLinks_PathMap import PathMapper, legacy_remote_root, project_rules, parse_rules, format_rules
+from Prism_NextCloudLinks_Decoder import iter_ocs_records
+from Prism_NextCloudLinks_Store import ShareStore, CACHE_FILENAME
+from Prism_NextCloudLinks_Metrics import NextcloudMetrics, probe_connection
+from Prism_NextCloudLinks_Upload import DEFAULT_CHUNK_SIZE
+from Prism_NextCloudLinks_WebDAV import DAV_FILES_ROOT
+from Prism_NextCloudLinks_RemoteTree import RemoteTree, SYNC_MISSING, SYNC_PARTIAL, SYNC_UNKNOWN
+from Prism_NextCloudLinks_Verify import ChecksumCache
+from Prism_NextCloudLinks_Engine import ShareEngine, encryption_key, encrypt_password, decrypt_password
+from Prism_NextCloudLinks_Activity import (
+    ActivityGap, ActivityUnavailable, delta_refresh, latest_activity_id, FULL_RELOAD_SECONDS
+)
+from Prism_NextCloudLinks_AutoShare import (
+    ShareJobQueue, AutoShareWorker, parse_auto_share_rules, format_auto_share_rules, match_auto_share_rule,
+    callback_output_paths, share_target, QUEUE_FILENAME, EVENT_RENDER, EVENT_PLAYBLAST, EVENT_EXPORT,
+    JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED
+)
+from Prism_NextCloudLinks_Dashboard import aggregate_projects, bucket_shares_by_root, ACCOUNT_ROOT
+from Prism_NextCloudLinks_Trie import (
+    ShareTrie, TrieNode, PERMISSION_READ, PERMISSION_WRITE, EXPIRY_WEEK, EXPIRY_EXPIRED, EXPIRY_NONE
+)
+from Prism_NextCloudLinks_Maintenance import (
+    plan_maintenance, run_maintenance, ACTION_DELETE, ACTION_SKIPPED, DEFAULT_MAINTENANCE_RATE
+)
+
+# Coste de cargar el módulo; la pila HTTP (requests) se importa en el primer uso
+IMPORT_TIME_MS = (time.perf_counter() - _import_started) * 1000
+# Presupuesto de arranque del plugin (importación + __init__) en milisegundos
+STARTUP_BUDGET_MS = 20
+# Volcado de widgets y atributos del media browser, solo para desarrollo
+DEBUG = os.environ.get("PRISM_NEXTCLOUD_DEBUG", "") not in ("", "0")
+# "scoped": una consulta por carpeta del proyecto en el servidor, en tandas de
+# SCOPED_FOLDER_BATCH; "full": un listado de la cuenta (y si el servidor rechaza
+# la consulta por carpeta)
+DEFAULT_SHARE_LISTING_MODE = "scoped"
+SCOPED_FOLDER_BATCH = 200
+
+# Refresco de la pestaña en segundo plano (incremental si hay feed de actividad)
+BACKGROUND_REFRESH_MS = 60 * 1000
+
+# Aviso cuando el árbol remoto dice que una ruta no está (completa) en Nextcloud
+UNSYNCED_MESSAGES = {
+    SYNC_MISSING: "No está en Nextcloud todavía",
+    SYNC_PARTIAL: "No está completo en Nextcloud (faltan ficheros o no coinciden los tamaños)"
+}
+
+
+def permissions_label(permissions_value):
+    # Convertir permisos a texto
+    if permissions_value in ['1', '17']:
+        return 'Lectura'
+    elif permissions_value in ['15', '23', '31']:
+        return 'Lectura/Escritura'
+    return f'Custom ({permissions_value})'
+
+
+def media_player_path(player):
+    # Ruta del render seleccionado en un media player de Prism (o None)
+    if player is None or not hasattr(player, "getCurRenders"):
+        return None
+
+    contexts = player.getCurRenders()
+    if not contexts or not contexts[0].get("path"):
+        return None
+
+    path = contexts[0]["path"]
+    if hasattr(player, "seq") and len(player.seq) == 1:
+        path = os.path.join(path, player.seq[0])
+    return path
+
+
+class NextcloudWorkerSignals(QObject):
+    # Ambas señales incluyen el propio worker para poder descartar respuestas viejas
+    finished = Signal(object, object)
+    failed = Signal(object, str)
+    progress = Signal(object, int)
+
+
+class NextcloudWorker(QRunnable):
+    # Ejecuta una llamada a Nextcloud fuera del hilo de la UI y entrega el
+    # resultado por señal. Si se cancela, el resultado se descarta.
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = NextcloudWorkerSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report_progress(self, value):
+        # Se pasa como callback a la función del worker; llega a la UI por señal
+        if not self.cancelled:
+            self.signals.progress.emit(self, value)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self, str(e))
+            return
+
+        if not self.cancelled:
+            self.signals.finished.emit(self, result)
+
+
+class NextcloudShareTableModel(QAbstractTableModel):
+    # Modelo de la tabla de enlaces del proyecto. set_shares compara la lista
+    # nueva con la actual por id de share y solo emite las filas que cambian.
+    HEADERS = ["Ruta", "Enlace", "Permisos", "Expiración"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._shares = []
+
+    @staticmethod
+    def share_key(share):
+        return share.get('id') or share.get('url', '')
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._shares)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+
+        share = self._shares[index.row()]
+        column = index.column()
+        if column == 0:
+            return share.get('path', '')
+        elif column == 1:
+            return share.get('url', '')
+        elif column == 2:
+            return permissions_label(share.get('permissions', ''))
+        elif column == 3:
+            return share.get('expiration') or 'Sin duración limite'
+        return None
+
+    def share(self, row):
+        return self._shares[row]
+
+    def shares(self):
+        return list(self._shares)
+
+    def set_shares(self, shares):
+        new_shares = {self.share_key(share): share for share in shares}
+
+        # Quitar las filas que ya no existen, de abajo arriba y por bloques contiguos
+        removed = [row for row, share in enumerate(self._shares) if self.share_key(share) not in new_shares]
+        while removed:
+            last = first = removed.pop()
+            while removed and removed[-1] == first - 1:
+                first = removed.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._shares[first:last + 1]
+            self.endRemoveRows()
+
+        # Actualizar las filas modificadas
+        for row, share in enumerate(self._shares):
+            new_share = new_shares.pop(self.share_key(share))
+            if new_share != share:
+                self._shares[row] = new_share
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+        # Añadir las nuevas al final
+        if new_shares:
+            first = len(self._shares)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_shares) - 1)
+            self._shares.extend(new_shares.values())
+            self.endInsertRows()
+
+
+class _ShareRow(object):
+    # Fila de un share bajo su nodo cuando el nodo no puede mostrarlo en su propia fila
+    __slots__ = ("node", "index")
+
+    def __init__(self, node, index):
+        self.node = node
+        self.index = index
+
+
+class NextcloudShareTreeModel(QAbstractItemModel):
+    # Enlaces agrupados por carpetas (ShareTrie) con el número de enlaces de
+    # cada nodo. Las filas de un nodo se calculan cuando la vista las pide y se
+    # descartan al cambiar el filtro; un nodo con un solo enlace y sin
+    # subcarpetas lo muestra en su propia fila.
+    HEADERS = ["Ruta", "Enlaces", "Enlace", "Permisos", "Expiración"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.trie = None
+        self._items = {}
+        self._row_of = {}
+
+    def set_trie(self, trie):
+        self.beginResetModel()
+        self.trie = trie
+        self._items = {}
+        self._row_of = {}
+        self.endResetModel()
+
+    def set_filter(self, text="", permission=None, expiry=None):
+        # Devuelve cuántos enlaces pasan el filtro
+        if self.trie is None:
+            return 0
+
+        self.beginResetModel()
+        visible = self.trie.set_filter(text, permission, expiry)
+        self._items = {}
+        self._row_of = {}
+        self.endResetModel()
+        return visible
+
+    def shares(self):
+        return list(self.trie.shares) if self.trie else []
+
+    def _node_items(self, node):
+        items = self._items.get(id(node))
+        if items is None:
+            children = self.trie.visible_children(node)
+            own = self.trie.visible_own(node)
+            items = children
+            if own and (children or len(own) > 1 or node is self.trie.root):
+                items = children + [_ShareRow(node, index) for index in own]
+            self._items[id(node)] = items
+            for row, item in enumerate(items):
+                self._row_of[id(item)] = row
+        return items
+
+    def _inline_share(self, node):
+        # El share que se enseña en la fila del propio nodo, si es el caso
+        if node.own and not self._node_items(node):
+            own = self.trie.visible_own(node)
+            if len(own) == 1:
+                return self.trie.shares[own[0]]
+        return None
+
+    def _item(self, index):
+        return index.internalPointer() if index.isValid() else self.trie.root
+
+    def share_at(self, index):
+        if not index.isValid():
+            return None
+        item = index.internalPointer()
+        if isinstance(item, _ShareRow):
+            return self.trie.shares[item.index]
+        return self._inline_share(item)
+
+    def node_at(self, index):
+        item = index.internalPointer() if index.isValid() else None
+        return item if isinstance(item, TrieNode) else None
+
+    def index_for_path(self, path):
+        # Índice del nodo de una ruta remota (o inválido si está filtrado)
+        node = self.trie.find(path) if self.trie else None
+        if node is None or node is self.trie.root:
+            return QModelIndex()
+        parent = self.index_for_path(node.parent.path) if node.parent is not self.trie.root else QModelIndex()
+        if node.parent is not self.trie.root and not parent.isValid():
+            return QModelIndex()
+        self._node_items(node.parent)
+        row = self._row_of.get(id(node))
+        return QModelIndex() if row is None else self.createIndex(row, 0, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if self.trie is None or column >= len(self.HEADERS) or (parent.isValid() and parent.column() != 0):
+            return QModelIndex()
+        item = self._item(parent)
+        if isinstance(item, _ShareRow):
+            return QModelIndex()
+        items = self._node_items(item)
+        if not 0 <= row < len(items):
+            return QModelIndex()
+        return self.createIndex(row, column, items[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        item = index.internalPointer()
+        node = item.node if isinstance(item, _ShareRow) else item.parent
+        if node is None or node is self.trie.root:
+            return QModelIndex()
+        return self.createIndex(self._row_of[id(node)], 0, node)
+
+    def rowCount(self, parent=QModelIndex()):
+        if self.trie is None or (parent.isValid() and parent.column() != 0):
+            return 0
+        item = self._item(parent)
+        return 0 if isinstance(item, _ShareRow) else len(self._node_items(item))
+
+    def hasChildren(self, parent=QModelIndex()):
+        return self.rowCount(parent) > 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+
+        item = index.internalPointer()
+        column = index.column()
+        if isinstance(item, _ShareRow):
+            share = self.trie.shares[item.index]
+            if column == 0:
+                return "(enlace de la carpeta)" if item.node.children else item.node.name
+        else:
+            if column == 0:
+                return item.path if role == Qt.ToolTipRole else item.name
+            if column == 1:
+                return str(self.trie.count(item))
+            share = self._inline_share(item)
+            if share is None:
+                return None
+
+        if column == 2:
+            return share.get('url', '')
+        elif column == 3:
+            return permissions_label(share.get('permissions', ''))
+        elif column == 4:
+            return share.get('expiration') or 'Sin duración limite'
+        return None
+
+
+class NextcloudBatchShare(QObject):
+    # Genera enlaces para varias rutas en un pool de hilos acotado, con diálogo
+    # de progreso, y al terminar muestra un único resumen con todos los enlaces.
+    MAX_WORKERS = 6
+
+    def __init__(self, plugin, paths, permissions, expire_date, upload=False, verify=False):
+        super().__init__()
+        self.plugin = plugin
+        self.paths = paths
+        self.permissions = permissions
+        self.expire_date = expire_date
+        self.upload = upload
+        self.verify = verify
+        self.results = {}
+        self.workers = {}
+        self.processed_mb = {}
+        if upload and verify:
+            self.progress_text = "Subiendo y verificando en Nextcloud..."
+        elif upload:
+            self.progress_text = "Subiendo a Nextcloud..."
+        else:
+            self.progress_text = "Verificando con Nextcloud..."
+
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(min(self.MAX_WORKERS, len(paths)))
+
+    def start(self):
+        self.progress = QProgressDialog("Generando enlaces de Nextcloud...", "Cancelar", 0, len(self.paths))
+        self.progress.setWindowTitle("Prism")
+        self.progress.setMinimumDuration(0)
+        self.progress.canceled.connect(self.cancel)
+
+        for path in self.paths:
+            # Sin subida, lo que el árbol remoto ya sabe que no está subido no
+            # llega al servidor; la comparación recorre la carpeta, así que va en el worker
+            worker = NextcloudWorker(
+                self.plugin.resolve_share_link, path, self.permissions, self.expire_date,
+                upload=self.upload, verify=self.verify, check_sync=not self.upload
+            )
+            if self.upload or self.verify:
+                worker.kwargs["on_progress"] = worker.report_progress
+                worker.signals.progress.connect(self.on_progress)
+            worker.signals.finished.connect(self.on_finished)
+            worker.signals.failed.connect(self.on_failed)
+            self.workers[worker] = path
+            self.pool.start(worker)
+
+        self.progress.setValue(len(self.results))
+        if len(self.results) == len(self.paths):
+            self.plugin._batch_jobs.discard(self)
+            self.show_summary()
+
+    def cancel(self):
+        self.pool.clear()
+        for worker in self.workers:
+            worker.cancel()
+
+        self.plugin._batch_jobs.discard(self)
+
+    def on_progress(self, worker, megabytes):
+        self.processed_mb[worker] = megabytes
+        self.progress.setLabelText(f"{self.progress_text} {sum(self.processed_mb.values())} MB")
+
+    def on_finished(self, worker, url):
+        self.add_result(worker, url, "")
+
+    def on_failed(self, worker, error):
+        self.add_result(worker, "", error)
+
+    def add_result(self, worker, url, error):
+        self.results[self.workers[worker]] = (url, error)
+        self.progress.setValue(len(self.results))
+        if len(self.results) == len(self.paths):
+            self.plugin._batch_jobs.discard(self)
+            self.show_summary()
+
+    def show_summary(self):
+        links = []
+        dialog = QDialog()
+        dialog.setWindowTitle("Enlaces generados")
+        dialog.setMinimumWidth(800)
+        layout = QVBoxLayout(dialog)
+
+        table = QTableWidget(len(self.paths), 2)
+        table.setHorizontalHeaderLabels(["Ruta", "Enlace"])
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        for row, path in enumerate(self.paths):
+            url, error = self.results[path]
+            if url:
+                links.append(f"{os.path.basename(path)}: {url}")
+            table.setItem(row, 0, QTableWidgetItem(path))
+            table.setItem(row, 1, QTableWidgetItem(url or f"Error: {error}"))
+
+        table.resizeColumnsToContents()
+        layout.addWidget(QLabel(f"{len(links)} de {len(self.paths)} enlaces generados y copiados al portapapeles"))
+        layout.addWidget(table)
+
+        if links:
+            self.plugin.core.copyToClipboard("\n".join(links), file=False)
+
+        dialog.exec_()
+
+
+class NextcloudMaintenanceDialog(QDialog):
+    # Mantenimiento de los enlaces del proyecto: primero una simulación con
+    # las acciones previstas y, si se confirma, se aplican en segundo plano.
+    HEADERS = ["Acción", "Ruta", "Enlace", "Expiración", "Motivo"]
+
+    def __init__(self, plugin, shares, parent=None):
+        super().__init__(parent)
+        self.plugin = plugin
+        self.shares = shares
+        self.actions = []
+        self._worker = None
+        self._cancel = None
+        self.setWindowTitle("Mantenimiento de enlaces de Nextcloud")
+        self.setMinimumWidth(900)
+        layout = QVBoxLayout(self)
+
+        options = QFormLayout()
+        self.cb_deleteExpired = QCheckBox("Borrar enlaces caducados")
+        self.cb_deleteExpired.setChecked(True)
+        self.cb_consolidate = QCheckBox("Borrar duplicados (mismo recurso y permisos)")
+        self.cb_consolidate.setChecked(True)
+        self.cb_extendSoon = QCheckBox("Ampliar los que caducan pronto")
+        self.cb_extendSoon.setChecked(True)
+        self.sp_soonDays = QSpinBox()
+        self.sp_soonDays.setRange(1, 365)
+        self.sp_soonDays.setValue(7)
+        self.sp_soonDays.setSuffix(" días")
+        self.sp_extendDays = QSpinBox()
+        self.sp_extendDays.setRange(1, 3650)
+        self.sp_extendDays.setValue(30)
+        self.sp_extendDays.setSuffix(" días")
+        options.addRow(self.cb_deleteExpired)
+        options.addRow(self.cb_consolidate)
+        options.addRow(self.cb_extendSoon)
+        options.addRow("Caducan pronto si quedan menos de:", self.sp_soonDays)
+        options.addRow("Nueva caducidad a partir de hoy:", self.sp_extendDays)
+        layout.addLayout(options)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        buttons = QHBoxLayout()
+        self.btn_preview = QPushButton("Previsualizar")
+        self.btn_preview.clicked.connect(self.preview)
+        self.btn_apply = QPushButton("Aplicar")
+        self.btn_apply.setEnabled(False)
+        self.btn_apply.clicked.connect(self.apply)
+        self.btn_cancel = QPushButton("Cancelar")
+        self.btn_cancel.setVisible(False)
+        self.btn_cancel.clicked.connect(self.cancel)
+        self.btn_close = QPushButton("Cerrar")
+        self.btn_close.clicked.connect(self.reject)
+        buttons.addWidget(self.btn_preview)
+        buttons.addStretch()
+        buttons.addWidget(self.btn_apply)
+        buttons.addWidget(self.btn_cancel)
+        buttons.addWidget(self.btn_close)
+        layout.addLayout(buttons)
+
+        for widget in (self.cb_deleteExpired, self.cb_consolidate, self.cb_extendSoon):
+            widget.toggled.connect(self.preview)
+        for widget in (self.sp_soonDays, self.sp_extendDays):
+            widget.valueChanged.connect(self.preview)
+
+        self.preview()
+
+    def preview(self):
+        # Simulación: no se toca el servidor
+        self.actions = plan_maintenance(
+            self.shares,
+            soon_days=self.sp_soonDays.value(),
+            extend_days=self.sp_extendDays.value(),
+            delete_expired=self.cb_deleteExpired.isChecked(),
+            extend_soon=self.cb_extendSoon.isChecked(),
+            consolidate=self.cb_consolidate.isChecked()
+        )
+
+        self.table.setRowCount(len(self.actions))
+        for row, action in enumerate(self.actions):
+            share = action["share"]
+            if action["action"] == ACTION_DELETE:
+                text = "Borrar"
+                expiration = share.get('expiration') or 'Sin duración limite'
+            else:
+                text = "Ampliar"
+                expiration = f"{share.get('expiration', '')[:10]} -> {action['expire_date']}"
+            for column, value in enumerate((text, share['path'], share.get('url', ''), expiration, action["reason"])):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+
+        deletes = sum(1 for action in self.actions if action["action"] == ACTION_DELETE)
+        self.status_label.setText(
+            f"Simulación sobre {len(self.shares)} enlaces: {deletes} a borrar, "
+            f"{len(self.actions) - deletes} a ampliar. Todavía no se ha cambiado nada."
+        )
+        self.btn_apply.setEnabled(bool(self.actions))
+
+    def apply(self):
+        answer = QMessageBox.question(
+            self, "Prism",
+            f"Se van a aplicar {len(self.actions)} cambios en Nextcloud. ¿Continuar?"
+        )
+        if answer != QMessageBox.Yes:
+            return
+
+        for widget in (self.btn_preview, self.btn_apply, self.cb_deleteExpired, self.cb_consolidate,
+                       self.cb_extendSoon, self.sp_soonDays, self.sp_extendDays):
+            widget.setEnabled(False)
+        self.progress_bar.setRange(0, len(self.actions))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.status_label.setText("Aplicando cambios...")
+        self.btn_cancel.setEnabled(True)
+        self.btn_cancel.setVisible(True)
+
+        self._cancel = threading.Event()
+        worker = NextcloudWorker(self.plugin.apply_share_maintenance, self.actions, cancelled=self._cancel)
+        worker.kwargs["on_progress"] = worker.report_progress
+        worker.signals.progress.connect(self.on_progress)
+        worker.signals.finished.connect(self.on_applied)
+        worker.signals.failed.connect(self.on_failed)
+        self._worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_progress(self, worker, value):
+        if worker is self._worker:
+            self.progress_bar.setValue(value)
+
+    def on_applied(self, worker, results):
+        if worker is not self._worker:
+            return
+
+        self._worker = None
+        self.btn_cancel.setVisible(False)
+        skipped = sum(1 for action, error in results if error == ACTION_SKIPPED)
+        errors = [(action, error) for action, error in results if error and error != ACTION_SKIPPED]
+        self.progress_bar.setValue(len(results))
+        text = f"{len(results) - len(errors) - skipped} de {len(results)} cambios aplicados"
+        if skipped:
+            text += f", {skipped} sin enviar por la cancelación"
+        self.status_label.setText(text)
+        if errors:
+            self.plugin.core.writeErrorLog(
+                "Error applying Nextcloud share maintenance",
+                "\n".join(f"{action['share']['path']} ({action['share']['id']}): {error}" for action, error in errors)
+            )
+
+    def on_failed(self, worker, error):
+        if worker is not self._worker:
+            return
+
+        self._worker = None
+        self.btn_cancel.setVisible(False)
+        self.status_label.setText("Error al aplicar los cambios")
+        self.plugin.core.writeErrorLog("Error applying Nextcloud share maintenance", error)
+
+    def cancel(self):
+        # Deja de enviar: lo ya enviado se queda aplicado y el resto no llega al servidor
+        if self._cancel is not None:
+            self._cancel.set()
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("Cancelando: esperando a las peticiones en curso...")
+
+    def done(self, result):
+        # Si se cierra a medias se deja de enviar igual que al cancelar
+        if self._cancel is not None:
+            self._cancel.set()
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        super().done(result)
+
+
+class NextcloudAutoShareDialog(QDialog):
+    # Estado de la cola de enlaces automáticos: lo pendiente, los enlaces
+    # creados y los errores de los últimos trabajos
+    HEADERS = ["Estado", "Ruta", "Enlace", "Intentos", "Error"]
+    STATE_LABELS = {
+        JOB_PENDING: "Pendiente",
+        JOB_RUNNING: "En curso",
+        JOB_DONE: "Hecho",
+        JOB_FAILED: "Fallido"
+    }
+
+    def __init__(self, plugin, parent=None):
+        super().__init__(parent)
+        self.plugin = plugin
+        self.setWindowTitle("Enlaces automáticos de Nextcloud")
+        self.setMinimumWidth(900)
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        buttons = QHBoxLayout()
+        self.btn_refresh = QPushButton("Actualizar")
+        self.btn_refresh.clicked.connect(self.refresh)
+        self.btn_copy = QPushButton("Copiar enlaces")
+        self.btn_copy.clicked.connect(self.copy_links)
+        self.btn_retry = QPushButton("Reintentar fallidos")
+        self.btn_retry.clicked.connect(self.retry_failed)
+        self.btn_clear = QPushButton("Limpiar terminados")
+        self.btn_clear.clicked.connect(self.clear_finished)
+        self.btn_close = QPushButton("Cerrar")
+        self.btn_close.clicked.connect(self.reject)
+        for button in (self.btn_refresh, self.btn_copy, self.btn_retry, self.btn_clear):
+            buttons.addWidget(button)
+        buttons.addStretch()
+        buttons.addWidget(self.btn_close)
+        layout.addLayout(buttons)
+
+        self.jobs = []
+        self.refresh()
+
+    def refresh(self):
+        queue = self.plugin.auto_share_queue
+        self.jobs = queue.recent()
+        self.table.setRowCount(len(self.jobs))
+        for row, job in enumerate(self.jobs):
+            values = [
+                self.STATE_LABELS.get(job["state"], job["state"]), job["local_path"],
+                job["url"] or "", str(job["attempts"]), job["error"] or ""
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+
+        counts = queue.counts()
+        self.status_label.setText("  ".join(
+            f"{label}: {counts.get(state, 0)}" for state, label in self.STATE_LABELS.items()
+        ))
+
+    def copy_links(self):
+        links = [f"{os.path.basename(job['local_path'])}: {job['url']}" for job in self.jobs if job["url"]]
+        if links:
+            self.plugin.core.copyToClipboard("\n".join(links), file=False)
+
+    def retry_failed(self):
+        if self.plugin.auto_share_queue.retry_failed():
+            self.plugin.start_auto_share_worker().wake(flush=True)
+        self.refresh()
+
+    def clear_finished(self):
+        self.plugin.auto_share_queue.clear_finished()
+        self.refresh()
+
+
+class NextcloudDashboardDialog(QDialog):
+    # Enlaces de todos los proyectos conocidos: primero lo que hay en caché y
+    # después una actualización en segundo plano. Al elegir un proyecto se ven
+    # sus enlaces abajo.
+    HEADERS = ["Proyecto", "Raíz remota", "Enlaces", "Caducan esta semana", "Caducados", "Lectura", "Escritura", "Estado"]
+    SUMMARY_FIELDS = ["links", "expiring", "expired", "read", "write"]
+
+    def __init__(self, plugin, parent=None):
+        super().__init__(parent)
+        self.plugin = plugin
+        self.rows = []
+        self._worker = None
+        self.setWindowTitle("Enlaces de Nextcloud por proyecto")
+        self.resize(1100, 700)
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.itemSelectionChanged.connect(self.show_selected_project)
+
+        self.model = NextcloudShareTableModel(self)
+        self.share_table = QTableView()
+        self.share_table.setModel(self.model)
+        self.share_table.verticalHeader().setVisible(False)
+        self.share_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.share_table.horizontalHeader().setStretchLastSection(True)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.table)
+        splitter.addWidget(self.share_table)
+        layout.addWidget(splitter)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        buttons = QHBoxLayout()
+        self.btn_refresh = QPushButton("Actualizar")
+        self.btn_refresh.clicked.connect(lambda: self.load(force=True))
+        self.btn_close = QPushButton("Cerrar")
+        self.btn_close.clicked.connect(self.reject)
+        buttons.addWidget(self.btn_refresh)
+        buttons.addStretch()
+        buttons.addWidget(self.btn_close)
+        layout.addLayout(buttons)
+
+        self.projects = plugin.get_known_projects()
+        self.load(cached_only=True)
+
+    def load(self, force=False, cached_only=False):
+        self.status_label.setText(
+            f"{len(self.projects)} proyectos, " + ("leyendo la caché..." if cached_only else "actualizando...")
+        )
+        worker = NextcloudWorker(self.plugin.get_dashboard, self.projects, force=force, cached_only=cached_only)
+        worker.signals.finished.connect(self.on_loaded)
+        worker.signals.failed.connect(self.on_failed)
+        worker.cached_only = cached_only
+        self._worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_loaded(self, worker, rows):
+        if worker is not self._worker:
+            return
+
+        self._worker = None
+        self.fill(rows)
+        if worker.cached_only:
+            # Lo de la caché ya está a la vista; ahora los proyectos caducados
+            self.load()
+            return
+
+        self.status_label.setText(
+            f"{len(rows)} proyectos, {sum(summary['links'] for _, _, summary, _ in rows if summary)} enlaces"
+        )
+
+    def on_failed(self, worker, error):
+        if worker is not self._worker:
+            return
+
+        self._worker = None
+        self.status_label.setText(self.plugin.server_status_text() or f"Error: {error}")
+
+    def fill(self, rows):
+        selected = self.table.currentRow()
+        self.rows = rows
+        self.table.setRowCount(len(rows))
+        for row, (project, shares, summary, error) in enumerate(rows):
+            values = [project["name"], project["remote_root"]]
+            values += [str(summary[field]) if summary else "" for field in self.SUMMARY_FIELDS]
+            values.append(error or ("" if summary else "Sin datos"))
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+
+        if 0 <= selected < len(rows):
+            self.table.selectRow(selected)
+        self.show_selected_project()
+
+    def show_selected_project(self):
+        row = self.table.currentRow()
+        self.model.set_shares(self.rows[row][1] if 0 <= row < len(self.rows) else [])
+
+    def done(self, result):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        super().done(result)
+
+
+class NextcloudMediaPanel(QWidget):
+    # Estado de los enlaces públicos del render seleccionado en el media
+    # browser. Lee del índice de shares y solo consulta al servidor si el
+    # índice no cubre la ruta; se refresca cuando cambia la versión y el
+    # panel está visible.
+    def __init__(self, plugin, media_browser, parent=None):
+        super().__init__(parent)
+        self.plugin = plugin
+        self.media_browser = media_browser
+        self.path = None
+        self.shares = []
+        self._worker = None
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.status_label = QLabel("Nextcloud")
+        self.share_btn = QPushButton("Compartir...")
+        self.share_btn.clicked.connect(self.share_current)
+        self.copy_btn = QPushButton("Copiar enlace")
+        self.copy_btn.clicked.connect(self.copy_link)
+        layout.addWidget(self.status_label)
+        layout.addStretch()
+        layout.addWidget(self.copy_btn)
+        layout.addWidget(self.share_btn)
+
+        # Los cambios de selección seguidos se agrupan en un solo refresco
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(150)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        for name in ("lw_task", "lw_version"):
+            widget = getattr(media_browser, name, None)
+            if widget is not None and hasattr(widget, "itemSelectionChanged"):
+                widget.itemSelectionChanged.connect(self.schedule_refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if self.isVisible():
+            self.refresh_timer.start()
+
+    def refresh(self, force=False):
+        path = media_player_path(getattr(self.media_browser, "mediaPlayer", None))
+        if path == self.path and not force:
+            return
+
+        self.path = path
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+        if not path:
+            self.show_shares(None)
+            return
+
+        try:
+            nc_path = self.plugin.local_path_to_remote(path)
+        except NextcloudError:
+            self.show_shares(None)
+            return
+
+        shares = self.plugin.share_index.lookup(nc_path)
+        if shares is not None:
+            self.plugin.metrics.count("cache.media_panel.hit")
+            self.show_shares(shares)
+            return
+
+        self.plugin.metrics.count("cache.media_panel.miss")
+        self.status_label.setText("Nextcloud: comprobando enlaces...")
+        self.copy_btn.setEnabled(False)
+        worker = NextcloudWorker(self.plugin.get_path_public_shares, nc_path)
+        worker.signals.finished.connect(self.on_shares_loaded)
+        worker.signals.failed.connect(self.on_shares_failed)
+        self._worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_shares_loaded(self, worker, shares):
+        if worker is self._worker:
+            self._worker = None
+            self.show_shares(shares)
+
+    def on_shares_failed(self, worker, error):
+        if worker is self._worker:
+            self._worker = None
+            self.shares = []
+            self.copy_btn.setEnabled(False)
+            self.status_label.setText(self.plugin.server_status_text() or "Nextcloud: no se pudo comprobar")
+            self.status_label.setToolTip(error)
+
+    def show_shares(self, shares):
+        self.shares = shares or []
+        self.share_btn.setEnabled(bool(self.path))
+        self.copy_btn.setEnabled(bool(self.shares))
+        if shares is None:
+            self.status_label.setText("Nextcloud: -")
+            self.status_label.setToolTip("")
+        elif not shares:
+            self.status_label.setText("Nextcloud: sin enlaces públicos")
+            self.status_label.setToolTip("")
+        else:
+            details = [
+                f"{permissions_label(share['permissions'])}, "
+                f"{'caduca ' + share['expiration'][:10] if share['expiration'] else 'sin caducidad'}"
+                for share in shares
+            ]
+            self.status_label.setText(f"Nextcloud: {len(shares)} enlace(s) - {details[0]}")
+            self.status_label.setToolTip(
+                "\n".join(f"{share['url']} ({detail})" for share, detail in zip(shares, details))
+            )
+
+    def share_current(self):
+        if self.path:
+            self.plugin.showNextcloudShareMenu(self.path)
+            self.refresh(force=True)
+
+    def copy_link(self):
+        if self.shares:
+            url = self.shares[0]['url']
+            self.plugin.core.copyToClipboard(url, file=False)
+            self.plugin.core.popup(f"Enlace copiado:\n{url}")
+
 
 class Prism_NextCloudLinks_Functions(object):
     def __init__(self, core, plugin):
+        # En el arranque solo se registran los callbacks; credenciales, ajustes,
+        # índice y cliente HTTP se cargan la primera vez que se usan
+        init_started = time.perf_counter()
         self.core = core
         self.plugin = plugin
         self.core.registerCallback("projectBrowser_loadUI", self.nextcloudTabLinksEdit, plugin=self)
         self.core.registerCallback("userSettings_loadUI", self.userSettings_Nextcloud, plugin=self)
         self.core.callbacks.registerCallback("openPBListContextMenu", self.nextButton, plugin=self)
         self.core.callbacks.registerCallback("mediaPlayerContextMenuRequested", self.nextButtonPreview, plugin=self)
-        self.nextcloud_user, self.nextcloud_password, self.nextcloud_url = self.load_nextcloud_credentials()
         self.core.registerCallback("onMediaBrowserOpen", self.onMediaBrowserOpen, plugin=self)
+        self.core.registerCallback("postRender", self.onPostRender, plugin=self)
+        self.core.registerCallback("postPlayblast", self.onPostPlayblast, plugin=self)
+        self.core.registerCallback("postExport", self.onPostExport, plugin=self)
+        self.core.registerCallback("postPublish", self.onPostPublish, plugin=self)
+        self.core.registerCallback("postInitialize", self.resume_auto_share, plugin=self)
+        self._credentials = None
+        self._settings = None
+        self._share_index = None
+        self._share_store = None
+        self._revalidating = set()
+        self._sync_marks = {}
+        self._remote_trees = {}
+        self._checksum_cache = ChecksumCache()
+        self._ocs_client = None
+        self._ocs_client_lock = threading.Lock()
+        self._batch_jobs = set()
+        self._path_mapper = None
+        self._share_engine = None
+        self._icon = None
+        self.metrics = NextcloudMetrics()
+        self._inflight = SingleFlight()
+        self._last_connection_test = None
+        self._auto_share_queue = None
+        self._auto_share_worker = None
+        self._auto_share_engine = None
+        self._auto_share_rules = None
+
+        self.startup_time_ms = IMPORT_TIME_MS + (time.perf_counter() - init_started) * 1000
+        if self.startup_time_ms > STARTUP_BUDGET_MS:
+            print(
+                f"NextCloudLinks: el arranque tardó {self.startup_time_ms:.1f} ms "
+                f"(presupuesto {STARTUP_BUDGET_MS} ms)"
+            )
+
+    @property
+    def nextcloud_user(self):
+        return self.get_nextcloud_credentials()[0]
+
+    @property
+    def nextcloud_password(self):
+        return self.get_nextcloud_credentials()[1]
+
+    @property
+    def nextcloud_url(self):
+        return self.get_nextcloud_credentials()[2]
+
+    def get_nextcloud_credentials(self):
+        # Se descifran en el primer uso y se guardan en memoria
+        if self._credentials is None:
+            self._credentials = self.load_nextcloud_credentials()
+        return self._credentials
+
+    @property
+    def share_index(self):
+        if self._share_index is None:
+            self._share_index = ShareIndex(
+                ttl=self.get_nextcloud_setting("share_cache_ttl", DEFAULT_SHARE_CACHE_TTL)
+            )
+        return self._share_index
+
+    @property
+    def share_store(self):
+        # Caché de enlaces en disco, junto a las preferencias; None si está desactivada
+        if self._share_store is None and self.get_nextcloud_setting("persistent_share_cache", True):
+            prefs_folder = os.path.dirname(self.core.getUserPrefConfigPath())
+            self._share_store = ShareStore(os.path.join(prefs_folder, CACHE_FILENAME))
+        return self._share_store
+
+    def share_cache_key(self, remote_root):
+        return ShareStore.project_key(self.nextcloud_url, self.nextcloud_user, remote_root)
 
     def nextcloudTabLinksEdit(self, projectBrowser):
 
@@ -67,19 +1093,73 @@ class Prism_NextCloudLinks_Functions(object):
                 self.plugin = plugin
                 self.layout = QVBoxLayout()
                 self.setLayout(self.layout)
-                
-                # Crear tabla
-                self.table = QTableWidget(0, 4)
-                self.table.setHorizontalHeaderLabels(["Ruta", "Enlace", "Permisos", "Expiración"])
-                self.table.verticalHeader().setVisible(False)
-                self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-                self.table.setSelectionBehavior(QTableWidget.SelectRows)
-                self.layout.addWidget(self.table)
+                self._worker = None
+                self._trie_worker = None
+                self._signature = None
+                self._expanded = set()
+                self._restoring = False
+
+                # Búsqueda: el texto se aplica al dejar de escribir, los combos al momento
+                self.search_edit = QLineEdit()
+                self.search_edit.setPlaceholderText("Buscar en rutas y enlaces...")
+                self.search_edit.setClearButtonEnabled(True)
+                self.permission_combo = QComboBox()
+                for label, value in (("Todos los permisos", None), ("Solo lectura", PERMISSION_READ),
+                                     ("Edición", PERMISSION_WRITE)):
+                    self.permission_combo.addItem(label, value)
+                self.expiry_combo = QComboBox()
+                for label, value in (("Cualquier caducidad", None), ("Caducan esta semana", EXPIRY_WEEK),
+                                     ("Caducados", EXPIRY_EXPIRED), ("Sin caducidad", EXPIRY_NONE)):
+                    self.expiry_combo.addItem(label, value)
+                self.search_timer = QTimer(self)
+                self.search_timer.setSingleShot(True)
+                self.search_timer.setInterval(150)
+                self.search_timer.timeout.connect(self.apply_filter)
+                self.search_edit.textChanged.connect(self.search_timer.start)
+                self.permission_combo.currentIndexChanged.connect(self.apply_filter)
+                self.expiry_combo.currentIndexChanged.connect(self.apply_filter)
+                search = QHBoxLayout()
+                search.addWidget(self.search_edit)
+                search.addWidget(self.permission_combo)
+                search.addWidget(self.expiry_combo)
+                self.layout.addLayout(search)
+
+                # Árbol de carpetas (secuencia -> plano -> tarea -> versión) con enlaces por nodo
+                self.model = NextcloudShareTreeModel(self)
+                self.tree = QTreeView()
+                self.tree.setModel(self.model)
+                self.tree.setUniformRowHeights(True)
+                self.tree.setEditTriggers(QAbstractItemView.NoEditTriggers)
+                self.tree.setSelectionBehavior(QAbstractItemView.SelectRows)
+                self.tree.header().setStretchLastSection(True)
+                self.tree.expanded.connect(self.on_expanded)
+                self.tree.collapsed.connect(self.on_collapsed)
+                # Conectar doble click para copiar URL
+                self.tree.doubleClicked.connect(self.copy_selected_link)
+                self.layout.addWidget(self.tree)
+
+                self.status_label = QLabel()
+                self.layout.addWidget(self.status_label)
                 
                 # Botón de actualizar
                 self.refresh_btn = QPushButton("Actualizar")
-                self.refresh_btn.clicked.connect(self.load_data)
-                self.layout.addWidget(self.refresh_btn)
+                self.refresh_btn.clicked.connect(lambda: self.load_data(force=True))
+                self.maintenance_btn = QPushButton("Mantenimiento...")
+                self.maintenance_btn.clicked.connect(self.show_maintenance)
+                self.auto_share_btn = QPushButton("Enlaces automáticos...")
+                self.auto_share_btn.clicked.connect(self.show_auto_share)
+                self.dashboard_btn = QPushButton("Todos los proyectos...")
+                self.dashboard_btn.clicked.connect(self.show_dashboard)
+                buttons = QHBoxLayout()
+                buttons.addWidget(self.refresh_btn)
+                buttons.addWidget(self.maintenance_btn)
+                buttons.addWidget(self.auto_share_btn)
+                buttons.addWidget(self.dashboard_btn)
+                self.layout.addLayout(buttons)
+
+                self.poll_timer = QTimer(self)
+                self.poll_timer.setInterval(BACKGROUND_REFRESH_MS)
+                self.poll_timer.timeout.connect(self.poll_shares)
 
             def refreshUI(self):
                 self.load_data
@@ -90,43 +1170,170 @@ class Prism_NextCloudLinks_Functions(object):
             def entered(self, prevTab=None, navData=None):
                 print("Pestaña Nextcloud activada - Cargando enlaces...")
                 self.load_data()
-                
-            def load_data(self):
-                # Limpiar tabla
-                self.table.setRowCount(0)
-                
-                # Obtener datos
-                shares = self.plugin.get_all_project_public_shares()
-                
-                # Llenar tabla
-                for share in shares:
-                    row = self.table.rowCount()
-                    self.table.insertRow(row)
-                    
-                    # Convertir permisos a texto
-                    permissions_value = share.get('permissions', '')
-                    if permissions_value in ['1', '17']:
-                        permissions_text = 'Lectura'
-                    elif permissions_value in ['15', '23', '31']:
-                        permissions_text = 'Lectura/Escritura'
+                self.poll_timer.start()
+
+            def hideEvent(self, event):
+                # Al salir de la pestaña se descarta la carga en curso
+                self.poll_timer.stop()
+                self.cancel_loading()
+                super().hideEvent(event)
+
+            def poll_shares(self):
+                if self.isVisible() and self._worker is None:
+                    self.load_data(force=True, quiet=True)
+
+            def cancel_loading(self):
+                for worker in (self._worker, self._trie_worker):
+                    if worker:
+                        worker.cancel()
+                self._worker = None
+                self._trie_worker = None
+
+            def load_data(self, force=False, quiet=False):
+                # quiet: refresco periódico, sin tocar la tabla si nada ha cambiado
+                remote_root = self.plugin.get_remote_root()
+                share_index = self.plugin.share_index
+                self.plugin.refresh_remote_tree_async(remote_root)
+
+                # Una respuesta anterior todavía pendiente ya no es válida
+                if self._worker:
+                    self._worker.cancel()
+                    self._worker = None
+
+                if not quiet:
+                    # Mostrar al momento lo que haya en caché (memoria o disco), aunque esté caducado
+                    cached = self.plugin.get_cached_project_shares(remote_root)
+                    self._signature = None
+                    if cached is not None:
+                        self.fill_table(cached)
+                        if not force and share_index.is_fresh(remote_root):
+                            self.status_label.setText(f"{len(cached)} enlaces")
+                            return
                     else:
-                        permissions_text = f'Custom ({permissions_value})'
-                    
-                    self.table.setItem(row, 0, QTableWidgetItem(share.get('path', '')))
-                    self.table.setItem(row, 1, QTableWidgetItem(share.get('url', '')))
-                    self.table.setItem(row, 2, QTableWidgetItem(permissions_text))
-                    self.table.setItem(row, 3, QTableWidgetItem(share.get('expiration', '')))
-                
-                self.table.resizeColumnsToContents()
-                
-                # Conectar doble click para copiar URL
-                self.table.doubleClicked.connect(self.copy_selected_link)
+                        self.fill_table([])
+                    self.status_label.setText("Actualizando enlaces...")
+
+                worker = NextcloudWorker(self.plugin.poll_project_shares, remote_root, self._signature, background=quiet)
+                worker.signals.finished.connect(self.on_shares_loaded)
+                worker.signals.failed.connect(self.on_shares_failed)
+                self._worker = worker
+                self._load_started = time.perf_counter()
+                QThreadPool.globalInstance().start(worker)
+
+            def on_shares_loaded(self, worker, result):
+                if worker is not self._worker:
+                    return
+
+                self._worker = None
+                if result is None:
+                    # Sin cambios: solo se actualiza el texto de estado
+                    if self.model.trie is not None:
+                        self.show_filtered(self.model.trie.visible)
+                else:
+                    shares, self._signature = result
+                    self.fill_table(shares)
+                self.plugin.metrics.observe("ui.tab_refresh", (time.perf_counter() - self._load_started) * 1000)
+
+            def on_shares_failed(self, worker, error):
+                if worker is not self._worker:
+                    return
+
+                self._worker = None
+                self.status_label.setText(self.plugin.server_status_text() or "Error al actualizar los enlaces")
+                self.plugin.core.writeErrorLog("Error getting all project public shares", error)
+
+            def current_filter(self):
+                return self.search_edit.text(), self.permission_combo.currentData(), self.expiry_combo.currentData()
+
+            def fill_table(self, shares):
+                # El árbol se construye y filtra fuera del hilo de la UI; aquí
+                # solo se cambia el del modelo
+                if self._trie_worker:
+                    self._trie_worker.cancel()
+                worker = NextcloudWorker(
+                    self.plugin.build_share_trie, self.plugin.get_remote_root(), shares, *self.current_filter()
+                )
+                worker.signals.finished.connect(self.on_trie_built)
+                self._trie_worker = worker
+                QThreadPool.globalInstance().start(worker)
+
+            def on_trie_built(self, worker, trie):
+                if worker is not self._trie_worker:
+                    return
+
+                self._trie_worker = None
+                was_empty = self.model.trie is None or not len(self.model.trie)
+                with self.plugin.metrics.timed("ui.fill_table"):
+                    self.model.set_trie(trie)
+                    if trie.filter == ShareTrie.filter_key(*self.current_filter()):
+                        self.show_filtered(trie.visible)
+                    else:
+                        # El filtro ha cambiado mientras se construía
+                        self.apply_filter()
+                if was_empty and len(trie):
+                    self.tree.resizeColumnToContents(0)
+
+            def apply_filter(self):
+                if self.model.trie is None:
+                    return
+
+                with self.plugin.metrics.timed("ui.search"):
+                    self.show_filtered(self.model.set_filter(*self.current_filter()))
+
+            def show_filtered(self, visible):
+                self.restore_expanded(expand_all=self.model.trie.filter is not None and visible <= 200)
+                total = len(self.model.trie)
+                text = f"{total} enlaces" if self.model.trie.filter is None else f"{visible} de {total} enlaces"
+                if self._worker:
+                    text += " (actualizando...)"
+                self.status_label.setText(text)
+
+            def restore_expanded(self, expand_all=False):
+                # Tras reconstruir el modelo se vuelven a abrir las carpetas que
+                # estaban abiertas; con pocos resultados se abre todo
+                self._restoring = True
+                try:
+                    if expand_all:
+                        self.tree.expandAll()
+                    else:
+                        for path in sorted(self._expanded, key=len):
+                            index = self.model.index_for_path(path)
+                            if index.isValid():
+                                self.tree.expand(index)
+                finally:
+                    self._restoring = False
+
+            def on_expanded(self, index):
+                node = self.model.node_at(index)
+                if node is not None and not self._restoring:
+                    self._expanded.add(node.path)
+
+            def on_collapsed(self, index):
+                node = self.model.node_at(index)
+                if node is not None and not self._restoring:
+                    self._expanded.discard(node.path)
             
+            def show_maintenance(self):
+                # Trabaja sobre los enlaces que se ven en la tabla
+                dialog = NextcloudMaintenanceDialog(self.plugin, self.model.shares(), self)
+                dialog.exec_()
+                remote_root = self.plugin.get_remote_root()
+                shares = self.plugin.share_index.get_project(remote_root, include_stale=True)
+                if shares is not None:
+                    self.fill_table(shares)
+
+            def show_dashboard(self):
+                NextcloudDashboardDialog(self.plugin, self).exec_()
+
+            def show_auto_share(self):
+                NextcloudAutoShareDialog(self.plugin, self).exec_()
+
             def copy_selected_link(self, index):
-                if index.column() == 1:  # Columna de URL
-                    url = self.table.item(index.row(), 1).text()
-                    self.parent().plugin.core.copyToClipboard(url, file=False)
-                    self.parent().plugin.core.popup(f"Enlace copiado:\n{url}")
+                share = self.model.share_at(index)
+                if share:
+                    url = share.get('url', '')
+                    self.plugin.core.copyToClipboard(url, file=False)
+                    self.plugin.core.popup(f"Enlace copiado:\n{url}")
 
         # Usar la clase personalizada
         custom_tabNextcloud = NextcloudTabWidget(self)
@@ -141,137 +1348,474 @@ class Prism_NextCloudLinks_Functions(object):
         custom_tabNextcloud.setProperty("tabType", "custom")
         projectBrowser.addTab("Nextcloud", custom_tabNextcloud)
 
-    def get_all_project_public_shares(self):
+    def get_all_project_public_shares(self, force=False):
                 remote_root = self.get_remote_root()
-                
-                endpoint = f"{self.nextcloud_url.rstrip('/')}/ocs/v2.php/apps/files_sharing/api/v1/shares"
-                headers = {
-                    "OCS-APIRequest": "true",
-                    "Accept": "application/json"
-                }
+
+                if not force:
+                    project_shares = self.share_index.get_project(remote_root)
+                    if project_shares is not None:
+                        return project_shares
+
+                    # Lo guardado en disco se sirve al momento y se revalida en segundo plano
+                    project_shares = self.get_cached_project_shares(remote_root)
+                    if project_shares is not None:
+                        self.revalidate_project_shares(remote_root)
+                        return project_shares
 
                 try:
-                    response = requests.get(
-                        endpoint,
-                        headers=headers,
-                        auth=(self.nextcloud_user, self.nextcloud_password),
-                        timeout=30
-                    )
-
-                    if response.status_code != 200:
-                        self.core.writeErrorLog(f"Error getting all shares: HTTP {response.status_code}", response.text)
-                        return []
-
-                    shares = response.json().get('ocs', {}).get('data', [])
-                    project_shares = []
-                    
-                    for share in shares:
-                        share_type = str(share.get('share_type', ''))
-                        if share_type != '3':  # Solo shares públicos
-                            continue
-
-                        share_path = share.get('path', '')
-                        # Filtrar por rutas dentro del proyecto actual
-                        if share_path.startswith(remote_root):
-                            permissions_value = str(share.get('permissions', ''))
-                            expiration = share.get('expiration', '')
-                            if not expiration:
-                                expiration = 'Sin duración limite'
-
-                            project_shares.append({
-                                'url': share.get('url', ''),
-                                'permissions': permissions_value,
-                                'expiration': expiration,
-                                'path': share_path
-                            })
-
-                    return project_shares
+                    return self.fetch_project_public_shares(remote_root)
 
                 except Exception as e:
                     self.core.writeErrorLog("Error getting all project public shares", str(e))
                     return []
-                
 
-    def onMediaBrowserOpen(self, mediaBrowser):
+    def get_cached_project_shares(self, remote_root):
+        # Shares del índice en memoria o, en la primera consulta de la sesión,
+        # de la caché en disco (quedan marcados para revalidar)
+        project_shares = self.share_index.get_project(remote_root, include_stale=True)
+        self.metrics.count("cache.index." + ("miss" if project_shares is None else "hit"))
+        if project_shares is None:
+            with self.metrics.timed("cache.disk_load"):
+                stored = self._load_stored_project(remote_root)
+            self.metrics.count("cache.disk." + ("miss" if stored is None else "hit"))
+            if stored is not None:
+                self.share_index.fill(remote_root, stored["shares"], stale=True)
+                project_shares = stored["shares"]
+
+        return project_shares
+
+    def revalidate_project_shares(self, remote_root):
+        # Descarga en segundo plano, una sola a la vez por proyecto
+        if remote_root in self._revalidating:
+            return
+
+        self._revalidating.add(remote_root)
+        QThreadPool.globalInstance().start(NextcloudWorker(self._revalidate_project_shares, remote_root))
+
+    def _revalidate_project_shares(self, remote_root):
+        try:
+            self.fetch_project_public_shares(remote_root)
+        except Exception as e:
+            print(f"Error revalidando los enlaces de {remote_root}: {str(e)}")
+        finally:
+            self._revalidating.discard(remote_root)
+
+    def fetch_project_public_shares(self, remote_root):
+        # Descarga los shares públicos del proyecto y rellena el índice y la
+        # caché en disco. No toca la UI, así que puede ejecutarse desde un NextcloudWorker.
+        # Si ya hay una descarga del mismo proyecto en curso se espera a esa.
+        project_shares, joined = self._inflight.do(
+            (OCS_SHARES_ENDPOINT, "project", remote_root.rstrip('/')),
+            self._fetch_project_public_shares, remote_root
+        )
+        if joined:
+            self.metrics.count("singleflight.project.joined")
+        return project_shares
+
+    def poll_project_shares(self, remote_root, known_signature=None, background=False):
+        # Refresco de la pestaña: (shares, firma) o None si no ha cambiado nada.
+        # En segundo plano, con feed de actividad cuesta una petición pequeña;
+        # sin él solo se descarga cuando el índice ha caducado
+        if not background or self._sync_mark(remote_root) is not None or not self.share_index.is_fresh(remote_root):
+            shares = self.fetch_project_public_shares(remote_root)
+        else:
+            shares = self.share_index.get_project(remote_root)
+
+        signature = share_signature(shares)
+        if signature == known_signature:
+            return None
+        return shares, signature
+
+    def _sync_mark(self, remote_root):
+        # {"since", "reloaded", "etag"} si se puede refrescar con el feed de
+        # actividad; None si toca recarga completa
+        if not self.get_nextcloud_setting("delta_refresh", True):
+            return None
+
+        key = self.share_cache_key(remote_root)
+        mark = self._sync_marks.get(key)
+        if mark is None:
+            stored = self._load_stored_project(remote_root)
+            if stored is None:
+                return None
+            mark = self._sync_marks[key] = {k: stored[k] for k in ("since", "reloaded", "etag")}
+
+        if mark["since"] is None or not mark["reloaded"] or time.time() - mark["reloaded"] > FULL_RELOAD_SECONDS:
+            return None
+        return mark
+
+    def _delta_project_shares(self, remote_root):
+        # Aplica al listado conocido los cambios del feed de actividad. None si
+        # hay un hueco en el feed o no está disponible: entonces se recarga entero
+        mark = self._sync_mark(remote_root)
+        shares = self.get_cached_project_shares(remote_root) if mark else None
+        if shares is None:
+            return None
+
+        try:
+            with self.metrics.timed("fetch.project_shares.delta"):
+                shares, since, changed = delta_refresh(self.get_ocs_client(), shares, remote_root, mark["since"])
+        except (ActivityGap, ActivityUnavailable) as e:
+            self.metrics.count("delta.fallback")
+            print(f"Refresco incremental no disponible, recargando {remote_root}: {str(e)}")
+            return None
+
+        self.metrics.count("delta.paths", changed)
+        self.share_index.fill(remote_root, shares)
+        # La ETag del listado completo deja de valer si algo ha cambiado
+        etag = None if changed else mark["etag"]
+        if changed or since != mark["since"]:
+            self._save_stored_project(remote_root, shares, etag, since, full=False)
+        mark.update(since=since, etag=etag)
+        return shares
+
+    def _activity_head(self):
+        # Marca actual del feed de actividad, o None si el servidor no lo tiene
+        try:
+            return latest_activity_id(self.get_ocs_client())
+        except Exception as e:
+            self.metrics.count("delta.unavailable")
+            print(f"Feed de actividad no disponible: {str(e)}")
+            return None
+
+    def _fetch_project_public_shares(self, remote_root):
+        project_shares = self._delta_project_shares(remote_root)
+        if project_shares is not None:
+            return project_shares
+
+        # Marca del feed antes del listado: lo que cambie mientras se descarga entra en el siguiente delta
+        since = self._activity_head() if self.get_nextcloud_setting("delta_refresh", True) else None
+        project_shares = None
+        etag = None
+        if self.get_nextcloud_setting("share_listing_mode", DEFAULT_SHARE_LISTING_MODE) == "scoped":
+            try:
+                with self.metrics.timed("fetch.project_shares.scoped"):
+                    project_shares = self._fetch_scoped_project_shares(remote_root)
+            except NextcloudScopeRejected as e:
+                print(f"Consulta por carpeta rechazada, usando el listado completo: {str(e)}")
+
+        if project_shares is None:
+            with self.metrics.timed("fetch.project_shares.full"):
+                project_shares, etag = self._fetch_all_project_shares(remote_root)
+
+        self.metrics.count("shares.project_listed", len(project_shares))
+        self.share_index.fill(remote_root, project_shares)
+        with self.metrics.timed("cache.disk_save"):
+            self._save_stored_project(remote_root, project_shares, etag, since)
+        self._sync_marks[self.share_cache_key(remote_root)] = {"since": since, "reloaded": time.time(), "etag": etag}
+        return project_shares
+
+    def _load_stored_project(self, remote_root):
+        store = self.share_store
+        if store is None:
+            return None
+
+        try:
+            return store.load(self.share_cache_key(remote_root))
+        except Exception as e:
+            print(f"Error leyendo la caché de enlaces: {str(e)}")
+            return None
+
+    def _save_stored_project(self, remote_root, shares, etag=None, since=None, full=True):
+        store = self.share_store
+        if store is None:
+            return
+
+        try:
+            store.save(self.share_cache_key(remote_root), shares, etag, since, full)
+        except Exception as e:
+            print(f"Error guardando la caché de enlaces: {str(e)}")
+
+    def _persist_share_changes(self, changed=(), removed=()):
+        # Lleva a la caché en disco los shares creados, modificados o borrados desde el plugin
+        store = self.share_store
+        if store is None:
+            return
+
+        try:
+            store.apply_changes(self.nextcloud_url, self.nextcloud_user, changed, removed)
+        except Exception as e:
+            print(f"Error guardando la caché de enlaces: {str(e)}")
+
+    def _fetch_all_project_shares(self, remote_root):
+        # Listado completo de la cuenta filtrado en local. Devuelve (shares, etag);
+        # si el servidor da ETag la siguiente consulta es condicional. Nextcloud
+        # no la manda en la API OCS (solo algún proxy), así que normalmente es
+        # una descarga completa
+        stored = self._load_stored_project(remote_root)
+        headers = {"If-None-Match": stored["etag"]} if stored and stored["etag"] else None
+        response = self.get_ocs_client().get_shares(timeout=30, headers=headers)
+
+        if headers:
+            self.metrics.count("cache.etag." + ("hit" if response.status_code == 304 else "miss"))
+        if response.status_code == 304 and stored:
+            response.close()
+            return stored["shares"], stored["etag"]
+
+        if response.status_code != 200:
+            raise NextcloudError(f"Error getting all shares: HTTP {response.status_code}\n{response.text[:200]}")
+
+        project_shares = []
+
+        # Se filtra según se descarga, sin cargar el listado entero en memoria
+        for share in iter_ocs_records(response):
+            if not is_public_share(share):  # Solo shares públicos
+                continue
+
+            # Filtrar por rutas dentro del proyecto actual
+            if path_in_root(share.get('path', ''), remote_root):
+                project_shares.append(normalize_share(share))
+
+        return project_shares, response.headers.get("ETag")
+
+    def _fetch_scoped_project_shares(self, remote_root):
+        # Pide al servidor solo los shares del proyecto: la propia raíz y, carpeta
+        # por carpeta, los shares de su contenido (path + subfiles). Cada carpeta
+        # es una página, así el coste crece con el proyecto y no con la cuenta.
+        client = self.get_ocs_client()
+        shares = {}
+
+        def add_page(records):
+            for share in records:
+                if is_public_share(share) and path_in_root(share.get('path', ''), remote_root):
+                    share = normalize_share(share)
+                    shares[share['id']] = share
+
+        status, page = client.get_folder_page(remote_root, timeout=30)
+        if status != 200:
+            raise NextcloudScopeRejected(f"HTTP {status}: {page}")
+        add_page(page)
+
+        # Subcarpetas tal como están en el servidor (árbol remoto, refrescado
+        # solo donde cambió la etag)
+        folders = self.refresh_remote_tree(remote_root).folders()
+
+        response = client.get_shares(remote_root, timeout=30)
+        if response.status_code == 200:
+            add_page(iter_ocs_records(response))
+        else:
+            response.close()
+
+        # Por tandas: en proyectos grandes no se encolan miles de peticiones a la vez
+        for start in range(0, len(folders), SCOPED_FOLDER_BATCH):
+            batch = folders[start:start + SCOPED_FOLDER_BATCH]
+            for folder, status, page in client.iter_folder_shares(batch, timeout=30):
+                if status == 404:
+                    # Carpeta borrada desde el último refresco del árbol
+                    continue
+                if status != 200:
+                    raise NextcloudError(f"Error getting shares of {folder}: HTTP {status}\n{page}")
+                add_page(page)
+
+        return list(shares.values())
+
+    def build_share_trie(self, remote_root, shares, text="", permission=None, expiry=None):
+        # Sin UI: árbol de rutas para la pestaña, ya con el filtro aplicado
+        with self.metrics.timed("ui.trie_build"):
+            trie = ShareTrie(remote_root, shares)
+            trie.set_filter(text, permission, expiry)
+            return trie
+
+    def get_known_projects(self):
+        # Proyecto actual y recientes de Prism con su raíz en Nextcloud:
+        # [{"name", "path", "config_path", "remote_root"}]
+        candidates = []
+        if self.core.projectPath:
+            candidates.append((getattr(self.core, "projectName", ""), self.core.projectPath, None))
 
-        current_file = None
         try:
-            if hasattr(mediaBrowser, "getCurrentFile"):
-                current_file = mediaBrowser.getCurrentFile()
-                print(f"Archivo actual: {current_file}")
-            elif hasattr(mediaBrowser, "mediaPlayer") and hasattr(mediaBrowser.mediaPlayer, "getCurrentFile"):
-                current_file = mediaBrowser.mediaPlayer.getCurrentFile()
-                print(f"Archivo actual desde mediaPlayer: {current_file}")
+            recent = self.core.projects.getRecentProjects() or []
+        except Exception as e:
+            print(f"Error leyendo los proyectos recientes de Prism: {str(e)}")
+            recent = []
+        for entry in recent:
+            config_path = entry.get("configPath")
+            if config_path:
+                candidates.append((entry.get("name"), self._project_folder(config_path), config_path))
+
+        projects = []
+        seen = set()
+        for name, project_path, config_path in candidates:
+            key = os.path.normcase(os.path.abspath(project_path))
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if config_path is None:
+                remote_root = self.get_remote_root()
             else:
-                print("No se encontró método para obtener archivo actual")
+                remote_root = self.project_remote_root(project_path, config_path)
+            projects.append({
+                "name": name or os.path.basename(os.path.normpath(project_path)),
+                "path": project_path,
+                "config_path": config_path,
+                "remote_root": remote_root
+            })
+
+        return projects
+
+    def _project_folder(self, config_path):
+        get_folder = getattr(self.core.projects, "getProjectFolderFromConfigPath", None)
+        if get_folder:
+            return get_folder(config_path)
+        # <proyecto>/00_Pipeline/pipeline.json
+        return os.path.dirname(os.path.dirname(config_path))
+
+    def project_remote_root(self, project_path, config_path):
+        # Raíz remota de un proyecto que no es el actual, con sus propias reglas
+        try:
+            rules = self.core.getConfig("nextcloud", "path_mappings", configPath=config_path)
         except Exception as e:
-            print(f"Error al obtener archivo actual: {str(e)}")
-
-        # También puedes inspeccionar todos los renders si están disponibles
-        try:
-            if hasattr(mediaBrowser, "getAllRenders"):
-                renders = mediaBrowser.getAllRenders()
-                print("Renders encontrados:")
-                for r in renders:
-                    path = r.get("path", "")
-                    print(f" - {path}")
-            elif hasattr(mediaBrowser, "mediaPlayer") and hasattr(mediaBrowser.mediaPlayer, "getAllRenders"):
-                renders = mediaBrowser.mediaPlayer.getAllRenders()
-                print("Renders desde mediaPlayer:")
-                for r in renders:
-                    path = r.get("path", "")
-                    print(f" - {path}")
+            print(f"Error loading Nextcloud path mappings of {project_path}: {str(e)}")
+            rules = None
+
+        rules = [rule for rule in rules or [] if rule.get("local") and rule.get("remote")]
+        return PathMapper(rules).to_remote(project_path) or legacy_remote_root(project_path)
+
+    def get_dashboard(self, projects, force=False, cached_only=False):
+        # Sin UI: [(proyecto, shares, resumen, error)] de todos los proyectos.
+        # Los que no están frescos en el índice salen de un único listado de la
+        # cuenta (condicional si el servidor da ETag) repartido por raíces, así
+        # el coste no crece con el número de proyectos.
+        roots = [project["remote_root"] for project in projects]
+        buckets = {}
+        stale = [root for root in roots if force or not self.share_index.is_fresh(root)]
+        if stale and not cached_only:
+            with self.metrics.timed("dashboard.refresh"):
+                buckets, joined = self._inflight.do(
+                    (OCS_SHARES_ENDPOINT, "account", tuple(sorted(stale))), self._fetch_account_shares, stale
+                )
+
+        # Cada share cuenta solo en el proyecto más profundo que lo contiene
+        unique = {}
+        for root in roots:
+            root = root.rstrip('/') or '/'
+            listing = buckets[root] if root in buckets else self.get_cached_project_shares(root) or []
+            unique.update((share['id'], share) for share in listing)
+        counted = bucket_shares_by_root(unique.values(), roots)
+
+        return aggregate_projects(projects, lambda project: counted[project["remote_root"].rstrip('/') or '/'])
+
+    def _fetch_account_shares(self, roots):
+        # {raíz: todos los shares bajo la raíz} de un solo listado de todos los shares públicos de la cuenta
+        stored = self._load_stored_project(ACCOUNT_ROOT)
+        since = self._activity_head() if self.get_nextcloud_setting("delta_refresh", True) else None
+        headers = {"If-None-Match": stored["etag"]} if stored and stored["etag"] else None
+        response = self.get_ocs_client().get_shares(timeout=60, headers=headers)
+
+        if headers:
+            self.metrics.count("cache.etag." + ("hit" if response.status_code == 304 else "miss"))
+        if response.status_code == 304 and stored:
+            response.close()
+            shares, etag = stored["shares"], stored["etag"]
+        elif response.status_code != 200:
+            raise NextcloudError(f"Error getting all shares: HTTP {response.status_code}\n{response.text[:200]}")
+        else:
+            shares = [normalize_share(share) for share in iter_ocs_records(response) if is_public_share(share)]
+            etag = response.headers.get("ETag")
+            self._save_stored_project(ACCOUNT_ROOT, shares, etag)
+
+        # Es el mismo listado que usa _fetch_all_project_shares: la ETag vale para cada proyecto.
+        # El índice y la caché reciben todo lo que hay bajo cada raíz, aunque
+        # haya proyectos anidados; el reparto por la raíz más profunda es solo para contar
+        listings = bucket_shares_by_root(shares, roots, deepest_only=False)
+        for root, project_shares in listings.items():
+            self.share_index.fill(root, project_shares)
+            self._save_stored_project(root, project_shares, etag, since)
+            self._sync_marks[self.share_cache_key(root)] = {"since": since, "reloaded": time.time(), "etag": etag}
+        self.metrics.count("dashboard.projects_refreshed", len(listings))
+        return listings
+
+    def apply_share_maintenance(self, actions, on_progress=None, cancelled=None):
+        # Sin UI: se llama desde un worker. Aplica las acciones y actualiza el índice;
+        # `cancelled` (threading.Event) deja sin enviar las que faltan
+        client = self.get_ocs_client()
+        results = run_maintenance(
+            client, actions,
+            max_workers=client.pool_maxsize,
+            rate=self.get_nextcloud_setting("maintenance_rate", DEFAULT_MAINTENANCE_RATE),
+            on_progress=on_progress,
+            cancelled=cancelled
+        )
+
+        skipped = [action for action, error in results if error == ACTION_SKIPPED]
+        if skipped:
+            self.metrics.count("maintenance.skipped", len(skipped))
+            print(
+                f"Mantenimiento cancelado, {len(skipped)} cambios sin enviar:\n"
+                + "\n".join(f"{action['action']} {action['share']['path']} ({action['share']['id']})" for action in skipped)
+            )
+
+        changed = []
+        removed = []
+        for action, error in results:
+            if error:
+                continue
+            share = action["share"]
+            if action["action"] == ACTION_DELETE:
+                self.share_index.remove(share)
+                removed.append(share)
             else:
-                print("No se encontró método para obtener renders")
+                share = dict(share, expiration=action["expire_date"] + " 00:00:00")
+                self.share_index.update(share)
+                changed.append(share)
+
+        self._persist_share_changes(changed, removed)
+        return results
+
+    def onMediaBrowserOpen(self, mediaBrowser):
+        if DEBUG:
+            self._debug_media_browser(mediaBrowser)
+
+        # El panel se crea una sola vez por media browser
+        panel = getattr(mediaBrowser, "nextcloudPanel", None)
+        if panel is not None:
+            panel.schedule_refresh()
+            return
+
+        try:
+            anchor = self._find_media_browser_anchor(mediaBrowser)
+            if anchor is None:
+                return
+
+            parent_layout = anchor.parent().layout()
+            index = parent_layout.indexOf(anchor) if parent_layout else -1
+            if index == -1:
+                print("NextCloudLinks: no se pudo colocar el panel en el media browser")
+                return
+
+            panel = NextcloudMediaPanel(self, mediaBrowser)
+            parent_layout.insertWidget(index, panel)
+            mediaBrowser.nextcloudPanel = panel
+
         except Exception as e:
-            print(f"Error al obtener renders: {str(e)}")
+            print(f"Error al añadir el panel de Nextcloud: {str(e)}")
+
+    def _find_media_browser_anchor(self, mediaBrowser):
+        # La etiqueta "AOVs:" marca dónde va el panel; se busca una vez y queda guardada
+        anchor = getattr(mediaBrowser, "nextcloudAnchor", None)
+        if anchor is not None:
+            return anchor
+
+        for label in mediaBrowser.findChildren(QLabel):
+            if label.text() == "AOVs:":
+                mediaBrowser.nextcloudAnchor = label
+                return label
+
+        print("NextCloudLinks: no se encontró la etiqueta 'AOVs:' en el media browser")
+        return None
+
+    def _debug_media_browser(self, mediaBrowser):
+        # Solo con PRISM_NEXTCLOUD_DEBUG: vuelca lo que expone el media browser
+        print(f"Archivo actual: {media_player_path(getattr(mediaBrowser, 'mediaPlayer', None))}")
         print("Atributos de mediaBrowser:")
         for attr in dir(mediaBrowser):
             if not attr.startswith('__'):
-                print(f"  {attr}: {getattr(mediaBrowser, attr)}")
+                print(f"  {attr}: {getattr(mediaBrowser, attr, None)}")
         print("\nLayouts encontrados:")
         for child in mediaBrowser.children():
             if isinstance(child, QLayout):
                 print(f"  {type(child).__name__}: {child}")
-        try:
-            labels = mediaBrowser.findChildren(QLabel)
-            aovs_label = None
-            
-            # Buscar la etiqueta con texto "AOVs:"
-            for label in labels:
-                if label.text() == "AOVs:":
-                    aovs_label = label
-                    break
-            
-            if aovs_label is None:
-                print("No se encontró la etiqueta 'AOVs:'")
-                return
-            
-            # Obtener el layout padre de la etiqueta AOVs
-            parent_layout = aovs_label.parent().layout()
-            
-            if parent_layout is None:
-                print("No se pudo encontrar el layout padre")
-                return
-            
-            # Encontrar el índice de la etiqueta AOVs en el layout
-            index = parent_layout.indexOf(aovs_label)
-            
-            if index == -1:
-                print("No se pudo encontrar el índice de la etiqueta AOVs")
-                return
-            nueva_etiqueta =QPushButton("Nextcloud")
-            #nueva_etiqueta.setAlignment(Qt.AlignCenter)
-            nueva_etiqueta.setStyleSheet("background-color: #2C2C2C; color: #FFFFFF; padding: 5px;")
-            
-            parent_layout.insertWidget(index, nueva_etiqueta)
-
-                
-        except Exception as e:
-            print(f"Error al añadir etiqueta estática: {str(e)}")
-            import traceback
-            traceback.print_exc()
-
 
     def showInfoMessage(self, message):
         msg = QMessageBox()
@@ -284,77 +1828,286 @@ class Prism_NextCloudLinks_Functions(object):
         project_path = self.core.projectPath
         if not project_path:
             return "/PROYECTOS"
-        
-        project_path = os.path.abspath(project_path)
-        parts = project_path.split(os.sep)
-        parts_lower = [p.lower() for p in parts]
-        
-        if "proyectos" in parts_lower:
-            idx = parts_lower.index("proyectos")
-            relative_project_path = os.sep.join(parts[idx+1:])
-            return "/PROYECTOS/" + relative_project_path.replace(os.sep, '/')
-        else:
-            project_name = os.path.basename(project_path)
-            return "/PROYECTOS/" + project_name
 
-    def nextButton(self, origin, rcmenu, lw, item, path):
+        return self.get_path_mapper().to_remote(project_path)
+
+    def get_path_mapper(self):
+        # Reglas local -> remoto del proyecto actual, compiladas una sola vez por proyecto
+        project_path = self.core.projectPath or ""
+        if self._path_mapper and self._path_mapper[0] == project_path:
+            return self._path_mapper[1]
+
+        mapper = PathMapper(project_rules(self.get_path_mapping_rules(), project_path))
+        self._path_mapper = (project_path, mapper)
+        return mapper
+
+    def get_path_mapping_rules(self):
+        try:
+            rules = self.core.getConfig("nextcloud", "path_mappings", config="project")
+        except Exception as e:
+            print(f"Error loading Nextcloud path mappings: {str(e)}")
+            rules = None
+
+        return [rule for rule in rules or [] if rule.get("local") and rule.get("remote")]
+
+    def save_path_mapping_rules(self, rules):
+        if not self.core.projectPath:
+            self.showInfoMessage("Error: No project is loaded")
+            return
+
+        try:
+            self.core.setConfig("nextcloud", "path_mappings", rules, config="project")
+        except Exception as e:
+            self.showInfoMessage(f"Error saving path mappings: {str(e)}")
+            return
+
+        self._path_mapper = None
+
+    def get_auto_share_rules(self):
+        # Reglas del proyecto actual; se leen una vez por proyecto
+        project_path = self.core.projectPath
+        if self._auto_share_rules is None or self._auto_share_rules[0] != project_path:
+            try:
+                rules = self.core.getConfig("nextcloud", "auto_share_rules", config="project") if project_path else None
+            except Exception as e:
+                print(f"Error loading Nextcloud auto-share rules: {str(e)}")
+                rules = None
+            self._auto_share_rules = (project_path, [rule for rule in rules or [] if rule.get("events")])
+
+        return self._auto_share_rules[1]
+
+    def save_auto_share_rules(self, rules):
+        if not self.core.projectPath:
+            self.showInfoMessage("Error: No project is loaded")
+            return
+
+        try:
+            self.core.setConfig("nextcloud", "auto_share_rules", rules, config="project")
+        except Exception as e:
+            self.showInfoMessage(f"Error saving auto-share rules: {str(e)}")
+            return
+
+        self._auto_share_rules = None
+
+    def auto_share_queue_path(self):
+        return os.path.join(os.path.dirname(self.core.getUserPrefConfigPath()), QUEUE_FILENAME)
+
+    @property
+    def auto_share_queue(self):
+        if self._auto_share_queue is None:
+            self._auto_share_queue = ShareJobQueue(self.auto_share_queue_path())
+        return self._auto_share_queue
+
+    def start_auto_share_worker(self):
+        # Desde el hilo principal: ajustes, credenciales y motor se leen aquí y
+        # el hilo de la cola solo usa lo que ya está en memoria
+        self.get_nextcloud_settings()
+        self.share_index
+        self.share_store
+        self._auto_share_engine = self.get_share_engine()
+        if self._auto_share_worker is None:
+            self._auto_share_worker = AutoShareWorker(self.auto_share_queue, self.process_auto_share_batch)
+        self._auto_share_worker.start()
+        return self._auto_share_worker
+
+    def resume_auto_share(self, *args, **kwargs):
+        # Tras arrancar Prism: el hilo solo se lanza si quedaron enlaces
+        # automáticos pendientes de la sesión anterior
+        if self._auto_share_worker is not None or not os.path.exists(self.auto_share_queue_path()):
+            return
+
+        try:
+            pending = self.auto_share_queue.has_pending()
+        except Exception as e:
+            print(f"NextCloudLinks: no se pudo leer la cola de enlaces: {str(e)}")
+            return
+
+        if pending:
+            self.start_auto_share_worker()
+
+    def onPostRender(self, *args, **kwargs):
+        self.queue_auto_share(EVENT_RENDER, callback_output_paths(kwargs))
+
+    def onPostPlayblast(self, *args, **kwargs):
+        self.queue_auto_share(EVENT_PLAYBLAST, callback_output_paths(kwargs))
+
+    def onPostExport(self, *args, **kwargs):
+        self.queue_auto_share(EVENT_EXPORT, callback_output_paths(kwargs))
+
+    def onPostPublish(self, *args, **kwargs):
+        # Fin de la publicación: el lote sale ya, sin esperar a más salidas
+        if self._auto_share_worker:
+            self._auto_share_worker.wake(flush=True)
+
+    def queue_auto_share(self, event, paths):
+        # Se llama durante la publicación: solo reglas en memoria y un INSERT
+        # en la cola local, nunca una petición a Nextcloud
+        try:
+            rules = self.get_auto_share_rules()
+            if not rules or not paths:
+                return 0
+
+            jobs = []
+            remote_root = self.get_remote_root()
+            for path in paths:
+                rule = match_auto_share_rule(rules, event, path)
+                if rule is None:
+                    continue
+
+                target = share_target(path, rule)
+                nc_path = self.get_path_mapper().to_remote(target)
+                if not nc_path:
+                    continue
+
+                jobs.append({
+                    "local_path": target,
+                    "nc_path": nc_path,
+                    "permissions": PERMISSION_PRESETS.get(rule["permissions"], rule["permissions"]),
+                    "expiry": rule["expiry"],
+                    "event": event,
+                    "remote_root": remote_root
+                })
+
+            if not jobs:
+                return 0
+
+            added = self.auto_share_queue.enqueue(jobs)
+        except Exception as e:
+            # La publicación sigue aunque no se pueda encolar
+            self.core.writeErrorLog("Error queueing Nextcloud auto-share jobs", str(e))
+            return 0
+
+        self.metrics.count("autoshare.queued", added)
+        self.start_auto_share_worker().wake()
+        return added
+
+    def process_auto_share_batch(self, jobs):
+        # Lo llama el hilo de la cola. Un único listado de shares por proyecto
+        # del lote (el de cada trabajo, no el abierto ahora en Prism); después
+        # solo se crean (en paralelo) los que faltan.
+        from concurrent.futures import ThreadPoolExecutor
+
+        for remote_root in sorted({job["remote_root"] for job in jobs if job["remote_root"]}):
+            if self.share_index.is_fresh(remote_root):
+                continue
+            try:
+                self.fetch_project_public_shares(remote_root)
+            except Exception as e:
+                print(f"Error listando los enlaces de {remote_root}: {str(e)}")
+
+        engine = self._auto_share_engine
+
+        def share(job):
+            try:
+                with self.metrics.timed("share_link.resolve"):
+                    url = engine.share(job["nc_path"], job["permissions"], expire_date_for(job["expiry"]))[0]
+                return job, url, ""
+            except Exception as e:
+                return job, "", str(e)
+
+        with self.metrics.timed("autoshare.batch"):
+            with ThreadPoolExecutor(max_workers=NextcloudBatchShare.MAX_WORKERS) as pool:
+                results = list(pool.map(share, jobs))
+
+        failed = sum(1 for _, _, error in results if error)
+        self.metrics.count("autoshare.shared", len(results) - failed)
+        self.metrics.count("autoshare.retried", failed)
+        return results
+
+    def get_nextcloud_icon(self):
+        # El icono se busca y colorea una vez por sesión
+        if self._icon is None:
+            iconPath = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                "Icons",
+                "logo_nextcloud.png"
+            )
+            if os.path.exists(iconPath):
+                self._icon = self.core.media.getColoredIcon(iconPath)
+            else:
+                print(f"NextCloudLinks: icono no encontrado en: {iconPath}")
+                self._icon = QIcon()
+
+        return self._icon
+
+    def local_share_status(self, path):
+        # Texto con los enlaces públicos de la ruta según el índice local, sin red ni disco
+        try:
+            nc_path = self.local_path_to_remote(path)
+        except NextcloudError:
+            return "Enlaces públicos: ruta fuera de Nextcloud"
+
+        shares = self.share_index.lookup(nc_path, include_stale=True)
+        if shares is None:
+            return "Enlaces públicos: sin comprobar"
+        if not shares:
+            return "Sin enlaces públicos"
+        return f"Enlaces públicos: {len(shares)}"
+
+    def add_share_menu_actions(self, origin, menu, path):
         nextcloudButton = QAction("Compartir por Nextcloud", origin)
-        iconPath = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            "Icons",
-            "logo_nextcloud.png"
-        )
-        if not os.path.exists(iconPath):
-            self.showInfoMessage(f"Icono no encontrado en: {iconPath}")
-        
-        icon = self.core.media.getColoredIcon(iconPath)
-        nextcloudButton.setIcon(icon)
+        nextcloudButton.setIcon(self.get_nextcloud_icon())
         nextcloudButton.triggered.connect(lambda: self.showNextcloudShareMenu(path))
-        rcmenu.addAction(nextcloudButton)
+        menu.addAction(nextcloudButton)
 
         nextcloudLinkList = QAction("Links generados", origin)
         nextcloudLinkList.triggered.connect(lambda: self.show_public_links_list(path))
-        rcmenu.addAction(nextcloudLinkList)
+        menu.addAction(nextcloudLinkList)
+
+        nextcloudStatus = QAction(self.local_share_status(path), origin)
+        nextcloudStatus.setEnabled(False)
+        menu.addAction(nextcloudStatus)
+
+    def nextButton(self, origin, rcmenu, lw, item, path):
+        self.add_share_menu_actions(origin, rcmenu, path)
+
+        paths = self._get_selected_paths(lw, path)
+        if len(paths) > 1:
+            nextcloudBatchButton = QAction(f"Compartir selección por Nextcloud ({len(paths)})", origin)
+            nextcloudBatchButton.setIcon(self.get_nextcloud_icon())
+            nextcloudBatchButton.triggered.connect(lambda: self.showNextcloudBatchShareDialog(paths))
+            rcmenu.addAction(nextcloudBatchButton)
+
+    def _get_selected_paths(self, lw, path):
+        # Rutas de todos los elementos seleccionados en la lista del project browser
+        paths = []
+        try:
+            for selected in lw.selectedItems():
+                if isinstance(selected, QTreeWidgetItem):
+                    data = selected.data(0, Qt.UserRole)
+                else:
+                    data = selected.data(Qt.UserRole)
+
+                if isinstance(data, dict):
+                    data = data.get("path")
+                if isinstance(data, str) and data and data not in paths:
+                    paths.append(data)
+        except Exception:
+            pass
+
+        # Si la ruta del elemento pulsado no aparece, la selección no es fiable
+        if path not in paths:
+            return [path]
+
+        return paths
 
     def nextButtonPreview(self, origin, menu):
         if not menu:
             return
         
-        contexts = origin.getCurRenders()
-        if not contexts or not contexts[0].get("path"):
+        path = media_player_path(origin)
+        if not path:
             return
-        
-        path = contexts[0]["path"]
-
-        if hasattr(origin, "seq") and len(origin.seq) == 1:
-            path = os.path.join(path, origin.seq[0])
-        
-        nextcloudButtonPreview = QAction("Compartir por Nextcloud", origin)
-        iconPath = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            "Icons",
-            "logo_nextcloud.png"
-        )
-        if not os.path.exists(iconPath):
-            self.showInfoMessage(f"Icono no encontrado en: {iconPath}")
-        
-        icon = self.core.media.getColoredIcon(iconPath)
-        nextcloudButtonPreview.setIcon(icon)
-        nextcloudButtonPreview.triggered.connect(lambda: self.showNextcloudShareMenu(path))
-        menu.addAction(nextcloudButtonPreview)
 
-        nextcloudLinkListPreview = QAction("Links generados", origin)
-        nextcloudLinkListPreview.triggered.connect(lambda: self.show_public_links_list(path))
-        menu.addAction(nextcloudLinkListPreview)
+        self.add_share_menu_actions(origin, menu, path)
 
     def showNextcloudShareMenu(self, path):
+        # Mientras se eligen las opciones se actualiza el árbol remoto para el aviso de sincronización
+        self.refresh_remote_tree_async()
+
         # Crear el menú de configuración
         share_menu = QMenu("Configuración de Nextcloud")
 
-        # Almacenar los valores del combobox
-        permisos_combo = None
-        duracion_combo = None
-
         # Añadir título como primera acción (no clickable)
         title_action = QWidgetAction(share_menu)
         title_widget = QLabel("<b>Configuración del link</b>")
@@ -365,8 +2118,7 @@ class Prism_NextCloudLinks_Functions(object):
         share_menu.addSeparator()
         
         
-        def create_option_widget(label_text):
-            nonlocal permisos_combo, duracion_combo
+        def create_option_widget(label_text, options):
             widget = QWidgetAction(share_menu)
             container = QWidget()
             layout = QHBoxLayout()
@@ -374,49 +2126,52 @@ class Prism_NextCloudLinks_Functions(object):
 
             # Combo box
             combo = QComboBox()
-            if label_text == "Permisos":
-                combo.addItems(["ONLY READ", "EDIT"])
-                permisos_combo = combo
-            elif label_text == "Duración del link":
-                combo.addItems(["1 DAY", "1 MONTH", "6 MONTHS", "ALWAYS"])
-                duracion_combo = combo
+            combo.addItems(list(options))
             
             # Añadir al layout
             layout.addWidget(label)
             layout.addWidget(combo)
             container.setLayout(layout)
             widget.setDefaultWidget(container)
-            return widget
+            return widget, combo
     
         # Añadir opciones al menú
-        share_menu.addAction(create_option_widget("Permissions"))
-        share_menu.addAction(create_option_widget("Link duration"))
+        permisos_action, permisos_combo = create_option_widget("Permissions", PERMISSION_PRESETS)
+        duracion_action, duracion_combo = create_option_widget("Link duration", EXPIRY_PRESETS)
+        duracion_combo.setCurrentText("1 MONTH")
+        share_menu.addAction(permisos_action)
+        share_menu.addAction(duracion_action)
+
+        upload_action = QWidgetAction(share_menu)
+        upload_check = QCheckBox("Subir si no está en Nextcloud")
+        upload_check.setChecked(self.get_nextcloud_setting("upload_before_share", False))
+        upload_action.setDefaultWidget(upload_check)
+        share_menu.addAction(upload_action)
+
+        verify_action = QWidgetAction(share_menu)
+        verify_check = QCheckBox("Verificar con Nextcloud antes de compartir")
+        verify_check.setChecked(self.get_nextcloud_setting("verify_before_share", False))
+        verify_action.setDefaultWidget(verify_check)
+        share_menu.addAction(verify_action)
         share_menu.addSeparator()
 
         accept_action = QWidgetAction(share_menu)
         accept_widget = QPushButton("Generate link")
 
         def on_generate_clicked():
-            # Obtener los valores seleccionados
-            permisos = permisos_combo.currentText() if permisos_combo else "READ ONLY"
-            duracion = duracion_combo.currentText() if duracion_combo else "1 día"
-
-            # Convertir a valores validos para la api de nextcloud
-            permisos_value = "1" if permisos == "READ ONLY" else "23"
-
-            if duracion == "1 día":
-                expire_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-            elif duracion == "1 mes":
-                expire_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
-            elif duracion == "6 meses":
-                expire_date = (datetime.now() + timedelta(days=180)).strftime("%Y-%m-%d")
-            elif duracion == "Siempre":
-                expire_date = None
-            else:
-                expire_date =(datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+            # Convertir los valores seleccionados a valores validos para la api de nextcloud
+            permisos_value = PERMISSION_PRESETS[permisos_combo.currentText()]
+            expire_date = expire_date_for(duracion_combo.currentText())
 
-            self.generar_y_copiar_enlace(path, permisos_value, expire_date)
             share_menu.close()
+            if upload_check.isChecked() or verify_check.isChecked():
+                # La subida y los hashes pueden tardar: en segundo plano, con progreso
+                self.start_share_job(
+                    [path], permisos_value, expire_date,
+                    upload=upload_check.isChecked(), verify=verify_check.isChecked()
+                )
+            else:
+                self.generar_y_copiar_enlace(path, permisos_value, expire_date)
 
         accept_widget.clicked.connect(on_generate_clicked)        
         
@@ -425,6 +2180,53 @@ class Prism_NextCloudLinks_Functions(object):
 
         # Mostrar el menú en la posición del cursor
         share_menu.exec_(QCursor.pos())    
+
+    def showNextcloudBatchShareDialog(self, paths):
+        self.refresh_remote_tree_async()
+        dialog = QDialog()
+        dialog.setWindowTitle("Compartir selección por Nextcloud")
+        layout = QFormLayout(dialog)
+        layout.addRow(QLabel(f"<b>{len(paths)} elementos seleccionados</b>"))
+
+        permisos_combo = QComboBox()
+        permisos_combo.addItems(list(PERMISSION_PRESETS))
+        layout.addRow("Permissions", permisos_combo)
+
+        duracion_combo = QComboBox()
+        duracion_combo.addItems(list(EXPIRY_PRESETS))
+        duracion_combo.setCurrentText("1 MONTH")
+        layout.addRow("Link duration", duracion_combo)
+
+        upload_check = QCheckBox("Subir lo que falte en Nextcloud antes de compartir")
+        upload_check.setChecked(self.get_nextcloud_setting("upload_before_share", False))
+        layout.addRow(upload_check)
+
+        verify_check = QCheckBox("Verificar con Nextcloud antes de compartir")
+        verify_check.setChecked(self.get_nextcloud_setting("verify_before_share", False))
+        layout.addRow(verify_check)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.button(QDialogButtonBox.Ok).setText("Generate links")
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow(buttons)
+
+        if not dialog.exec_():
+            return
+
+        self.start_share_job(
+            paths,
+            PERMISSION_PRESETS[permisos_combo.currentText()],
+            expire_date_for(duracion_combo.currentText()),
+            upload=upload_check.isChecked(),
+            verify=verify_check.isChecked()
+        )
+
+    def start_share_job(self, paths, permissions, expire_date, upload=False, verify=False):
+        job = NextcloudBatchShare(self, paths, permissions, expire_date, upload=upload, verify=verify)
+        # Mantener una referencia mientras los workers siguen activos
+        self._batch_jobs.add(job)
+        job.start()
     
     def generar_y_copiar_enlace(self, path, permissions="1", expire_date=None):
         try:
@@ -437,26 +2239,52 @@ class Prism_NextCloudLinks_Functions(object):
             self.showInfoMessage("Nextcloud UI Error", str(e))
 
     def ruta_local_a_ruta_nextcloud(self, path):
-        # Normalizar rutas para comparación segura
-        project_path = self.core.projectPath
-        project_path = os.path.abspath(project_path)
-        abs_path = os.path.abspath(path)
-        
-        if not abs_path.startswith(project_path):
-            error_msg = (
-                "Error: La ruta no está dentro del directorio Nextcloud\n"
-                f"Directorio Nextcloud: {project_path}\n"
-                f"Ruta seleccionada: {abs_path}"
+        try:
+            return self.local_path_to_remote(path)
+        except NextcloudError as e:
+            self.showInfoMessage(str(e))
+            return None
+
+    def local_path_to_remote(self, path):
+        nc_path = self.get_path_mapper().to_remote(path)
+        if not nc_path:
+            raise NextcloudError(
+                "Error: La ruta no está dentro de ninguna carpeta de Nextcloud configurada\n"
+                f"Directorio del proyecto: {self.core.projectPath}\n"
+                f"Ruta seleccionada: {path}"
             )
+
+        return nc_path
+
+    def generar_enlace_nextcloud(self, path, permissions="1", expire_date=None, verify=False):
+        import requests
+
+        try:
+            if not self.confirm_share_unsynced(path):
+                return None
+
+            return self.resolve_share_link(path, permissions, expire_date, verify=verify)
+
+        except NextcloudAPIError as e:
+            self.core.writeErrorLog("Nextcloud API Error", str(e))
+            self.showInfoMessage(str(e))
+        except NextcloudError as e:
+            self.showInfoMessage(str(e))
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Error de conexión: {str(e)}"
             self.showInfoMessage(error_msg)
-            return None
-        
-        nextcloud_remote_root = self.get_remote_root()
-        rel_path = os.path.relpath(abs_path, project_path)
-        nc_path = nextcloud_remote_root + "/" + rel_path.replace('\\', '/').lstrip('/')
-        return nc_path.replace("//", "/")
+            self.core.writeErrorLog("Connection Error", error_msg)
+        except Exception as e:
+            error_msg = f"Error inesperado: {str(e)}"
+            self.showInfoMessage(error_msg)
+            self.core.writeErrorLog("Unexpected Error", error_msg)
+
+        return None
 
-    def generar_enlace_nextcloud(self, path, permissions="1", expire_date=None):
+    def resolve_share_link(self, path, permissions="1", expire_date=None, upload=False, verify=False,
+                           on_progress=None, check_sync=False):
+        # Igual que generar_enlace_nextcloud pero sin UI: lanza NextcloudError,
+        # así que puede usarse desde hilos de trabajo
         # Verificar credenciales primero
         cred_errors = []
         if not self.nextcloud_url: 
@@ -467,167 +2295,143 @@ class Prism_NextCloudLinks_Functions(object):
             cred_errors.append("Contraseña de Nextcloud no configurada")
         
         if cred_errors:
-            error_msg = "Configuración incompleta:\n" + "\n".join(cred_errors)
-            self.showInfoMessage(error_msg)
-            return None 
+            raise NextcloudError("Configuración incompleta:\n" + "\n".join(cred_errors))
 
         # Verificar si el path es válido
         if not path or not os.path.exists(path):
-            self.showInfoMessage(f"Ruta inválida o no existe:\n{path}")
-            return None
+            raise NextcloudError(f"Ruta inválida o no existe:\n{path}")
+
+        nc_path = self.local_path_to_remote(path)
+
+        if check_sync:
+            # Comparación completa con el árbol remoto (recorre las carpetas locales)
+            status = self.remote_sync_status(path, deep=True)
+            if status in (SYNC_MISSING, SYNC_PARTIAL):
+                raise NextcloudError(UNSYNCED_MESSAGES[status])
+
+        if upload:
+            # El share se crea solo cuando el fichero ya está completo en el servidor
+            with self.metrics.timed("upload.path"):
+                self.upload_missing(path, nc_path, on_progress)
+
+        if verify:
+            # Nada de enlaces a una copia truncada o distinta de la local
+            self.verify_remote_copy(path, nc_path, on_progress)
+
+        return self.share_remote_path(nc_path, permissions, expire_date)
+
+    def share_remote_path(self, nc_path, permissions="1", expire_date=None):
+        # Enlace de una ruta de Nextcloud: el existente si coincide, si no uno nuevo
+        with self.metrics.timed("share_link.resolve"):
+            return self.get_share_engine().share(nc_path, permissions, expire_date)[0]
+
+    def get_share_engine(self):
+        # Motor sin UI con el cliente, las reglas de rutas y el índice actuales;
+        # se rehace si cambian las credenciales o el proyecto
+        client, mapper = self.get_ocs_client(), self.get_path_mapper()
+        engine = self._share_engine
+        if engine is None or engine.client is not client or engine.mapper is not mapper:
+            engine = self._share_engine = ShareEngine(
+                client, mapper, self.share_index, self.metrics, self._inflight,
+                on_created=lambda share: self._persist_share_changes(changed=[share]),
+                checksum_cache=self._checksum_cache
+            )
+        return engine
+
+    def upload_missing(self, path, nc_path, on_progress=None):
+        # Sin UI: sube por WebDAV lo que no esté en el servidor (o tenga otro tamaño)
+        progress = None
+        if on_progress:
+            progress = lambda sent, total: on_progress(sent // (1024 * 1024))
+
+        chunk_mb = self.get_nextcloud_setting("upload_chunk_mb", DEFAULT_CHUNK_SIZE // (1024 * 1024))
+        return self.get_share_engine().upload_missing(path, nc_path, progress, chunk_size=chunk_mb * 1024 * 1024)
+
+    def verify_remote_copy(self, path, nc_path, on_progress=None):
+        # Sin UI: compara tamaños y checksums de Nextcloud con los ficheros
+        # locales. Lanza NextcloudError con los que no coinciden.
+        progress = None
+        if on_progress:
+            progress = lambda hashed, total: on_progress(hashed // (1024 * 1024))
+
+        with self.metrics.timed("verify.path"):
+            return self.get_share_engine().verify(path, nc_path, progress)
+
+    def get_remote_tree(self, remote_root=None):
+        # Un árbol por servidor, usuario y proyecto
+        remote_root = remote_root or self.get_remote_root()
+        key = self.share_cache_key(remote_root)
+        tree = self._remote_trees.get(key)
+        if tree is None:
+            tree = self._remote_trees[key] = RemoteTree(remote_root)
+        return tree
+
+    def refresh_remote_tree(self, remote_root=None):
+        # Sin UI: PROPFIND de las carpetas cuya etag ha cambiado. Una sola a la vez por proyecto
+        tree = self.get_remote_tree(remote_root)
+        with self.metrics.timed("remote_tree.refresh"):
+            requests_made, joined = self._inflight.do(
+                (DAV_FILES_ROOT, "tree", tree.root), tree.refresh, self.get_ocs_client()
+            )
+        if not joined:
+            self.metrics.count("remote_tree.propfind", requests_made)
+        return tree
 
-        try:
-            nc_path = self.ruta_local_a_ruta_nextcloud(path)
-            if not nc_path:
-                return None
+    def refresh_remote_tree_async(self, remote_root=None):
+        tree = self.get_remote_tree(remote_root)
+        if self._inflight.in_flight((DAV_FILES_ROOT, "tree", tree.root)):
+            return
 
-        except Exception as e:
-            self.showInfoMessage(f"Error al convertir ruta:\n{str(e)}")
-            return None
-        
-        # Verificar shares existentes para este recurso
-        existing_share = self._get_existing_share(nc_path, permissions, expire_date)
-        if existing_share:
-            return existing_share
-        
-        return self._create_new_share(nc_path, permissions, expire_date)
-        
-    def _get_existing_share(self, nc_path, desired_permissions, desired_expire_date=None):    
-        # Busca shares existentes que coincidan con los parámetros deseados
-        try:
-            import urllib.parse
-            encoded_path = urllib.parse.quote(nc_path)
-        except:
-            encoded_path = nc_path
-        
-        endpoint = f"{self.nextcloud_url.rstrip('/')}/ocs/v2.php/apps/files_sharing/api/v1/shares?path={encoded_path}&reshares=true"
-        headers = {
-            "OCS-APIRequest": "true",
-            "Accept": "application/json"
-        }
+        QThreadPool.globalInstance().start(NextcloudWorker(self._refresh_remote_tree_quietly, tree.root))
 
+    def _refresh_remote_tree_quietly(self, remote_root):
         try:
-            # Enviar solicitud
-            response = requests.get(
-                endpoint,
-                headers=headers,
-                auth=(self.nextcloud_user, self.nextcloud_password),
-                timeout=20
-            )
-
-            # 6. Procesar respuesta
-            if response.status_code != 200:
-                return None
-            
-            try:
-                data = response.json()
-                shares = data.get('ocs', {}).get('data', [])
-            except ValueError:
-                # Si falla el JSON, intentar parsear como XML
-                try:
-                    root = ET.fromstring(response.content)
-                    shares = []
-                    for element in root.findall('.//element'):
-                        share_data = {}
-                        for child in element:
-                            if child.tag == 'id':
-                                share_data['id'] = child.text
-                            elif child.tag == 'share_type':
-                                share_data['share_type'] = child.text
-                            elif child.tag == 'permissions':
-                                share_data['permissions'] = child.text
-                            elif child.tag == 'url':
-                                share_data['url'] = child.text
-                            elif child.tag == 'expiration':
-                                share_data['expiration'] = child.text
-                        shares.append(share_data)
-                except ET.ParseError:
-                    self.core.writeErrorLog("Nextcloud API Response Parse Error", "Could not parse response as JSON or XML")
-                    return None
-
-            public_shares = [s for s in shares if str(s.get('share_type')) == '3']
-            
-            for share in public_shares:
-                # Comparar permisos
-                current_permissions = str(share.get('permissions', 0))
-                if current_permissions != desired_permissions:  # 17 es lectura + compartir
-                    continue
-                current_expire = share.get('expiration', '')
-                if desired_expire_date is None:
-                    if current_expire:
-                        continue
-                else:
-                    if not current_expire:
-                        continue
-                    if not current_expire.startswith(desired_expire_date):
-                        continue
-                return share.get('url', '')
-            
+            self.refresh_remote_tree(remote_root)
         except Exception as e:
-            self.core.writeErrorLog("Error checking existing shares", str(e))
-        
-        return None
-    
-    def _create_new_share(self, nc_path, permissions, expire_date=None):
-        # Crear nuevo share
-        endpoint = f"{self.nextcloud_url.rstrip('/')}/ocs/v2.php/apps/files_sharing/api/v1/shares"
-        headers = {
-            "OCS-APIRequest": "true",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Accept": "application/json"
-        }
-        data = {
-            "path": nc_path,
-            "shareType": "3",  # Enlace público
-            "permissions": permissions
-        }
-        
-        if expire_date:
-            data["expireDate"] = expire_date
+            print(f"Error actualizando el árbol remoto de {remote_root}: {str(e)}")
 
+    def remote_sync_status(self, path, deep=False):
+        # synced / partial / missing según el árbol en memoria, sin ir al servidor;
+        # unknown si el árbol no cubre la ruta (y entonces se pide en segundo plano).
+        # deep=True compara también cada fichero de una carpeta: solo fuera del hilo de la UI
         try:
-            response = requests.post(
-                endpoint,
-                headers=headers,
-                data=data,
-                auth=(self.nextcloud_user, self.nextcloud_password),
-                timeout=20
-            )
+            nc_path = self.local_path_to_remote(path)
+        except NextcloudError:
+            return SYNC_UNKNOWN
+
+        tree = self.get_remote_tree()
+        status = tree.sync_status(path, nc_path, deep)
+        self.metrics.count("cache.tree." + ("miss" if status == SYNC_UNKNOWN else "hit"))
+        if not tree.loaded:
+            self.refresh_remote_tree_async()
+        return status
+
+    def confirm_share_unsynced(self, path):
+        # Antes de crear el enlace: si el árbol remoto dice que falta algo, se
+        # actualiza (solo las carpetas cambiadas) y se pregunta al usuario.
+        # En el hilo de la UI: de una carpeta solo se comprueba que esté en el servidor
+        status = self.remote_sync_status(path)
+        if status not in (SYNC_MISSING, SYNC_PARTIAL):
+            return True
 
-            if response.status_code != 200:
-                error_msg = (f"Error en la API (HTTP {response.status_code}):\n"
-                            f"Respuesta: {response.text[:200]}{'...' if len(response.text) > 200 else ''}")
-                self.core.writeErrorLog("Nextcloud API Error", error_msg)
-                self.showInfoMessage(error_msg)
-                return None
-            
-            try:
-                json_data = response.json()
-                url = json_data.get('ocs', {}).get('data', {}).get('url', '')
-                if url:
-                    return url
-            
-            except ValueError:
-                root = ET.fromstring(response.content)
-                url_element = root.find('.//ns:url', namespaces) or root.find('.//url')
-                if url_element is not None and url_element.text:
-                    return url_element.text
-                
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Error de conexión: {str(e)}"
-            self.showInfoMessage(error_msg)
-            self.core.writeErrorLog("Connection Error", error_msg)
-        except ET.ParseError:
-            error_msg = "Error al analizar respuesta XML"
-            self.showInfoMessage(error_msg)
-            self.core.writeErrorLog("XML Parse Error", error_msg)
+        try:
+            self.refresh_remote_tree()
+            status = self.remote_sync_status(path)
         except Exception as e:
-            error_msg = f"Error inesperado: {str(e)}"
-            self.showInfoMessage(error_msg)
-            self.core.writeErrorLog("Unexpected Error", error_msg)
-            
-        self.showInfoMessage(f"No se pudo extraer el enlace de la respuesta")
-        return None    
+            print(f"Error actualizando el árbol remoto: {str(e)}")
+        if status not in (SYNC_MISSING, SYNC_PARTIAL):
+            return True
+
+        answer = QMessageBox.question(
+            None, "Prism",
+            f"{UNSYNCED_MESSAGES[status]}:\n{path}\n\n¿Generar el enlace igualmente?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        return answer == QMessageBox.Yes
+
+    def get_path_public_shares(self, nc_path):
+        # Shares públicos de una ruta: desde el índice si la cubre, si no desde el servidor
+        return self.get_share_engine().path_shares(nc_path)
 
     # Mostrar los links ya generados 
     def show_public_links_list(self, path):
@@ -672,7 +2476,7 @@ class Prism_NextCloudLinks_Functions(object):
                     permissions_text = 'READ/WRITE'
                 else:
                     permissions_text = f'Desconocido ({permissions_value})'
-                expiration = share.get('expiration', 'No caduce')
+                expiration = share.get('expiration') or 'Sin duración limite'
                 
                 table.setItem(row, 0, QTableWidgetItem(url))
                 table.setItem(row, 1, QTableWidgetItem(permissions_text))
@@ -697,45 +2501,12 @@ class Prism_NextCloudLinks_Functions(object):
 
     def _get_all_public_shares(self, nc_path):
         #Obtiene todos los shares públicos existentes para un recurso
-        endpoint = f"{self.nextcloud_url.rstrip('/')}/ocs/v2.php/apps/files_sharing/api/v1/shares?path={nc_path}&reshares=true"
-        headers = {
-            "OCS-APIRequest": "true",
-            "Accept": "application/json"
-        }
-
         try:
-            response = requests.get(
-                endpoint,
-                headers=headers,
-                auth=(self.nextcloud_user, self.nextcloud_password),
-                timeout=20
-            )
-            
-            if response.status_code != 200:
-                error_msg = f"Error en la API (HTTP {response.status_code}):\n{response.text[:200]}"
-                self.showInfoMessage(error_msg)
-                return []
-            
-            shares = response.json().get('ocs', {}).get('data', [])
-            public_shares = []
-            for share in shares:
-                share_type = str(share.get('share_type', ''))
-                permissions = str(share.get('permissions', ''))
-                
-                if share_type == '3':
-                    expiration = share.get('expiration', '')
-                    if not expiration:
-                        expiration = 'Sin duración limite'
-
-                    public_shares.append({
-                        'url': share.get('url', ''),
-                        'permissions': permissions,
-                        'expiration': expiration,
-                        'id': share.get('id', '')
-                    })
-            
-            return public_shares
-            
+            return self.get_path_public_shares(nc_path)
+
+        except NextcloudError as e:
+            self.showInfoMessage(str(e))
+            return []
         except Exception as e:
             error_msg = f"Error al obtener shares:\n{str(e)}"
             self.showInfoMessage(error_msg)
@@ -789,8 +2560,137 @@ class Prism_NextCloudLinks_Functions(object):
             origin.le_url.text()
         ))
         
+        # Ajustes generales
+        origin.gb_nextcloudSettings = QGroupBox("Nextcloud Settings")
+        origin.lo_nextcloudSettings = QFormLayout(origin.gb_nextcloudSettings)
+
+        origin.sp_shareCacheTtl = QSpinBox()
+        origin.sp_shareCacheTtl.setRange(0, 86400)
+        origin.sp_shareCacheTtl.setSuffix(" s")
+        origin.sp_shareCacheTtl.setToolTip("Time the list of public links is reused before asking the server again (0 disables the cache)")
+        origin.lo_nextcloudSettings.addRow("Link cache duration:", origin.sp_shareCacheTtl)
+
+        origin.cb_shareListingMode = QComboBox()
+        origin.cb_shareListingMode.addItem("Project folders only", "scoped")
+        origin.cb_shareListingMode.addItem("All shares of the account", "full")
+        origin.cb_shareListingMode.setToolTip(
+            "How the Nextcloud tab lists the links of the current project. Project folders only asks once per "
+            "folder on the server and falls back to all shares if the server rejects folder queries"
+        )
+        origin.lo_nextcloudSettings.addRow("Link listing:", origin.cb_shareListingMode)
+
+        origin.chb_persistentShareCache = QCheckBox("Keep the links on disk between sessions")
+        origin.btn_clearShareCache = QPushButton("Clear")
+        origin.btn_clearShareCache.clicked.connect(self.clear_share_cache)
+        origin.lo_persistentShareCache = QHBoxLayout()
+        origin.lo_persistentShareCache.addWidget(origin.chb_persistentShareCache)
+        origin.lo_persistentShareCache.addStretch()
+        origin.lo_persistentShareCache.addWidget(origin.btn_clearShareCache)
+        origin.lo_nextcloudSettings.addRow("Disk cache:", origin.lo_persistentShareCache)
+
+        origin.chb_deltaRefresh = QCheckBox("Refresh incrementally with the activity feed")
+        origin.chb_deltaRefresh.setToolTip(
+            "Ask Nextcloud only for the link changes since the last refresh; the whole list is downloaded again "
+            "when the feed has a gap or is not available"
+        )
+        origin.lo_nextcloudSettings.addRow("Refresh:", origin.chb_deltaRefresh)
+
+        origin.chb_uploadBeforeShare = QCheckBox("Upload missing files before sharing")
+        origin.chb_uploadBeforeShare.setToolTip("Default for the share menu: upload with WebDAV what the sync client has not uploaded yet")
+        origin.lo_nextcloudSettings.addRow("Upload:", origin.chb_uploadBeforeShare)
+
+        origin.chb_verifyBeforeShare = QCheckBox("Verify the server copy before sharing")
+        origin.chb_verifyBeforeShare.setToolTip("Default for the share menu: compare sizes and checksums with the local files before creating the link")
+        origin.lo_nextcloudSettings.addRow("Verify:", origin.chb_verifyBeforeShare)
+
+        # Reglas de rutas locales -> remotas del proyecto actual
+        origin.gb_pathMappings = QGroupBox("Path Mappings (current project)")
+        origin.lo_pathMappings = QVBoxLayout(origin.gb_pathMappings)
+        origin.te_pathMappings = QPlainTextEdit()
+        origin.te_pathMappings.setPlaceholderText("One rule per line:\nD:/Proyectos -> /PROYECTOS")
+        origin.te_pathMappings.setMaximumHeight(100)
+        origin.btn_savePathMappings = QPushButton("Save Path Mappings")
+        origin.btn_savePathMappings.clicked.connect(
+            lambda: self.save_path_mapping_rules(parse_rules(origin.te_pathMappings.toPlainText()))
+        )
+        origin.lo_pathMappings.addWidget(origin.te_pathMappings)
+        origin.lo_pathMappings.addWidget(origin.btn_savePathMappings)
+        origin.gb_pathMappings.setEnabled(bool(self.core.projectPath))
+
+        # Reglas de enlaces automáticos al publicar, del proyecto actual
+        origin.gb_autoShare = QGroupBox("Auto-share on publish (current project)")
+        origin.lo_autoShare = QVBoxLayout(origin.gb_autoShare)
+        origin.te_autoShareRules = QPlainTextEdit()
+        origin.te_autoShareRules.setPlaceholderText(
+            "One rule per line: events | path pattern | permissions | duration | folder/file\n"
+            "render,playblast | */Playblasts/* | ONLY READ | 1 MONTH | folder"
+        )
+        origin.te_autoShareRules.setMaximumHeight(100)
+        origin.btn_saveAutoShareRules = QPushButton("Save Auto-share Rules")
+        origin.btn_saveAutoShareRules.clicked.connect(
+            lambda: self.save_auto_share_rules(parse_auto_share_rules(origin.te_autoShareRules.toPlainText()))
+        )
+        origin.lo_autoShare.addWidget(origin.te_autoShareRules)
+        origin.lo_autoShare.addWidget(origin.btn_saveAutoShareRules)
+        origin.gb_autoShare.setEnabled(bool(self.core.projectPath))
+
         origin.lo_nextcloud.addWidget(origin.gb_credentials)
         origin.lo_nextcloud.addWidget(origin.btn_save)
+        origin.lo_nextcloud.addWidget(origin.gb_nextcloudSettings)
+        origin.lo_nextcloud.addWidget(origin.gb_pathMappings)
+        origin.lo_nextcloud.addWidget(origin.gb_autoShare)
+
+        # Diagnóstico: tiempos, bytes y aciertos de caché de esta sesión
+        origin.gb_nextcloudDiagnostics = QGroupBox("Diagnostics")
+        origin.lo_nextcloudDiagnostics = QVBoxLayout(origin.gb_nextcloudDiagnostics)
+        origin.te_nextcloudDiagnostics = QPlainTextEdit()
+        origin.te_nextcloudDiagnostics.setReadOnly(True)
+        origin.te_nextcloudDiagnostics.setLineWrapMode(QPlainTextEdit.NoWrap)
+        origin.te_nextcloudDiagnostics.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        origin.te_nextcloudDiagnostics.setMinimumHeight(160)
+        origin.lo_diagnosticsButtons = QHBoxLayout()
+        origin.btn_refreshDiagnostics = QPushButton("Refresh")
+        origin.btn_testConnection = QPushButton("Test connection")
+        origin.btn_exportDiagnostics = QPushButton("Export JSON...")
+        origin.btn_resetDiagnostics = QPushButton("Reset")
+        for button in (origin.btn_refreshDiagnostics, origin.btn_testConnection,
+                       origin.btn_exportDiagnostics, origin.btn_resetDiagnostics):
+            origin.lo_diagnosticsButtons.addWidget(button)
+        origin.lo_nextcloudDiagnostics.addWidget(origin.te_nextcloudDiagnostics)
+        origin.lo_nextcloudDiagnostics.addLayout(origin.lo_diagnosticsButtons)
+        origin.lo_nextcloud.addWidget(origin.gb_nextcloudDiagnostics)
+
+        def refresh_diagnostics():
+            origin.te_nextcloudDiagnostics.setPlainText(self.format_diagnostics())
+
+        def reset_diagnostics():
+            self.metrics.reset()
+            refresh_diagnostics()
+
+        def on_connection_tested(worker, result):
+            origin.btn_testConnection.setEnabled(True)
+            refresh_diagnostics()
+
+        def on_connection_failed(worker, error):
+            origin.btn_testConnection.setEnabled(True)
+            self._last_connection_test = {"error": error}
+            refresh_diagnostics()
+
+        def test_connection():
+            origin.btn_testConnection.setEnabled(False)
+            origin.te_nextcloudDiagnostics.setPlainText("Testing connection...")
+            origin._connectionTest = NextcloudWorker(self.test_nextcloud_connection)
+            # Funciones sueltas como slots: forzar la entrega en el hilo de la UI
+            origin._connectionTest.signals.finished.connect(on_connection_tested, Qt.QueuedConnection)
+            origin._connectionTest.signals.failed.connect(on_connection_failed, Qt.QueuedConnection)
+            QThreadPool.globalInstance().start(origin._connectionTest)
+
+        origin.btn_refreshDiagnostics.clicked.connect(refresh_diagnostics)
+        origin.btn_resetDiagnostics.clicked.connect(reset_diagnostics)
+        origin.btn_testConnection.clicked.connect(test_connection)
+        origin.btn_exportDiagnostics.clicked.connect(lambda: self.export_diagnostics(origin))
+        refresh_diagnostics()
+
         sp_stretch = QSpacerItem(0, 0, QSizePolicy.Fixed, QSizePolicy.Expanding)
         origin.lo_nextcloud.addItem(sp_stretch)
         
@@ -803,27 +2703,118 @@ class Prism_NextCloudLinks_Functions(object):
         origin.le_password.setText(password)
         origin.le_url.setText(url)
 
+        settings = self.get_nextcloud_settings()
+        origin.sp_shareCacheTtl.setValue(settings.get("share_cache_ttl", DEFAULT_SHARE_CACHE_TTL))
+        origin.sp_shareCacheTtl.editingFinished.connect(
+            lambda: self.save_nextcloud_settings({"share_cache_ttl": origin.sp_shareCacheTtl.value()})
+        )
+        origin.cb_shareListingMode.setCurrentIndex(
+            max(0, origin.cb_shareListingMode.findData(settings.get("share_listing_mode", DEFAULT_SHARE_LISTING_MODE)))
+        )
+        origin.cb_shareListingMode.currentIndexChanged.connect(
+            lambda: self.save_nextcloud_settings({"share_listing_mode": origin.cb_shareListingMode.currentData()})
+        )
+        origin.chb_persistentShareCache.setChecked(settings.get("persistent_share_cache", True))
+        origin.chb_persistentShareCache.toggled.connect(
+            lambda checked: self.save_nextcloud_settings({"persistent_share_cache": checked})
+        )
+        origin.chb_deltaRefresh.setChecked(settings.get("delta_refresh", True))
+        origin.chb_deltaRefresh.toggled.connect(
+            lambda checked: self.save_nextcloud_settings({"delta_refresh": checked})
+        )
+        origin.chb_uploadBeforeShare.setChecked(settings.get("upload_before_share", False))
+        origin.chb_uploadBeforeShare.toggled.connect(
+            lambda checked: self.save_nextcloud_settings({"upload_before_share": checked})
+        )
+        origin.chb_verifyBeforeShare.setChecked(settings.get("verify_before_share", False))
+        origin.chb_verifyBeforeShare.toggled.connect(
+            lambda checked: self.save_nextcloud_settings({"verify_before_share": checked})
+        )
+        if self.core.projectPath:
+            origin.te_pathMappings.setPlainText(format_rules(self.get_path_mapping_rules()))
+            origin.te_autoShareRules.setPlainText(format_auto_share_rules(self.get_auto_share_rules()))
+
         pass
     
+    def test_nextcloud_connection(self):
+        # Sin UI: DNS, TCP y TLS por separado y después status.php con el cliente compartido
+        result = probe_connection(self.nextcloud_url)
+        started = time.perf_counter()
+        response = self.get_ocs_client().get(STATUS_ENDPOINT)
+        result["status_php_ms"] = (time.perf_counter() - started) * 1000
+        result["status_php_http"] = response.status_code
+        self._last_connection_test = result
+        return result
+
+    def get_diagnostics(self):
+        # Todo lo que hace falta para una incidencia, sin la contraseña
+        client = self._ocs_client
+        return {
+            "plugin": {
+                "import_ms": IMPORT_TIME_MS,
+                "startup_ms": self.startup_time_ms,
+                "startup_budget_ms": STARTUP_BUDGET_MS,
+                "python": sys.version.split()[0],
+                "platform": sys.platform
+            },
+            "server": {
+                "url": self.nextcloud_url,
+                "user": self.nextcloud_user,
+                "pool_maxsize": client.pool_maxsize if client else None
+            },
+            "settings": self.get_nextcloud_settings(),
+            "connection_test": self._last_connection_test,
+            "connection_health": client.health.snapshot() if client else None,
+            "remote_trees": [tree.stats() for tree in self._remote_trees.values()],
+            "checksum_cache_entries": len(self._checksum_cache),
+            "metrics": self.metrics.snapshot()
+        }
+
+    def format_diagnostics(self):
+        lines = [
+            f"Startup: {self.startup_time_ms:.1f} ms (import {IMPORT_TIME_MS:.1f} ms)",
+            f"Server: {self.nextcloud_url or '-'}"
+        ]
+        client = self._ocs_client
+        if client:
+            health = client.health.snapshot()
+            lines.append(f"Connection: {health['state']} ({health['consecutive_failures']} failures) {health['last_error']}")
+        test = self._last_connection_test
+        if test and "error" in test:
+            lines.append(f"Connection test: {test['error']}")
+        elif test:
+            lines.append(
+                "Connection test: " + "  ".join(
+                    f"{key[:-3]}={value:.1f} ms" for key, value in test.items() if key.endswith("_ms")
+                )
+            )
+        lines.append("")
+        lines.append(self.metrics.format_summary())
+        return "\n".join(lines)
+
+    def export_diagnostics(self, parent=None):
+        path = QFileDialog.getSaveFileName(
+            parent, "Export Nextcloud diagnostics",
+            f"nextcloud_diagnostics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            "JSON (*.json)"
+        )[0]
+        if not path:
+            return
+
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.get_diagnostics(), f, indent=4, default=str)
+        except Exception as e:
+            self.showInfoMessage(f"Error exporting diagnostics: {str(e)}")
+
     def encrypt_password(self, text, key):
-        if not text:
-            return ""
-        encrypted_bytes = [ord(c) ^ ord(k) for c, k in zip(text, cycle(key))]
-        return base64.b64encode(bytes(encrypted_bytes)).decode('utf-8')
-    
+        return encrypt_password(text, key)
+
     def desencrypt_password(self, encrypted_text, key):
-        if not encrypted_text:
-            return ""
-        try:
-            encrypted_bytes = base64.b64decode(encrypted_text.encode('utf-8'))
-            decrypted_bytes = [b ^ ord(k) for b, k in zip(encrypted_bytes, cycle(key))]
-            return ''.join(chr(b) for b in decrypted_bytes)
-        except:
-            return encrypted_text
-        
+        return decrypt_password(encrypted_text, key)
+
     def get_encryption_key(self):
-        system_info = os.path.join(os.path.expanduser("~"), os.name, sys.platform)
-        return hashlib.sha256(system_info.encode()).hexdigest()[:16]
+        return encryption_key()
 
     def save_nextcloud_credentials(self, username, password, url):
         if not all([username, password, url]):
@@ -854,13 +2845,41 @@ class Prism_NextCloudLinks_Functions(object):
             print("Credentials saved successfully!")
             
             # Actualizar la configuración actual
-            self.nextcloud_user = username
-            self.nextcloud_password = password
-            self.nextcloud_url = url
+            self._credentials = (username, password, url)
+            self.reset_ocs_client()
             
         except Exception as e:
             self.showInfoMessage(f"Error saving credentials: {str(e)}")
 
+    def get_ocs_client(self):
+        # Cliente compartido; se reconstruye si cambian url, usuario o contraseña
+        with self._ocs_client_lock:
+            client = self._ocs_client
+            if client and client.matches(self.nextcloud_url, self.nextcloud_user, self.nextcloud_password):
+                return client
+
+            if client:
+                client.close()
+
+            self._ocs_client = NextcloudOCSClient(
+                self.nextcloud_url, self.nextcloud_user, self.nextcloud_password, metrics=self.metrics
+            )
+            return self._ocs_client
+
+    def server_status_text(self):
+        # Texto para la UI cuando el circuito está abierto; None si el servidor responde
+        client = self._ocs_client
+        if client is None or client.health.is_available():
+            return None
+
+        return f"Nextcloud no disponible ({client.health.last_error}), comprobando en segundo plano..."
+
+    def reset_ocs_client(self):
+        with self._ocs_client_lock:
+            if self._ocs_client:
+                self._ocs_client.close()
+                self._ocs_client = None
+
     def load_nextcloud_credentials(self):
         #Función para cargar las credenciales desde el archivo json"
         try:
@@ -883,6 +2902,69 @@ class Prism_NextCloudLinks_Functions(object):
         
         return ("", "", "")
 
+    def get_nextcloud_settings(self):
+        if self._settings is None:
+            self._settings = self.load_nextcloud_settings()
+        return self._settings
+
+    def get_nextcloud_setting(self, key, default=None):
+        return self.get_nextcloud_settings().get(key, default)
+
+    def load_nextcloud_settings(self):
+        try:
+            config_file = self.core.getUserPrefConfigPath()
+
+            if os.path.exists(config_file):
+                with open(config_file, 'r') as f:
+                    config_data = json.load(f)
+
+                return config_data.get("Nextcloud_settings", {})
+
+        except Exception as e:
+            print(f"Error loading Nextcloud settings: {str(e)}")
+
+        return {}
+
+    def save_nextcloud_settings(self, settings):
+        try:
+            config_file = self.core.getUserPrefConfigPath()
+
+            if os.path.exists(config_file):
+                with open(config_file, 'r') as f:
+                    config_data = json.load(f)
+            else:
+                config_data = {}
+
+            config_data.setdefault("Nextcloud_settings", {}).update(settings)
+            self._settings = config_data["Nextcloud_settings"]
+
+            with open(config_file, 'w') as f:
+                json.dump(config_data, f, indent=4)
+
+        except Exception as e:
+            self.showInfoMessage(f"Error saving Nextcloud settings: {str(e)}")
+            return
+
+        if "share_cache_ttl" in settings:
+            self.share_index.ttl = settings["share_cache_ttl"]
+        if settings.get("persistent_share_cache") is False and self._share_store:
+            self._share_store.close()
+            self._share_store = None
+
+    def clear_share_cache(self):
+        # Vacía la caché en disco y la de memoria; la próxima consulta descarga de nuevo
+        self.share_index.invalidate()
+        self._remote_trees = {}
+        self._sync_marks = {}
+        store = self.share_store
+        if store is None:
+            return
+
+        try:
+            store.clear()
+        except Exception as e:
+            self.showInfoMessage(f"Error clearing the link cache: {str(e)}")
+
     # if returns true, the plugin will be loaded by Prism
     @err_catcher(name=__name__)
     def isActive(self):
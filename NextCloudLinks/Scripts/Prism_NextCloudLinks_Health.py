@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import random
+import threading
+import time
+
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half-open"
+
+
+def backoff_delay(attempt, base=0.25, cap=4.0):
+    # Espera antes del reintento `attempt` (1, 2...): backoff exponencial con jitter completo
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ConnectionHealth(object):
+    # Estado de la conexión con el servidor:
+    # - aprende la latencia normal de cada operación (EWMA de media y
+    #   desviación, como el RTO de TCP) y calcula con ella el timeout
+    # - tras `failure_threshold` intentos de conexión fallidos seguidos, o una
+    #   llamada que se queda sin respuesta hasta el final, abre el circuito:
+    #   las llamadas fallan al momento hasta que una sonda o un intento de
+    #   prueba (half-open) vuelve a llegar al servidor
+    def __init__(self, failure_threshold=3, min_timeout=3.0, open_seconds=30.0, alpha=0.125, beta=0.25):
+        self.failure_threshold = failure_threshold
+        self.min_timeout = min_timeout
+        self.open_seconds = open_seconds
+        self.alpha = alpha
+        self.beta = beta
+        self.on_open = None
+        self._lock = threading.Lock()
+        self._latency = {}
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = ""
+        self._trial_running = False
+
+    def timeout(self, op, cap):
+        # Timeout en segundos para la operación; `cap` es el máximo de siempre
+        with self._lock:
+            entry = self._latency.get(op)
+        if entry is None:
+            return cap
+
+        return max(self.min_timeout, min(cap, self._rto(*entry)))
+
+    @staticmethod
+    def _rto(srtt, rttvar):
+        # Con la varianza ya asentada srtt + 4*rttvar queda muy cerca de la
+        # media; nunca menos del doble de la latencia normal
+        return max(2 * srtt, srtt + 4 * rttvar)
+
+    def allow_request(self):
+        # (permitida, segundos hasta el próximo intento)
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True, 0.0
+
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if self.state == STATE_OPEN and remaining <= 0:
+                self.state = STATE_HALF_OPEN
+
+            if self.state == STATE_HALF_OPEN and not self._trial_running:
+                # Una sola petición de prueba; el resto sigue fallando rápido
+                self._trial_running = True
+                return True, 0.0
+
+            return False, max(0.0, remaining)
+
+    def record_success(self, op=None, seconds=None):
+        with self._lock:
+            if op is not None and seconds is not None:
+                entry = self._latency.get(op)
+                if entry is None:
+                    self._latency[op] = (seconds, seconds / 2)
+                else:
+                    srtt, rttvar = entry
+                    rttvar = (1 - self.beta) * rttvar + self.beta * abs(srtt - seconds)
+                    srtt = (1 - self.alpha) * srtt + self.alpha * seconds
+                    self._latency[op] = (srtt, rttvar)
+
+            self.failures = 0
+            self.state = STATE_CLOSED
+            self._trial_running = False
+
+    def end_trial(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self, error, trip=False):
+        # trip=True abre el circuito sin esperar al umbral (el servidor no ha
+        # respondido en todo el tiempo de la llamada)
+        opened = False
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self._trial_running = False
+            if self.state != STATE_OPEN and (
+                trip or self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold
+            ):
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+                opened = True
+            elif self.state == STATE_OPEN:
+                self.opened_at = time.monotonic()
+
+        if opened and self.on_open:
+            self.on_open()
+
+    def is_available(self):
+        with self._lock:
+            return self.state == STATE_CLOSED
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "last_error": self.last_error,
+                "open_for_s": (time.monotonic() - self.opened_at) if self.state != STATE_CLOSED else 0.0,
+                "timeouts_s": {
+                    op: round(max(self.min_timeout, self._rto(srtt, rttvar)), 3)
+                    for op, (srtt, rttvar) in self._latency.items()
+                }
+            }
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+
+ACTION_DELETE = "delete"
+ACTION_EXTEND = "extend"
+# Peticiones por segundo al aplicar cambios en bloque
+DEFAULT_MAINTENANCE_RATE = 10
+# Error de las acciones que no se han llegado a enviar porque se canceló
+ACTION_SKIPPED = "Cancelado: no se ha enviado"
+
+
+def parse_expiration(value):
+    # "2024-05-01 00:00:00" -> date(2024, 5, 1); sin caducidad -> None
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _expiry_sort_key(share):
+    # Los enlaces sin caducidad son los que más duran
+    expiration = parse_expiration(share.get('expiration'))
+    return date.max if expiration is None else expiration
+
+
+def plan_maintenance(shares, today=None, soon_days=7, extend_days=30,
+                     delete_expired=True, extend_soon=True, consolidate=True):
+    # Agrupa los shares públicos por ruta y decide qué hacer con cada uno.
+    # No toca el servidor: devuelve la lista de acciones para previsualizarla.
+    today = today or date.today()
+    soon_limit = today + timedelta(days=soon_days)
+    new_expire_date = (today + timedelta(days=extend_days)).strftime("%Y-%m-%d")
+    actions = []
+
+    by_path = {}
+    for share in shares:
+        by_path.setdefault(share['path'], []).append(share)
+
+    for path in sorted(by_path):
+        alive = []
+        for share in by_path[path]:
+            expiration = parse_expiration(share.get('expiration'))
+            if expiration is not None and expiration < today:
+                if delete_expired:
+                    actions.append({"action": ACTION_DELETE, "share": share, "reason": "Caducado"})
+            else:
+                alive.append(share)
+
+        # Duplicados: mismo recurso y mismos permisos; se conserva el que más dura
+        kept = alive
+        if consolidate:
+            kept = []
+            by_permissions = {}
+            for share in alive:
+                by_permissions.setdefault(share.get('permissions'), []).append(share)
+            for group in by_permissions.values():
+                group.sort(key=_expiry_sort_key, reverse=True)
+                kept.append(group[0])
+                for duplicate in group[1:]:
+                    actions.append({
+                        "action": ACTION_DELETE,
+                        "share": duplicate,
+                        "reason": f"Duplicado de {group[0].get('url', '')}"
+                    })
+
+        if extend_soon:
+            for share in kept:
+                expiration = parse_expiration(share.get('expiration'))
+                if expiration is not None and expiration <= soon_limit:
+                    actions.append({
+                        "action": ACTION_EXTEND,
+                        "share": share,
+                        "reason": f"Caduca el {expiration.isoformat()}",
+                        "expire_date": new_expire_date
+                    })
+
+    return actions
+
+
+class RateLimiter(object):
+    # Token bucket compartido por los hilos: como mucho `rate` peticiones por segundo
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, cancelled=None):
+        # False si se cancela mientras espera turno
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if cancelled is None:
+                time.sleep(wait)
+            elif cancelled.wait(wait):
+                return False
+
+
+def run_maintenance(client, actions, max_workers=6, rate=DEFAULT_MAINTENANCE_RATE, on_progress=None,
+                    cancelled=None):
+    # Ejecuta las acciones en paralelo con límite de peticiones por segundo.
+    # Devuelve [(acción, error o "")]. Un 404 significa que ya no existe: se da por hecho.
+    # `cancelled` (threading.Event) detiene el envío: las acciones que faltan
+    # vuelven con el error ACTION_SKIPPED y lo ya enviado se queda aplicado
+    limiter = RateLimiter(rate)
+
+    def apply(action):
+        if not limiter.acquire(cancelled) or (cancelled is not None and cancelled.is_set()):
+            return ACTION_SKIPPED
+        share_id = action["share"]['id']
+        if action["action"] == ACTION_DELETE:
+            response = client.delete_share(share_id)
+        else:
+            response = client.update_share(share_id, expireDate=action["expire_date"])
+
+        if response.status_code in (200, 404):
+            return ""
+        return f"HTTP {response.status_code}: {response.text[:200]}"
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(apply, action): action for action in actions}
+        for future in as_completed(futures):
+            try:
+                error = future.result()
+            except Exception as e:
+                error = str(e)
+            results.append((futures[future], error))
+            if on_progress:
+                on_progress(len(results))
+
+    return results
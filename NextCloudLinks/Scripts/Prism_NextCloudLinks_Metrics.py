@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+
+
+# Límites (ms) de los cubos de los histogramas; el último recoge el resto
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+HISTOGRAM_WINDOW = 500
+RECENT_REQUESTS = 200
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+class RollingHistogram(object):
+    # Últimas `window` muestras en ms; el resumen se calcula al pedirlo
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.total += 1
+
+    def summary(self):
+        values = sorted(self.samples)
+        buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for value in values:
+            index = 0
+            while index < len(HISTOGRAM_BUCKETS_MS) and value > HISTOGRAM_BUCKETS_MS[index]:
+                index += 1
+            buckets[index] += 1
+
+        labels = [f"<={limit}" for limit in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}"]
+        return {
+            "count": self.total,
+            "window": len(values),
+            "mean_ms": sum(values) / len(values) if values else 0.0,
+            "p50_ms": percentile(values, 0.5),
+            "p90_ms": percentile(values, 0.9),
+            "p99_ms": percentile(values, 0.99),
+            "max_ms": values[-1] if values else 0.0,
+            "buckets": dict(zip(labels, buckets))
+        }
+
+
+class NextcloudMetrics(object):
+    # Contadores, bytes e histogramas de latencia de las llamadas a Nextcloud
+    # y de los refrescos de la UI. Se usa desde varios hilos a la vez.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = datetime.now()
+        self.counters = {}
+        self.histograms = {}
+        self.bytes_received = 0
+        self.recent = deque(maxlen=RECENT_REQUESTS)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram()
+            histogram.add(ms)
+
+    @contextmanager
+    def timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def record_request(self, op, status, ms, error=None):
+        # Hasta tener las cabeceras: conexión, TLS y proceso en el servidor
+        self.count(f"http.{op}")
+        self.count(f"http.status.{status or error}")
+        self.observe(f"http.{op}", ms)
+        with self._lock:
+            self.recent.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "op": op,
+                "status": status,
+                "error": error,
+                "headers_ms": round(ms, 2)
+            })
+
+    def record_download(self, op, ms, nbytes, records=None):
+        # Descarga y decodificación del cuerpo, una vez consumida la respuesta
+        self.observe(f"download.{op}", ms)
+        if records is not None:
+            self.count("records.decoded", records)
+        with self._lock:
+            self.bytes_received += nbytes
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now()
+            self.counters.clear()
+            self.histograms.clear()
+            self.bytes_received = 0
+            self.recent.clear()
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: h.summary() for name, h in self.histograms.items()}
+            recent = list(self.recent)
+            bytes_received = self.bytes_received
+            started = self.started
+
+        hits = {}
+        for name, value in counters.items():
+            # cache.<nombre>.hit / cache.<nombre>.miss -> tasa de acierto
+            if name.startswith("cache.") and name.rsplit(".", 1)[-1] in ("hit", "miss"):
+                cache = name.rsplit(".", 1)[0]
+                hits.setdefault(cache, {"hit": 0, "miss": 0})[name.rsplit(".", 1)[-1]] = value
+        for cache in hits.values():
+            total = cache["hit"] + cache["miss"]
+            cache["hit_rate"] = cache["hit"] / float(total) if total else 0.0
+
+        return {
+            "since": started.isoformat(timespec="seconds"),
+            "bytes_received": bytes_received,
+            "counters": counters,
+            "caches": hits,
+            "histograms": histograms,
+            "recent_requests": recent
+        }
+
+    def format_summary(self):
+        # Texto para el panel de diagnóstico
+        snapshot = self.snapshot()
+        lines = [f"Desde {snapshot['since']} - {snapshot['bytes_received'] / 1024.0:.1f} KB recibidos", ""]
+        for name in sorted(snapshot["histograms"]):
+            h = snapshot["histograms"][name]
+            lines.append(
+                f"{name:<40} n={h['count']:<6} p50={h['p50_ms']:8.1f}  p90={h['p90_ms']:8.1f}  "
+                f"p99={h['p99_ms']:8.1f}  max={h['max_ms']:8.1f} ms"
+            )
+        if snapshot["caches"]:
+            lines.append("")
+            for name in sorted(snapshot["caches"]):
+                cache = snapshot["caches"][name]
+                lines.append(f"{name:<40} hit={cache['hit']:<6} miss={cache['miss']:<6} ({cache['hit_rate']:.0%})")
+        other = {k: v for k, v in snapshot["counters"].items() if not k.startswith(("cache.", "http."))}
+        status = {k: v for k, v in snapshot["counters"].items() if k.startswith("http.status.")}
+        if other or status:
+            lines.append("")
+            for name in sorted(status) + sorted(other):
+                lines.append(f"{name:<40} {snapshot['counters'][name]}")
+        return "\n".join(lines)
+
+
+def probe_connection(url, timeout=10):
+    # Mide por separado DNS, conexión TCP y negociación TLS con el servidor
+    import ssl
+
+    parsed = urlparse(url)
+    host = parsed.hostname
+    if not host:
+        raise ValueError(f"URL de Nextcloud no válida: {url}")
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    result = {"host": host, "port": port}
+
+    started = time.perf_counter()
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    result["dns_ms"] = (time.perf_counter() - started) * 1000
+    family, socktype, proto, _, address = addresses[0]
+    result["address"] = address[0]
+
+    sock = socket.socket(family, socktype, proto)
+    sock.settimeout(timeout)
+    try:
+        started = time.perf_counter()
+        sock.connect(address)
+        result["tcp_connect_ms"] = (time.perf_counter() - started) * 1000
+
+        if parsed.scheme == "https":
+            started = time.perf_counter()
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+            result["tls_handshake_ms"] = (time.perf_counter() - started) * 1000
+            result["tls_version"] = sock.version()
+    finally:
+        sock.close()
+
+    return result
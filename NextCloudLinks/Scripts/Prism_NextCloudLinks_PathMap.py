@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import re
+from functools import lru_cache
+
+
+RULE_SEPARATOR = "->"
+
+
+def normalize_local_path(path):
+    return os.path.normpath(path if os.path.isabs(path) else os.path.abspath(path))
+
+
+def split_local_path(path):
+    # Componentes de una ruta local con separadores normalizados (conserva mayúsculas)
+    return [part for part in re.split(r"[\\/]+", normalize_local_path(path)) if part]
+
+
+def split_remote_path(path):
+    return [part for part in path.replace('\\', '/').split('/') if part]
+
+
+def legacy_remote_root(project_path):
+    # Regla original del plugin: todo lo que cuelga de una carpeta "proyectos"
+    # se sube a /PROYECTOS, y si no hay ninguna se usa el nombre del proyecto
+    parts = split_local_path(project_path)
+    parts_lower = [p.lower() for p in parts]
+
+    if "proyectos" in parts_lower:
+        idx = parts_lower.index("proyectos")
+        return "/" + "/".join(["PROYECTOS"] + parts[idx + 1:])
+
+    return "/PROYECTOS/" + parts[-1] if parts else "/PROYECTOS"
+
+
+def project_rules(rules, project_path):
+    # Si ninguna regla cubre el proyecto se añade la regla de siempre (/PROYECTOS)
+    rules = list(rules)
+    if project_path and not PathMapper(rules).to_remote(project_path):
+        rules.append({"local": project_path, "remote": legacy_remote_root(project_path)})
+    return rules
+
+
+def parse_rules(text):
+    # Una regla por línea: "ruta local -> ruta remota"
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or RULE_SEPARATOR not in line:
+            continue
+
+        local_root, remote_root = line.split(RULE_SEPARATOR, 1)
+        if local_root.strip() and remote_root.strip():
+            rules.append({"local": local_root.strip(), "remote": remote_root.strip()})
+
+    return rules
+
+
+def format_rules(rules):
+    return "\n".join(f"{rule['local']} {RULE_SEPARATOR} {rule['remote']}" for rule in rules)
+
+
+class PathMapper(object):
+    # Traduce rutas locales <-> remotas con varias reglas (raíz local -> raíz
+    # remota). Las reglas se compilan una vez en tablas por profundidad con
+    # claves en minúsculas, y cada traducción busca el prefijo más largo.
+    def __init__(self, rules, cache_size=8192):
+        self.rules = list(rules)
+        self._local_roots = {}
+        self._remote_roots = {}
+
+        for rule in self.rules:
+            local_parts = split_local_path(rule["local"])
+            remote_parts = split_remote_path(rule["remote"])
+            # Separadores iniciales de la raíz local ("/" en posix, "\\" en UNC)
+            local_prefix = re.match(r"^[\\/]*", normalize_local_path(rule["local"])).group(0)
+            self._local_roots[tuple(p.lower() for p in local_parts)] = remote_parts
+            self._remote_roots[tuple(p.lower() for p in remote_parts)] = (local_prefix, local_parts)
+
+        self._local_depths = sorted({len(k) for k in self._local_roots}, reverse=True)
+        self._remote_depths = sorted({len(k) for k in self._remote_roots}, reverse=True)
+
+        self.to_remote = lru_cache(maxsize=cache_size)(self._to_remote)
+        self.to_local = lru_cache(maxsize=cache_size)(self._to_local)
+
+    @staticmethod
+    def _longest_prefix(parts, roots, depths):
+        # (destino de la regla, componentes restantes) del prefijo más largo
+        key = tuple(p.lower() for p in parts)
+        for depth in depths:
+            if depth <= len(key):
+                target = roots.get(key[:depth])
+                if target is not None:
+                    return target, parts[depth:]
+
+        return None, None
+
+    def _to_remote(self, local_path):
+        # Ruta remota ("/A/B") o None si ninguna regla cubre la ruta
+        remote_parts, rest = self._longest_prefix(split_local_path(local_path), self._local_roots, self._local_depths)
+        if remote_parts is None:
+            return None
+
+        return "/" + "/".join(remote_parts + rest)
+
+    def _to_local(self, remote_path):
+        target, rest = self._longest_prefix(split_remote_path(remote_path), self._remote_roots, self._remote_depths)
+        if target is None:
+            return None
+
+        local_prefix, local_parts = target
+        return local_prefix + os.sep.join(local_parts + rest)
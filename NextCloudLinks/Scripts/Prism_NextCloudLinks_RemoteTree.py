@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Prism_NextCloudLinks_Client import NextcloudError, NextcloudUnavailable
+from Prism_NextCloudLinks_Shares import path_in_root
+
+
+SYNC_SYNCED = "synced"
+SYNC_PARTIAL = "partial"
+SYNC_MISSING = "missing"
+SYNC_UNKNOWN = "unknown"
+
+# El listado completo de un proyecto grande tarda mucho más que un Depth 1
+DEPTH_INFINITY_TIMEOUT = 120
+
+
+class RemoteTree(object):
+    # Copia en memoria del árbol de un proyecto en Nextcloud (etag, tamaño y
+    # fecha de cada fichero y carpeta) rellenada con PROPFIND. Al refrescar
+    # solo se vuelven a listar las carpetas cuya etag ha cambiado: Nextcloud
+    # propaga la etag hacia arriba, así que si la raíz no cambia basta una
+    # petición. Las consultas son búsquedas en un diccionario.
+    def __init__(self, root):
+        self.root = root.rstrip('/') or '/'
+        self.loaded = False
+        self.refreshed_at = None
+        self.depth_infinity = True
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._children = {}
+
+    def entry(self, nc_path):
+        # Entrada remota, o None si no existe (o el árbol no cubre la ruta: ver covers)
+        return self._entries.get(nc_path.rstrip('/') or '/')
+
+    def covers(self, nc_path):
+        return self.loaded and path_in_root(nc_path, self.root)
+
+    def exists(self, nc_path):
+        # True/False, o None si el árbol no puede responder
+        if not self.covers(nc_path):
+            return None
+        return self.entry(nc_path) is not None
+
+    def folders(self):
+        # Subcarpetas conocidas del proyecto en el servidor (sin la raíz)
+        with self._lock:
+            return sorted(
+                path for path, entry in self._entries.items() if entry["is_dir"] and path != self.root
+            )
+
+    def sync_status(self, local_path, nc_path, deep=True):
+        # Compara la ruta local con el árbol remoto sin ir a la red:
+        # synced (todo subido con el mismo tamaño), partial, missing o unknown.
+        # Con deep=False una carpeta solo se busca en el árbol, sin recorrer
+        # sus ficheros locales (para el hilo de la UI)
+        if not self.covers(nc_path):
+            return SYNC_UNKNOWN
+
+        entry = self.entry(nc_path)
+        if entry is None:
+            return SYNC_MISSING
+
+        if not os.path.isdir(local_path):
+            return SYNC_SYNCED if entry["size"] == os.path.getsize(local_path) else SYNC_PARTIAL
+        if not deep:
+            return SYNC_SYNCED
+
+        for folder, dirnames, filenames in os.walk(local_path):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            rel_folder = os.path.relpath(folder, local_path).replace(os.sep, '/')
+            remote_folder = nc_path.rstrip('/') + ('' if rel_folder == '.' else '/' + rel_folder)
+            for filename in filenames:
+                remote = self.entry(remote_folder + '/' + filename)
+                if remote is None or remote["size"] != os.path.getsize(os.path.join(folder, filename)):
+                    return SYNC_PARTIAL
+
+        return SYNC_SYNCED
+
+    def _remove_subtree(self, path):
+        self._entries.pop(path, None)
+        for child in self._children.pop(path, ()):
+            self._remove_subtree(child)
+
+    def _store_listing(self, folder, entries):
+        # Sustituye el contenido conocido de `folder` por un listado Depth 1 y
+        # devuelve (subcarpetas que hay que volver a listar, etag de la carpeta).
+        # La etag de la propia carpeta queda vacía hasta que el refresco termina
+        changed = []
+        folder_etag = None
+        with self._lock:
+            children = set()
+            for entry in entries:
+                path = entry["path"]
+                if path == folder:
+                    folder_etag = entry["etag"]
+                    self._entries[path] = dict(entry, etag=None)
+                    continue
+
+                children.add(path)
+                old = self._entries.get(path)
+                if entry["is_dir"] and (old is None or old["etag"] != entry["etag"] or path not in self._children):
+                    # La etag se guarda cuando se ha listado todo el subárbol;
+                    # si el refresco se interrumpe, la próxima vez se vuelve a listar
+                    changed.append(path)
+                    entry = dict(entry, etag=None)
+                self._entries[path] = entry
+
+            for gone in self._children.get(folder, set()) - children:
+                self._remove_subtree(gone)
+            self._children[folder] = children
+
+        return changed, folder_etag
+
+    def _commit_etags(self, etags):
+        # Al acabar el refresco: las carpetas listadas vuelven a tener su etag
+        with self._lock:
+            for folder, etag in etags.items():
+                entry = self._entries.get(folder)
+                if entry is not None:
+                    self._entries[folder] = dict(entry, etag=etag)
+
+    def _store_full(self, entries):
+        # Resultado de un PROPFIND Depth: infinity sobre la raíz
+        with self._lock:
+            self._entries = {}
+            self._children = {}
+            for entry in entries:
+                self._entries[entry["path"]] = entry
+                if entry["is_dir"]:
+                    self._children.setdefault(entry["path"], set())
+                if entry["path"] != self.root:
+                    self._children.setdefault(entry["path"].rsplit('/', 1)[0] or '/', set()).add(entry["path"])
+
+    def refresh(self, client, max_workers=None):
+        # Devuelve el número de PROPFIND hechos
+        if not self.loaded and self.depth_infinity:
+            try:
+                status, entries = client.stat(
+                    self.root, depth="infinity", timeout=DEPTH_INFINITY_TIMEOUT, adaptive=False
+                )
+            except NextcloudUnavailable:
+                raise
+            except Exception as e:
+                # Demasiado grande o lento: se lista por niveles
+                print(f"PROPFIND Depth: infinity de {self.root} falló, listando por niveles: {str(e)}")
+                status = None
+            if status == 207:
+                self._store_full(entries)
+                self._mark_loaded()
+                return 1
+            # Muchos servidores tienen Depth: infinity desactivado
+            self.depth_infinity = False
+
+        status, entries = client.stat(self.root, depth="1")
+        if status == 404:
+            with self._lock:
+                self._entries = {}
+                self._children = {}
+            self._mark_loaded()
+            return 1
+        if status != 207:
+            raise NextcloudError(f"Error listando {self.root}: HTTP {status}")
+
+        old_root = self._entries.get(self.root)
+        new_root = next((entry for entry in entries if entry["path"] == self.root), None)
+        if self.loaded and old_root and new_root and old_root["etag"] == new_root["etag"]:
+            self._mark_loaded()
+            return 1
+
+        requests = 1
+        pending, root_etag = self._store_listing(self.root, entries)
+        etags = {self.root: root_etag}
+        with ThreadPoolExecutor(max_workers=max_workers or client.pool_maxsize) as pool:
+            while pending:
+                # Un nivel del árbol cada vez, las carpetas del nivel en paralelo
+                listings = list(pool.map(lambda folder: (folder, client.stat(folder, depth="1")), pending))
+                pending = []
+                for folder, (status, entries) in listings:
+                    requests += 1
+                    if status == 404:
+                        with self._lock:
+                            self._remove_subtree(folder)
+                        continue
+                    if status != 207:
+                        raise NextcloudError(f"Error listando {folder}: HTTP {status}")
+                    changed, etags[folder] = self._store_listing(folder, entries)
+                    pending.extend(changed)
+
+        self._commit_etags(etags)
+        self._mark_loaded()
+        return requests
+
+    def refresh_path(self, client, nc_path):
+        # Consulta puntual (Depth 0) de una ruta para cuando el árbol no la cubre todavía
+        status, entries = client.stat(nc_path, depth="0")
+        if status not in (207, 404):
+            raise NextcloudError(f"Error consultando {nc_path}: HTTP {status}")
+
+        with self._lock:
+            for entry in entries:
+                old = self._entries.get(entry["path"])
+                # Sin etag, la carpeta se vuelve a listar en el próximo refresco
+                self._entries[entry["path"]] = dict(entry, etag=old["etag"] if old else None)
+        return entries[0] if entries else None
+
+    def _mark_loaded(self):
+        self.loaded = True
+        self.refreshed_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            files = sum(1 for entry in self._entries.values() if not entry["is_dir"])
+            return {
+                "root": self.root,
+                "loaded": self.loaded,
+                "refreshed_at": self.refreshed_at,
+                "folders": len(self._entries) - files,
+                "files": files,
+                "depth_infinity": self.depth_infinity
+            }
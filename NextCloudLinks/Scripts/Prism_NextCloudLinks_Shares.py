@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+PUBLIC_SHARE_TYPE = "3"
+DEFAULT_SHARE_CACHE_TTL = 300
+
+# Opciones del menú de compartir -> valores de la API de Nextcloud
+PERMISSION_PRESETS = {
+    "ONLY READ": "1",
+    "EDIT": "23"
+}
+# Días de validez del enlace (None = sin caducidad)
+EXPIRY_PRESETS = {
+    "1 DAY": 1,
+    "1 MONTH": 30,
+    "6 MONTHS": 180,
+    "ALWAYS": None
+}
+
+
+def expire_date_for(expiry_preset, now=None):
+    days = EXPIRY_PRESETS.get(expiry_preset, 30)
+    if days is None:
+        return None
+
+    return ((now or datetime.now()) + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def normalize_share(raw):
+    # Registro de share con los campos que usa el plugin, todo como texto
+    return {
+        'id': str(raw.get('id') or ''),
+        'share_type': str(raw.get('share_type') or ''),
+        'path': raw.get('path') or '',
+        'url': raw.get('url') or '',
+        'permissions': str(raw.get('permissions') or ''),
+        'expiration': raw.get('expiration') or ''
+    }
+
+
+def is_public_share(share):
+    return str(share.get('share_type', '')) == PUBLIC_SHARE_TYPE
+
+
+def share_signature(shares):
+    # Huella del listado (sin importar el orden) para saber si hay que repintar
+    return hash(frozenset(
+        (share['id'], share['path'], share['url'], share['permissions'], share['expiration']) for share in shares
+    ))
+
+
+def path_in_root(path, root):
+    root = root.rstrip('/')
+    return path == root or path.startswith(root + '/')
+
+
+class ShareIndex(object):
+    # Índice en memoria de los shares públicos, por proyecto (remote root) y
+    # por ruta remota. Las entradas caducan tras `ttl` segundos y se actualizan
+    # en el momento en que el plugin crea un share nuevo.
+    def __init__(self, ttl=DEFAULT_SHARE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._projects = {}
+        self._paths = {}
+
+    def _fresh(self, loaded):
+        return loaded is not None and self.ttl > 0 and (time.monotonic() - loaded) < self.ttl
+
+    def fill(self, remote_root, shares, stale=False):
+        # stale=True para datos que hay que revalidar (p. ej. la caché en disco)
+        by_path = {}
+        for share in shares:
+            by_path.setdefault(share['path'], []).append(share)
+
+        with self._lock:
+            self._projects[remote_root.rstrip('/')] = (None if stale else time.monotonic(), by_path)
+            # Los resultados por ruta dentro del proyecto quedan obsoletos
+            for path in [p for p in self._paths if path_in_root(p, remote_root)]:
+                del self._paths[path]
+
+    def get_project(self, remote_root, include_stale=False):
+        with self._lock:
+            entry = self._projects.get(remote_root.rstrip('/'))
+            if not entry or not (include_stale or self._fresh(entry[0])):
+                return None
+
+            return [share for shares in entry[1].values() for share in shares]
+
+    def is_fresh(self, remote_root):
+        with self._lock:
+            entry = self._projects.get(remote_root.rstrip('/'))
+            return bool(entry) and self._fresh(entry[0])
+
+    def store_path(self, nc_path, shares):
+        with self._lock:
+            self._paths[nc_path] = (time.monotonic(), list(shares))
+
+    def lookup(self, nc_path, include_stale=False):
+        # Devuelve los shares de la ruta, o None si el índice no la cubre
+        with self._lock:
+            entry = self._paths.get(nc_path)
+            if entry and (include_stale or self._fresh(entry[0])):
+                return list(entry[1])
+
+            for root, (loaded, by_path) in self._projects.items():
+                if (include_stale or self._fresh(loaded)) and path_in_root(nc_path, root):
+                    return list(by_path.get(nc_path, []))
+
+        return None
+
+    def add(self, share):
+        path = share['path']
+        with self._lock:
+            entry = self._paths.get(path)
+            if entry:
+                entry[1].append(share)
+
+            for root, (loaded, by_path) in self._projects.items():
+                if path_in_root(path, root):
+                    by_path.setdefault(path, []).append(share)
+
+    def _iter_path_lists(self, path):
+        # Listas de shares de la ruta en el índice por ruta y en los proyectos que la contienen
+        entry = self._paths.get(path)
+        if entry:
+            yield entry[1]
+
+        for root, (loaded, by_path) in self._projects.items():
+            if path in by_path:
+                yield by_path[path]
+
+    def update(self, share):
+        # Sustituye el share con el mismo id (p. ej. tras cambiar la caducidad)
+        with self._lock:
+            for shares in self._iter_path_lists(share['path']):
+                for i, old in enumerate(shares):
+                    if old['id'] == share['id']:
+                        shares[i] = share
+
+    def remove(self, share):
+        with self._lock:
+            for shares in self._iter_path_lists(share['path']):
+                shares[:] = [old for old in shares if old['id'] != share['id']]
+
+    def invalidate(self, remote_root=None):
+        with self._lock:
+            if remote_root is None:
+                self._projects.clear()
+                self._paths.clear()
+                return
+
+            self._projects.pop(remote_root.rstrip('/'), None)
+            for path in [p for p in self._paths if path_in_root(p, remote_root)]:
+                del self._paths[path]
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import sqlite3
+import threading
+import time
+
+from Prism_NextCloudLinks_Shares import path_in_root
+
+
+SCHEMA_VERSION = 2
+SHARE_FIELDS = ("id", "share_type", "path", "url", "permissions", "expiration")
+CACHE_FILENAME = "NextcloudShareCache.db"
+
+
+class ShareStore(object):
+    # Caché en disco (SQLite) de los shares públicos de cada proyecto, por
+    # servidor, usuario y raíz remota. Sirve para enseñar los enlaces al abrir
+    # Prism sin esperar a la descarga; al guardar solo se escriben las filas
+    # que han cambiado.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        # Se abre en el primer uso; una conexión compartida por los hilos bajo el lock
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript(f"""
+                    DROP TABLE IF EXISTS projects;
+                    DROP TABLE IF EXISTS shares;
+                    CREATE TABLE projects (
+                        server TEXT, user TEXT, root TEXT, etag TEXT, validated REAL,
+                        since INTEGER, reloaded REAL,
+                        PRIMARY KEY (server, user, root)
+                    );
+                    CREATE TABLE shares (
+                        server TEXT, user TEXT, root TEXT,
+                        {", ".join(f"{field} TEXT" for field in SHARE_FIELDS)},
+                        PRIMARY KEY (server, user, root, id)
+                    ) WITHOUT ROWID;
+                    PRAGMA user_version = {SCHEMA_VERSION};
+                """)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def project_key(server, user, remote_root):
+        return (server.rstrip('/'), user, remote_root.rstrip('/'))
+
+    def load(self, key):
+        # {"shares", "etag", "validated", "since", "reloaded"} o None si el
+        # proyecto no está en caché. since: marca del feed de actividad;
+        # reloaded: última descarga completa
+        with self._lock:
+            conn = self._connection()
+            project = conn.execute(
+                "SELECT etag, validated, since, reloaded FROM projects WHERE server=? AND user=? AND root=?", key
+            ).fetchone()
+            if project is None:
+                return None
+
+            rows = conn.execute(
+                f"SELECT {', '.join(SHARE_FIELDS)} FROM shares WHERE server=? AND user=? AND root=?", key
+            ).fetchall()
+
+        return {
+            "shares": [dict(zip(SHARE_FIELDS, row)) for row in rows],
+            "etag": project[0],
+            "validated": project[1],
+            "since": project[2],
+            "reloaded": project[3]
+        }
+
+    def save(self, key, shares, etag=None, since=None, full=True):
+        # Sustituye el listado del proyecto escribiendo solo las diferencias.
+        # full=False para un refresco incremental (conserva la fecha de la
+        # última descarga completa). Devuelve el número de filas escritas o borradas.
+        new_rows = {share['id']: tuple(share.get(field, '') for field in SHARE_FIELDS) for share in shares}
+
+        with self._lock:
+            conn = self._connection()
+            old_rows = {
+                row[0]: row for row in conn.execute(
+                    f"SELECT {', '.join(SHARE_FIELDS)} FROM shares WHERE server=? AND user=? AND root=?", key
+                )
+            }
+            removed = [(share_id,) for share_id in old_rows if share_id not in new_rows]
+            changed = [row for share_id, row in new_rows.items() if old_rows.get(share_id) != row]
+            now = time.time()
+            reloaded = now
+            if not full:
+                row = conn.execute(
+                    "SELECT reloaded FROM projects WHERE server=? AND user=? AND root=?", key
+                ).fetchone()
+                reloaded = row[0] if row else None
+
+            with conn:
+                self._write(conn, key, changed, removed)
+                conn.execute(
+                    "INSERT OR REPLACE INTO projects (server, user, root, etag, validated, since, reloaded) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    key + (etag, now, since, reloaded)
+                )
+
+        return len(changed) + len(removed)
+
+    @staticmethod
+    def _write(conn, key, rows, removed_ids):
+        if removed_ids:
+            conn.executemany(
+                "DELETE FROM shares WHERE server=? AND user=? AND root=? AND id=?",
+                [key + share_id for share_id in removed_ids]
+            )
+        if rows:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO shares (server, user, root, {', '.join(SHARE_FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' for _ in SHARE_FIELDS)})",
+                [key + row for row in rows]
+            )
+
+    def apply_changes(self, server, user, changed=(), removed=()):
+        # Cambios hechos desde el plugin (crear, ampliar, borrar) en todos los
+        # proyectos en caché que contienen la ruta del share. La ETag guardada
+        # deja de valer, así la próxima revalidación descarga el listado.
+        with self._lock:
+            conn = self._connection()
+            roots = [row[0] for row in conn.execute(
+                "SELECT root FROM projects WHERE server=? AND user=?", (server.rstrip('/'), user)
+            )]
+            with conn:
+                for root in roots:
+                    key = (server.rstrip('/'), user, root)
+                    rows = [
+                        tuple(share.get(field, '') for field in SHARE_FIELDS)
+                        for share in changed if path_in_root(share['path'], root)
+                    ]
+                    removed_ids = [(share['id'],) for share in removed if path_in_root(share['path'], root)]
+                    if rows or removed_ids:
+                        self._write(conn, key, rows, removed_ids)
+                        conn.execute("UPDATE projects SET etag=NULL WHERE server=? AND user=? AND root=?", key)
+
+    def clear(self):
+        with self._lock:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM shares")
+                conn.execute("DELETE FROM projects")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from datetime import date, timedelta
+from itertools import accumulate
+
+from Prism_NextCloudLinks_Maintenance import parse_expiration
+from Prism_NextCloudLinks_Shares import path_in_root
+
+
+PERMISSION_READ = "read"
+PERMISSION_WRITE = "write"
+
+EXPIRY_NONE = "none"
+EXPIRY_EXPIRED = "expired"
+EXPIRY_WEEK = "week"
+EXPIRY_LATER = "later"
+
+
+class TrieNode(object):
+    # Carpeta o fichero del árbol. Los shares están ordenados por ruta, así que
+    # los de un nodo y todo lo que cuelga de él ocupan el rango [start, end);
+    # los primeros `own` son los de la propia ruta.
+    __slots__ = ("name", "key", "path", "parent", "children", "start", "end", "own")
+
+    def __init__(self, name, path, parent, start):
+        self.name = name
+        self.key = name.lower()
+        self.path = path
+        self.parent = parent
+        self.children = []
+        self.start = start
+        self.end = start
+        self.own = 0
+
+
+class ShareTrie(object):
+    # Árbol de rutas de los shares relativo a la raíz del proyecto, con
+    # recuentos por nodo. Los filtros (texto, permisos, caducidad) no
+    # reconstruyen el árbol: marcan los shares que pasan y calculan una suma
+    # acumulada, así el recuento de cualquier nodo es una resta.
+    def __init__(self, root, shares, today=None):
+        self.root_path = root.rstrip('/')
+        today = today or date.today()
+        week_end = today + timedelta(days=7)
+
+        entries = []
+        for share in shares:
+            path = share.get('path', '')
+            rel = path[len(self.root_path):] if path_in_root(path, self.root_path) else path
+            parts = [part for part in rel.split('/') if part]
+            entries.append((tuple(part.lower() for part in parts), parts, share))
+        # Orden en profundidad: los shares de una ruta antes que los de sus subcarpetas
+        entries.sort(key=lambda entry: entry[0])
+
+        self.shares = [entry[2] for entry in entries]
+        self.search_keys = [f"{share.get('path', '')} {share.get('url', '')}".lower() for share in self.shares]
+        self.permissions = [
+            PERMISSION_READ if str(share.get('permissions')) == "1" else PERMISSION_WRITE for share in self.shares
+        ]
+
+        # Muchas fechas se repiten: cada texto distinto se interpreta una vez
+        categories = {}
+        self.expiry = []
+        for share in self.shares:
+            value = share.get('expiration') or ''
+            category = categories.get(value)
+            if category is None:
+                expiration = parse_expiration(value)
+                if expiration is None:
+                    category = EXPIRY_NONE
+                elif expiration < today:
+                    category = EXPIRY_EXPIRED
+                elif expiration <= week_end:
+                    category = EXPIRY_WEEK
+                else:
+                    category = EXPIRY_LATER
+                categories[value] = category
+            self.expiry.append(category)
+
+        # Los nodos abiertos son los de la ruta del share anterior: solo se
+        # cierran y crean los que cambian
+        self.root = TrieNode("", self.root_path, None, 0)
+        stack = [self.root]
+        previous = ()
+        for index, (keys, parts, share) in enumerate(entries):
+            depth = 0
+            limit = min(len(keys), len(previous))
+            while depth < limit and keys[depth] == previous[depth]:
+                depth += 1
+            while len(stack) > depth + 1:
+                stack.pop().end = index
+            for part in parts[depth:]:
+                parent = stack[-1]
+                child = TrieNode(part, parent.path + '/' + part, parent, index)
+                parent.children.append(child)
+                stack.append(child)
+            stack[-1].own += 1
+            previous = keys
+        for node in stack:
+            node.end = len(entries)
+
+        self.filter = None
+        self.visible = len(self.shares)
+        self._matched = None
+        self._prefix = None
+
+    def __len__(self):
+        return len(self.shares)
+
+    @staticmethod
+    def filter_key(text="", permission=None, expiry=None):
+        # Filtro normalizado tal como queda en `filter` (None: sin filtro)
+        text = text.strip().lower()
+        if not text and permission is None and expiry is None:
+            return None
+        return text, permission, expiry
+
+    def set_filter(self, text="", permission=None, expiry=None):
+        # Devuelve el número de shares que pasan el filtro
+        new_filter = self.filter_key(text, permission, expiry)
+        if new_filter is None:
+            self.filter, self._matched, self._prefix = None, None, None
+            self.visible = len(self.shares)
+            return self.visible
+        text = new_filter[0]
+
+        # Si solo se ha escrito más texto basta con revisar lo que ya pasaba
+        candidates = range(len(self.shares))
+        if self.filter and self._matched is not None and self.filter[1:] == new_filter[1:] \
+                and text.startswith(self.filter[0]):
+            candidates = self._matched
+
+        keys, permissions, expiries = self.search_keys, self.permissions, self.expiry
+        self._matched = [
+            index for index in candidates
+            if (not text or text in keys[index])
+            and (permission is None or permissions[index] == permission)
+            and (expiry is None or expiries[index] == expiry)
+        ]
+        marks = bytearray(len(self.shares))
+        for index in self._matched:
+            marks[index] = 1
+        self._prefix = list(accumulate(marks, initial=0))
+        self.filter = new_filter
+        self.visible = len(self._matched)
+        return self.visible
+
+    def count(self, node):
+        # Shares visibles del nodo y todo lo que cuelga de él
+        if self._prefix is None:
+            return node.end - node.start
+        return self._prefix[node.end] - self._prefix[node.start]
+
+    def is_visible(self, index):
+        return self._prefix is None or self._prefix[index + 1] != self._prefix[index]
+
+    def visible_children(self, node):
+        return [child for child in node.children if self.count(child)]
+
+    def visible_own(self, node):
+        # Índices de los shares de la propia ruta del nodo que pasan el filtro
+        return [index for index in range(node.start, node.start + node.own) if self.is_visible(index)]
+
+    def find(self, path):
+        # Nodo de una ruta remota (o None)
+        node = self.root
+        rel = path[len(self.root_path):] if path_in_root(path, self.root_path) else path
+        for key in (part.lower() for part in rel.split('/') if part):
+            node = next((child for child in node.children if child.key == key), None)
+            if node is None:
+                return None
+        return node
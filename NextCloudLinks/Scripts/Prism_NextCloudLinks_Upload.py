@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Prism_NextCloudLinks_Client import NextcloudAPIError, NextcloudError
+from Prism_NextCloudLinks_WebDAV import DAV_UPLOADS_ROOT, parse_multistatus
+
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+# Límites de la API de subida por trozos v2 de Nextcloud
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNKS = 10000
+# Para el timeout de MOVE: el servidor ensambla el fichero antes de responder
+ASSEMBLY_BYTES_PER_SECOND = 50 * 1024 * 1024
+# Para el timeout de los PUT: todo el cuerpo se envía dentro del timeout del
+# socket, así que depende del tamaño y no de la latencia aprendida
+MIN_UPLOAD_BYTES_PER_SECOND = 256 * 1024
+MIN_TRANSFER_TIMEOUT = 60
+
+
+def transfer_timeout(size, bytes_per_second=MIN_UPLOAD_BYTES_PER_SECOND):
+    return max(MIN_TRANSFER_TIMEOUT, size / bytes_per_second)
+
+
+def upload_id_for(nc_path, size, mtime):
+    # Mismo fichero y misma versión -> misma carpeta de subida, así se puede reanudar
+    key = f"{nc_path}|{size}|{mtime}".encode("utf-8")
+    return "prism-" + hashlib.sha1(key).hexdigest()
+
+
+def remote_join(folder, name):
+    return folder.rstrip('/') + '/' + name
+
+
+def wait_all(futures):
+    # Espera a todas; al primer error cancela las que no han empezado y lo relanza
+    try:
+        for future in as_completed(futures):
+            future.result()
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+class ChunkedUploader(object):
+    # Sube ficheros o carpetas a Nextcloud con WebDAV. Los ficheros grandes van
+    # por la API de subida por trozos v2: MKCOL de la carpeta de subida, PUT de
+    # los trozos en paralelo leídos de un mmap y MOVE de ".file" al destino.
+    # Si se interrumpe, la siguiente subida del mismo fichero solo envía los
+    # trozos que faltan.
+    def __init__(self, client, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, max_files=3,
+                 retries=2, on_progress=None):
+        self.client = client
+        self.chunk_size = max(MIN_CHUNK_SIZE, chunk_size)
+        self.max_workers = max_workers or client.pool_maxsize
+        self.max_files = max_files
+        self.retries = retries
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._total = 0
+        self._folders = set()
+
+    def _advance(self, nbytes):
+        with self._lock:
+            self._sent += nbytes
+            sent, total = self._sent, self._total
+        if self.on_progress:
+            self.on_progress(sent, total)
+
+    def plan(self, local_path, nc_path):
+        # [(fichero local, ruta remota, tamaño)] de lo que falta o ha cambiado en el servidor
+        if os.path.isdir(local_path):
+            files = []
+            for folder, dirnames, filenames in os.walk(local_path):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                rel_folder = os.path.relpath(folder, local_path).replace(os.sep, '/')
+                remote_folder = nc_path if rel_folder == '.' else remote_join(nc_path, rel_folder)
+                for filename in filenames:
+                    files.append((os.path.join(folder, filename), remote_join(remote_folder, filename)))
+        else:
+            files = [(local_path, nc_path)]
+
+        remote = {}
+        for remote_folder in sorted({f[1].rsplit('/', 1)[0] for f in files}):
+            status, entries = self.client.stat(remote_folder, depth="1")
+            if status == 207:
+                self._folders.add(remote_folder)
+                remote.update({entry["path"]: entry for entry in entries})
+
+        missing = []
+        for local_file, remote_file in files:
+            size = os.path.getsize(local_file)
+            entry = remote.get(remote_file)
+            if entry is None or entry["is_dir"] or entry["size"] != size:
+                missing.append((local_file, remote_file, size))
+        return missing
+
+    def upload(self, local_path, nc_path):
+        # Devuelve las rutas remotas subidas (vacío si ya estaba todo en el servidor)
+        missing = self.plan(local_path, nc_path)
+        if not missing:
+            return []
+
+        with self._lock:
+            self._sent = 0
+            self._total = sum(size for _, _, size in missing)
+
+        for remote_folder in sorted({remote_file.rsplit('/', 1)[0] for _, remote_file, _ in missing}):
+            self.ensure_folder(remote_folder)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as chunk_pool:
+            with ThreadPoolExecutor(max_workers=self.max_files) as file_pool:
+                wait_all([
+                    file_pool.submit(self.upload_file, local_file, remote_file, chunk_pool)
+                    for local_file, remote_file, _ in missing
+                ])
+
+        return [remote_file for _, remote_file, _ in missing]
+
+    def ensure_folder(self, nc_folder):
+        if not nc_folder or nc_folder == '/' or nc_folder in self._folders:
+            return
+
+        status, _ = self.client.stat(nc_folder)
+        if status != 207:
+            self.ensure_folder(nc_folder.rsplit('/', 1)[0])
+            response = self.client.request("MKCOL", self.client.dav_files_path(nc_folder))
+            # 405: la carpeta ya existe (la ha creado otro hilo o el cliente de sincronización)
+            if response.status_code not in (201, 405):
+                raise NextcloudAPIError(f"No se pudo crear la carpeta {nc_folder}: HTTP {response.status_code}")
+        self._folders.add(nc_folder)
+
+    def upload_file(self, local_file, nc_path, chunk_pool):
+        stat = os.stat(local_file)
+        headers = {
+            "OC-Total-Length": str(stat.st_size),
+            "X-OC-Mtime": str(int(stat.st_mtime))
+        }
+
+        with open(local_file, "rb") as f:
+            if stat.st_size == 0:
+                self._put_simple(nc_path, b"", headers)
+                return
+
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if stat.st_size <= self.chunk_size:
+                    view = memoryview(mapped)
+                    try:
+                        self._put_simple(nc_path, view, headers)
+                    finally:
+                        view.release()
+                    self._advance(stat.st_size)
+                else:
+                    self._upload_chunked(mapped, stat, nc_path, headers, chunk_pool)
+            finally:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # Queda alguna vista viva en la pila HTTP; se cierra al recogerse
+                    pass
+
+    def _put_simple(self, nc_path, data, headers):
+        response = self.client.request(
+            "PUT", self.client.dav_files_path(nc_path), data=data, headers=headers, retries=self.retries,
+            adaptive=False, breaker=False, timeout=transfer_timeout(len(data))
+        )
+        if response.status_code not in (201, 204):
+            raise NextcloudAPIError(f"Error subiendo {nc_path}: HTTP {response.status_code}\n{response.text[:200]}")
+
+    def _upload_chunked(self, mapped, stat, nc_path, headers, chunk_pool):
+        size = stat.st_size
+        chunk_size = max(self.chunk_size, -(-size // MAX_CHUNKS))
+        upload_dir = self.client.dav_uploads_path(upload_id_for(nc_path, size, int(stat.st_mtime)))
+        headers = dict(headers, Destination=self.client.url + self.client.dav_files_path(nc_path))
+
+        # Trozos que ya están en el servidor de una subida anterior
+        uploaded = self._uploaded_chunks(upload_dir)
+        if uploaded is None:
+            response = self.client.request("MKCOL", upload_dir, headers=headers)
+            if response.status_code not in (201, 405):
+                raise NextcloudAPIError(f"No se pudo iniciar la subida de {nc_path}: HTTP {response.status_code}")
+            uploaded = {}
+
+        futures = []
+        for number, start in enumerate(range(0, size, chunk_size), 1):
+            end = min(size, start + chunk_size)
+            if uploaded.get(number) == end - start:
+                self._advance(end - start)
+                continue
+            futures.append(chunk_pool.submit(self._put_chunk, mapped, upload_dir, number, start, end, headers))
+
+        wait_all(futures)
+
+        response = self.client.request(
+            "MOVE", upload_dir + "/.file", headers=dict(headers, Overwrite="T"), adaptive=False,
+            timeout=transfer_timeout(size, ASSEMBLY_BYTES_PER_SECOND)
+        )
+        if response.status_code not in (201, 204):
+            raise NextcloudAPIError(f"Error ensamblando {nc_path}: HTTP {response.status_code}\n{response.text[:200]}")
+
+    def _uploaded_chunks(self, upload_dir):
+        # {número de trozo: tamaño} o None si la carpeta de subida no existe
+        response = self.client.propfind(upload_dir, depth="1")
+        if response.status_code == 404:
+            return None
+        if response.status_code != 207:
+            raise NextcloudError(f"Error consultando la subida {upload_dir}: HTTP {response.status_code}")
+
+        chunks = {}
+        for entry in parse_multistatus(response.content, DAV_UPLOADS_ROOT):
+            name = entry["path"].rsplit('/', 1)[-1]
+            if not entry["is_dir"] and name.isdigit():
+                chunks[int(name)] = entry["size"]
+        return chunks
+
+    def _put_chunk(self, mapped, upload_dir, number, start, end, headers):
+        view = memoryview(mapped)[start:end]
+        try:
+            response = self.client.request(
+                "PUT", f"{upload_dir}/{number}", data=view, headers=headers, retries=self.retries,
+                adaptive=False, breaker=False, timeout=transfer_timeout(end - start)
+            )
+        finally:
+            try:
+                view.release()
+            except BufferError:
+                pass
+
+        if response.status_code not in (201, 204):
+            raise NextcloudAPIError(f"Error subiendo el trozo {number}: HTTP {response.status_code}")
+        self._advance(end - start)
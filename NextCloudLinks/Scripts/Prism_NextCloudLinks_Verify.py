@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import hashlib
+import mmap
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from Prism_NextCloudLinks_RemoteTree import RemoteTree
+from Prism_NextCloudLinks_Upload import remote_join, wait_all
+
+
+# Bloques de lectura del mmap: hashlib y zlib sueltan el GIL con bloques
+# grandes, así que varios hilos hashean en paralelo de verdad
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+DEFAULT_HASH_WORKERS = min(8, os.cpu_count() or 4)
+MAX_CACHED_CHECKSUMS = 200000
+
+VERIFY_OK = "ok"
+VERIFY_MISMATCH = "mismatch"
+VERIFY_MISSING = "missing"
+
+
+class _Adler32(object):
+    # Misma interfaz que hashlib para el ADLER32 del cliente de escritorio
+    def __init__(self):
+        self.value = 1
+
+    def update(self, data):
+        self.value = zlib.adler32(data, self.value)
+
+    def hexdigest(self):
+        return "%08x" % self.value
+
+
+# En orden de preferencia cuando el servidor tiene varios
+CHECKSUM_ALGORITHMS = OrderedDict([
+    ("SHA256", hashlib.sha256),
+    ("SHA1", hashlib.sha1),
+    ("MD5", hashlib.md5),
+    ("ADLER32", _Adler32)
+])
+
+
+def hash_file(path, algorithm, on_bytes=None):
+    # Hash de un fichero leído con mmap por bloques
+    hasher = CHECKSUM_ALGORITHMS[algorithm]()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hasher.hexdigest()
+
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            for start in range(0, len(view), HASH_BLOCK_SIZE):
+                block = view[start:start + HASH_BLOCK_SIZE]
+                hasher.update(block)
+                if on_bytes:
+                    on_bytes(len(block))
+                block.release()
+        finally:
+            view.release()
+            mapped.close()
+
+    return hasher.hexdigest()
+
+
+class ChecksumCache(object):
+    # Hashes ya calculados por (ruta, tamaño, mtime): un fichero que no ha
+    # cambiado no se vuelve a leer. Se descartan los más antiguos al llenarse.
+    def __init__(self, max_entries=MAX_CACHED_CHECKSUMS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(path, algorithm):
+        stat = os.stat(path)
+        return (os.path.normcase(os.path.abspath(path)), stat.st_size, stat.st_mtime_ns, algorithm)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def local_files(local_path, nc_path):
+    # [(fichero local, ruta remota)] de un fichero o de una carpeta entera
+    if not os.path.isdir(local_path):
+        return [(local_path, nc_path)]
+
+    pairs = []
+    for folder, dirnames, filenames in os.walk(local_path):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        rel_folder = os.path.relpath(folder, local_path).replace(os.sep, '/')
+        remote_folder = nc_path if rel_folder == '.' else remote_join(nc_path, rel_folder)
+        for filename in filenames:
+            pairs.append((os.path.join(folder, filename), remote_join(remote_folder, filename)))
+    return pairs
+
+
+class ShareVerifier(object):
+    # Comprueba que la copia en Nextcloud coincide con la local antes de
+    # compartirla: tamaño siempre y, si el servidor guarda checksums
+    # (oc:checksums), el hash del fichero local. Los hashes se calculan en un
+    # pool de hilos para que una carpeta de plano lea del disco en paralelo.
+    def __init__(self, client, cache=None, max_workers=DEFAULT_HASH_WORKERS, on_progress=None):
+        self.client = client
+        self.cache = cache if cache is not None else ChecksumCache()
+        self.max_workers = max_workers
+        self.on_progress = on_progress
+        self._hashed = 0
+        self._to_hash = 0
+        self._progress_lock = threading.Lock()
+
+    def _advance(self, nbytes):
+        with self._progress_lock:
+            self._hashed += nbytes
+            hashed = self._hashed
+        if self.on_progress:
+            self.on_progress(hashed, self._to_hash)
+
+    def verify(self, local_path, nc_path):
+        # [{local, remote, status, method, detail}] de cada fichero
+        remote = RemoteTree(nc_path)
+        remote.refresh(self.client)
+
+        results = []
+        pending = []
+        for local_file, remote_path in local_files(local_path, nc_path):
+            entry = remote.entry(remote_path)
+            result = {"local": local_file, "remote": remote_path, "status": VERIFY_OK, "method": "size", "detail": ""}
+            results.append(result)
+
+            size = os.path.getsize(local_file)
+            if entry is None:
+                result.update(status=VERIFY_MISSING, detail="No está en Nextcloud")
+            elif entry["size"] != size:
+                result.update(status=VERIFY_MISMATCH, detail=f"Tamaño {entry['size']} en Nextcloud, {size} en local")
+            else:
+                algorithm = next((name for name in CHECKSUM_ALGORITHMS if name in entry["checksums"]), None)
+                if algorithm:
+                    result["method"] = algorithm
+                    pending.append((result, algorithm, entry["checksums"][algorithm], size))
+
+        self._to_hash = sum(item[3] for item in pending)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._check, *item[:3]) for item in pending]
+            wait_all(futures)
+
+        return results
+
+    def _check(self, result, algorithm, expected):
+        key = self.cache.key(result["local"], algorithm)
+        digest = self.cache.get(key)
+        if digest is None:
+            digest = hash_file(result["local"], algorithm, self._advance)
+            self.cache.put(key, digest)
+        else:
+            self._advance(key[1])
+
+        if digest != expected:
+            result.update(status=VERIFY_MISMATCH, detail=f"{algorithm} distinto del de Nextcloud")
+
+
+def verification_problems(results):
+    return [result for result in results if result["status"] != VERIFY_OK]
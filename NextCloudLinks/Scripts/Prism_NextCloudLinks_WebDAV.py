@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+####################################################
+#
+# PRISM - Pipeline for animation and VFX projects
+#
+# www.prism-pipeline.com
+#
+# contact: contact@prism-pipeline.com
+#
+####################################################
+#
+#
+# Copyright (C) 2016-2023 Richard Frangenberg
+# Copyright (C) 2023 Prism Software GmbH
+#
+# Licensed under GNU LGPL-3.0-or-later
+#
+# This file is part of Prism.
+#
+# Prism is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Prism is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Prism.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from email.utils import parsedate_to_datetime
+from urllib.parse import unquote
+
+
+DAV_FILES_ROOT = "/remote.php/dav/files"
+DAV_UPLOADS_ROOT = "/remote.php/dav/uploads"
+
+DAV_NS = "{DAV:}"
+OC_NS = "{http://owncloud.org/ns}"
+
+PROPFIND_BODY = (
+    b'<?xml version="1.0"?>'
+    b'<d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">'
+    b'<d:prop><d:resourcetype/><d:getcontentlength/><d:getetag/><d:getlastmodified/>'
+    b'<oc:size/><oc:checksums/></d:prop>'
+    b'</d:propfind>'
+)
+
+
+def _parse_mtime(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_multistatus(body, href_prefix):
+    # Respuesta 207 de un PROPFIND -> [{path, is_dir, size, etag, mtime, checksums}].
+    # `href_prefix` es la parte del href que no forma parte de la ruta de Nextcloud
+    # (p. ej. "/remote.php/dav/files/usuario").
+    import xml.etree.ElementTree as ET
+
+    entries = []
+    for response in ET.fromstring(body).iter(DAV_NS + "response"):
+        href = unquote(response.findtext(DAV_NS + "href") or "")
+        start = href.find(href_prefix)
+        path = "/" + href[start + len(href_prefix):].strip("/") if start != -1 else href
+
+        prop = None
+        for propstat in response.iter(DAV_NS + "propstat"):
+            if " 200 " in (propstat.findtext(DAV_NS + "status") or ""):
+                prop = propstat.find(DAV_NS + "prop")
+                break
+        if prop is None:
+            continue
+
+        is_dir = prop.find(f"{DAV_NS}resourcetype/{DAV_NS}collection") is not None
+        size = prop.findtext(DAV_NS + "getcontentlength") or prop.findtext(OC_NS + "size") or "0"
+        checksums = {}
+        for checksum in prop.iter(OC_NS + "checksum"):
+            # "SHA1:abc MD5:def ADLER32:..."
+            for item in (checksum.text or "").split():
+                algorithm, _, value = item.partition(":")
+                if value:
+                    checksums[algorithm.upper()] = value.lower()
+
+        entries.append({
+            "path": path,
+            "is_dir": is_dir,
+            "size": int(size),
+            "etag": (prop.findtext(DAV_NS + "getetag") or "").strip('"'),
+            "mtime": _parse_mtime(prop.findtext(DAV_NS + "getlastmodified")),
+            "checksums": checksums
+        })
+
+    return entries
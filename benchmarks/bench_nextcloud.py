@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#
+# Benchmark del plugin NextCloudLinks contra el servidor falso de
+# fake_nextcloud.py. Usa el código real del plugin (requests, qtpy y los
+# módulos de Prism tienen que estar instalados) y guarda los resultados en JSON
+# para comparar versiones:
+#
+#   python bench_nextcloud.py --prism-scripts "C:/Program Files/Prism2/Scripts" \
+#       --sizes 100,10000,100000 --latency-ms 20 --output bench_v2.json
+#   python bench_nextcloud.py ... --compare bench_v1.json
+
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_SCRIPTS = os.path.join(os.path.dirname(HERE), "NextCloudLinks", "Scripts")
+
+from fake_nextcloud import FakeNextcloudState, start_server
+
+
+def plugin_functions():
+    import Prism_NextCloudLinks_Functions
+    return Prism_NextCloudLinks_Functions
+
+
+class BenchCore(object):
+    # Sustituto mínimo del core de Prism con lo que el plugin usa fuera de la UI
+    def __init__(self, project_path, prefs_path):
+        self.projectPath = project_path
+        self.prefs_path = prefs_path
+        self.callbacks = self
+        self.config = {}
+        self.errors = []
+
+    def registerCallback(self, *args, **kwargs):
+        pass
+
+    def getUserPrefConfigPath(self):
+        return self.prefs_path
+
+    def getConfig(self, cat=None, param=None, config=None, **kwargs):
+        return self.config.get(cat, {}).get(param)
+
+    def setConfig(self, cat=None, param=None, val=None, config=None, **kwargs):
+        self.config.setdefault(cat, {})[param] = val
+
+    def writeErrorLog(self, text, data=None):
+        self.errors.append((text, data))
+
+    def copyToClipboard(self, text, file=False):
+        pass
+
+    def popup(self, text):
+        pass
+
+
+class BenchProjectBrowser(object):
+    def __init__(self):
+        self.tabs = {}
+
+    def addTab(self, name, widget):
+        self.tabs[name] = widget
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+class Bench(object):
+    def __init__(self, args, shares):
+        self.args = args
+        self.shares = shares
+        self.tmp = tempfile.mkdtemp(prefix="nc_bench_")
+        self.state = FakeNextcloudState(
+            shares, project_fraction=args.project_fraction,
+            latency_ms=args.latency_ms, error_rate=args.error_rate
+        )
+        self.server, self.url = start_server(self.state)
+
+        # Copia local del proyecto: las mismas carpetas que tiene el servidor
+        self.project_path = os.path.join(self.tmp, "PROYECTOS", "bench")
+        for folder in [""] + self.state.project_folders():
+            os.makedirs(os.path.join(self.project_path, folder), exist_ok=True)
+        self.share_folder = os.path.join(self.project_path, (self.state.project_folders() or [""])[-1])
+        self._new_files = 0
+
+        self.core = BenchCore(self.project_path, os.path.join(self.tmp, "Prism.json"))
+        self.plugin = self.make_plugin()
+        self.plugin.save_nextcloud_credentials("bench", "bench", self.url)
+
+    def make_plugin(self):
+        from Prism_NextCloudLinks_init import Prism_NextCloudLinks
+        return Prism_NextCloudLinks(self.core)
+
+    def close(self):
+        self.plugin.reset_ocs_client()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def new_local_file(self):
+        self._new_files += 1
+        path = os.path.join(self.share_folder, f"bench_new_{self._new_files:06d}.exr")
+        open(path, "wb").close()
+        return path
+
+    def measure(self, name, operation, iterations):
+        # Latencias, peticiones por operación y memoria pico (en una pasada aparte)
+        timings = []
+        requests_before = self.state.total_requests()
+        bytes_before = self.state.bytes_sent
+        for _ in range(iterations):
+            run = operation()
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        requests_total = self.state.total_requests() - requests_before
+        bytes_total = self.state.bytes_sent - bytes_before
+
+        tracemalloc.start()
+        operation()()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        result = {
+            "shares": self.shares,
+            "operation": name,
+            "iterations": iterations,
+            "mean_ms": sum(timings) / len(timings),
+            "p50_ms": percentile(timings, 0.5),
+            "p90_ms": percentile(timings, 0.9),
+            "p99_ms": percentile(timings, 0.99),
+            "max_ms": max(timings),
+            "requests_per_op": requests_total / float(iterations),
+            "bytes_per_op": bytes_total / float(iterations),
+            "peak_memory_kb": peak / 1024.0,
+            "errors_logged": len(self.core.errors)
+        }
+        self.core.errors = []
+        return result
+
+    def op_startup(self):
+        def run():
+            plugin = self.make_plugin()
+            if plugin.startup_time_ms > plugin_functions().STARTUP_BUDGET_MS:
+                self.core.errors.append(("startup", f"{plugin.startup_time_ms:.1f} ms"))
+        return run
+
+    def op_listing(self, mode):
+        def prepare():
+            self.plugin.save_nextcloud_settings({"share_listing_mode": mode})
+            self.plugin.share_index.invalidate()
+            return lambda: self.plugin.get_all_project_public_shares(force=True)
+        return prepare
+
+    def op_share_link(self):
+        # Comprobación de enlace existente + creación, con el índice vacío
+        from Prism_NextCloudLinks_Client import NextcloudError
+
+        path = self.new_local_file()
+        self.plugin.share_index.invalidate()
+
+        def run():
+            try:
+                self.plugin.resolve_share_link(path, "1", None)
+            except NextcloudError as e:
+                self.core.errors.append(("share_link", str(e)))
+        return run
+
+    def op_tab_load(self, app, tab):
+        from qtpy.QtCore import QCoreApplication
+
+        def run():
+            tab.load_data(force=True)
+            while tab._worker is not None or tab._trie_worker is not None:
+                QCoreApplication.processEvents()
+                time.sleep(0.001)
+            app.processEvents()
+
+        def prepare():
+            self.plugin.share_index.invalidate()
+            return run
+        return prepare
+
+    def run(self):
+        iterations = self.args.iterations
+        results = [
+            self.measure("startup", self.op_startup, iterations),
+            self.measure("project_listing_full", self.op_listing("full"), iterations),
+            self.measure("project_listing_scoped", self.op_listing("scoped"), iterations),
+            self.measure("share_link_check_create", self.op_share_link, iterations),
+        ]
+
+        if not self.args.no_ui:
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            from qtpy.QtWidgets import QApplication
+            app = QApplication.instance() or QApplication([])
+            browser = BenchProjectBrowser()
+            self.plugin.nextcloudTabLinksEdit(browser)
+            tab = browser.tabs["Nextcloud"]
+            results.append(self.measure("tab_load_data", lambda: self.op_tab_load(app, tab)(), iterations))
+
+        return results
+
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = {(r["shares"], r["operation"]): r for r in json.load(f)["results"]}
+
+    print(f"\nComparación con {previous_path} (p50 actual / anterior):")
+    for result in results:
+        old = previous.get((result["shares"], result["operation"]))
+        if not old or not old["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"]
+        flag = "  <-- REGRESIÓN" if ratio > 1.2 else ""
+        print(f"  {result['shares']:>7} {result['operation']:<26} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NextCloudLinks benchmark")
+    parser.add_argument("--prism-scripts", help="Carpeta Scripts de Prism (para importar PrismUtils)")
+    parser.add_argument("--sizes", default="100,10000,100000")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--project-fraction", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-ui", action="store_true", help="No medir la pestaña de Qt")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    if args.prism_scripts:
+        sys.path.insert(0, args.prism_scripts)
+    sys.path.insert(0, PLUGIN_SCRIPTS)
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        bench = Bench(args, size)
+        try:
+            for result in bench.run():
+                results.append(result)
+                print(f"{size:>7} {result['operation']:<26} p50 {result['p50_ms']:9.2f} ms  "
+                      f"p99 {result['p99_ms']:9.2f} ms  req/op {result['requests_per_op']:7.1f}  "
+                      f"peak {result['peak_memory_kb']:10.1f} KB")
+        finally:
+            bench.close()
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "date": datetime.now().isoformat(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "args": vars(args)
+            },
+            "results": results
+        }, f, indent=4)
+    print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+#
+# Servidor local que imita la API OCS de shares y un WebDAV mínimo de
+# Nextcloud para medir el plugin sin tocar producción.
+#
+#   python fake_nextcloud.py --shares 10000 --latency-ms 30 --error-rate 0.01
+
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+
+SHARES_ENDPOINT = "/ocs/v2.php/apps/files_sharing/api/v1/shares"
+ACTIVITY_ENDPOINT = "/ocs/v2.php/apps/activity/api/v2/activity/files_sharing"
+DAV_FILES_PREFIX = "/remote.php/dav/files/"
+DAV_UPLOADS_PREFIX = "/remote.php/dav/uploads/"
+
+
+class FakeNextcloudState(object):
+    # Shares sintéticos y contadores de peticiones, compartidos por los hilos del servidor
+    def __init__(self, shares=1000, project_root="/PROYECTOS/bench", project_fraction=0.1,
+                 files_per_folder=20, latency_ms=0, error_rate=0.0, seed=1):
+        self.project_root = project_root
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_sent = 0
+        self.shares = {}
+        self.by_path = {}
+        self.by_parent = {}
+        self.folders = set()
+        self.next_id = 1
+        self._full_payload = None
+        # Ficheros subidos por WebDAV: ruta -> tamaño; subidas por trozos: carpeta -> {trozo: bytes}
+        self.files = {}
+        self.uploads = {}
+        # Versión de cada carpeta: como en Nextcloud, un cambio dentro cambia la etag de todos los padres
+        self.folder_versions = {}
+        # Checksum declarado por el cliente (cabecera OC-Checksum), como lo guarda Nextcloud
+        self.checksums = {}
+        # Feed de actividad de la app de compartir; activity_enabled=False simula un servidor sin la app
+        self.activities = []
+        self.next_activity = 1000
+        self.activity_enabled = True
+
+        project_shares = int(shares * project_fraction)
+        for number in range(shares):
+            if number < project_shares:
+                root = project_root
+            else:
+                root = f"/PROYECTOS/other_{number % 25:02d}"
+            folder_number = number // files_per_folder
+            folder = f"{root}/seq_{folder_number // 10:03d}/shot_{folder_number % 10:03d}"
+            self.add_share(f"{folder}/render_{number:06d}.exr", permissions="1" if number % 3 else "23",
+                           expiration="" if number % 4 else "2030-01-01 00:00:00")
+
+    def project_folders(self):
+        # Carpetas del proyecto de prueba, relativas a su raíz
+        prefix = self.project_root + "/"
+        return sorted(f[len(prefix):] for f in self.folders if f.startswith(prefix))
+
+    def add_folder(self, path):
+        parts = path.rstrip("/").split("/")
+        for depth in range(2, len(parts) + 1):
+            self.folders.add("/".join(parts[:depth]))
+        self.touch(path)
+
+    def touch(self, path):
+        parts = path.rstrip("/").split("/")
+        for depth in range(1, len(parts)):
+            folder = "/".join(parts[:depth]) or "/"
+            self.folder_versions[folder] = self.folder_versions.get(folder, 0) + 1
+
+    def add_share(self, path, permissions="1", expiration=""):
+        share = {
+            "id": str(self.next_id),
+            "share_type": 3,
+            "path": path,
+            "url": f"https://cloud.example.com/s/{self.next_id:010d}",
+            "permissions": int(permissions),
+            "expiration": expiration or None,
+            "stime": int(time.time()),
+            "item_type": "file"
+        }
+        self.next_id += 1
+        self.shares[share["id"]] = share
+        self.by_path.setdefault(path, []).append(share)
+        parent = path.rsplit("/", 1)[0]
+        self.by_parent.setdefault(parent, []).append(share)
+
+        # Registrar todas las carpetas intermedias
+        parts = parent.split("/")
+        for depth in range(2, len(parts) + 1):
+            self.folders.add("/".join(parts[:depth]))
+
+        self._full_payload = None
+        return share
+
+    def log_activity(self, subject, path):
+        self.activities.append({
+            "activity_id": self.next_activity,
+            "app": "files_sharing",
+            "type": "public_links",
+            "subject": subject,
+            "object_type": "files",
+            "object_name": path,
+            "datetime": formatdate(usegmt=True)
+        })
+        self.next_activity += 1
+
+    def expire_activities(self, keep=0):
+        # Como la limpieza de actividad antigua del servidor
+        del self.activities[:max(0, len(self.activities) - keep)]
+
+    def count(self, key):
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def full_payload(self):
+        # (cuerpo, etag) del listado completo; cambia con cada alta, edición o borrado
+        with self.lock:
+            if self._full_payload is None:
+                body = ocs_payload(list(self.shares.values()))
+                self._full_payload = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+            return self._full_payload
+
+
+def ocs_payload(data, status=200, message="OK"):
+    return json.dumps({
+        "ocs": {
+            "meta": {"status": "ok" if status < 400 else "failure", "statuscode": status, "message": message},
+            "data": data
+        }
+    }).encode("utf-8")
+
+
+class FakeNextcloudHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.state.lock:
+            self.state.bytes_sent += len(body)
+
+    def _simulate(self, key):
+        self.state.count(key)
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.error_rate and self.state.random.random() < self.state.error_rate:
+            self._send(503, ocs_payload([], 503, "Service Unavailable"))
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/status.php":
+            self.state.count("status")
+            self._send(200, json.dumps({"installed": True, "maintenance": False}).encode("utf-8"))
+            return
+
+        if url.path == ACTIVITY_ENDPOINT:
+            self._send_activity(query)
+            return
+
+        if url.path != SHARES_ENDPOINT:
+            self._send(404, ocs_payload([], 404, "Not found"))
+            return
+
+        if "path" not in query:
+            if self._simulate("shares_all"):
+                body, etag = self.state.full_payload()
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", headers={"ETag": etag})
+                else:
+                    self._send(200, body, headers={"ETag": etag})
+            return
+
+        path = query["path"].rstrip("/")
+        key = "shares_subfiles" if query.get("subfiles") == "true" else "shares_path"
+        if not self._simulate(key):
+            return
+
+        if key == "shares_subfiles":
+            if path not in self.state.folders:
+                self._send(404, ocs_payload([], 404, "Wrong path, file/folder doesn't exist"))
+                return
+            data = self.state.by_parent.get(path, [])
+        else:
+            data = self.state.by_path.get(path, [])
+
+        self._send(200, ocs_payload(data))
+
+    def _send_activity(self, query):
+        if not self.state.activity_enabled:
+            self._send(404, ocs_payload([], 404, "Not found"))
+            return
+        if not self._simulate("activity"):
+            return
+
+        since = int(query.get("since") or 0)
+        limit = int(query.get("limit") or 50)
+        with self.state.lock:
+            activities = list(self.state.activities)
+        if query.get("sort") == "desc":
+            page = [a for a in reversed(activities) if not since or a["activity_id"] < since][:limit]
+        else:
+            page = [a for a in activities if a["activity_id"] > since][:limit]
+
+        if not page:
+            self._send(304, b"")
+            return
+        self._send(200, ocs_payload(page), headers={
+            "X-Activity-First-Known": str(activities[0]["activity_id"]),
+            "X-Activity-Last-Given": str(page[-1]["activity_id"])
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+
+        if url.path != SHARES_ENDPOINT:
+            self._send(404, ocs_payload([], 404, "Not found"))
+            return
+
+        if not self._simulate("shares_create"):
+            return
+
+        with self.state.lock:
+            share = self.state.add_share(
+                form.get("path", ""),
+                permissions=form.get("permissions", "1"),
+                expiration=(form.get("expireDate") + " 00:00:00") if form.get("expireDate") else ""
+            )
+            self.state.log_activity("shared_link_self", share["path"])
+        self._send(200, ocs_payload(share))
+
+    def _share_from_path(self, url):
+        # /shares/<id> -> share, o None si no existe
+        if not url.path.startswith(SHARES_ENDPOINT + "/"):
+            return None
+        return self.state.shares.get(url.path[len(SHARES_ENDPOINT) + 1:])
+
+    def _send_missing_share(self):
+        self._send(404, ocs_payload([], 404, "Wrong share ID, share doesn't exist"))
+
+    def _dav_path(self, prefix):
+        # /remote.php/dav/<files|uploads>/<usuario>/<ruta> -> "/<ruta>"
+        rest = unquote(urlparse(self.path).path[len(prefix):])
+        return "/" + rest.partition("/")[2].strip("/")
+
+    def do_MKCOL(self):
+        url = urlparse(self.path)
+        if not self._simulate("mkcol"):
+            return
+
+        with self.state.lock:
+            if url.path.startswith(DAV_UPLOADS_PREFIX):
+                path = self._dav_path(DAV_UPLOADS_PREFIX)
+                exists = path in self.state.uploads
+                self.state.uploads.setdefault(path, {})
+            else:
+                path = self._dav_path(DAV_FILES_PREFIX)
+                exists = path in self.state.folders
+                self.state.add_folder(path)
+        self._send(405 if exists else 201, b"")
+
+    def do_MOVE(self):
+        # Ensamblado de una subida por trozos: MOVE <carpeta de subida>/.file
+        if not self._simulate("move"):
+            return
+
+        upload_dir = self._dav_path(DAV_UPLOADS_PREFIX).rsplit("/", 1)[0]
+        destination = urlparse(self.headers.get("Destination", "")).path
+        with self.state.lock:
+            chunks = self.state.uploads.pop(upload_dir, None)
+            if chunks is not None:
+                target = "/" + unquote(destination[len(DAV_FILES_PREFIX):]).partition("/")[2].strip("/")
+                self.state.files[target] = sum(chunks.values())
+                self.state.touch(target)
+                self._store_checksum(target)
+        if chunks is None:
+            self._send(404, b"")
+        elif self.state.files[target] != int(self.headers.get("OC-Total-Length") or 0):
+            self._send(400, b"Chunks do not add up to OC-Total-Length")
+        else:
+            self._send(201, b"")
+
+    def _receive_file(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        received = 0
+        while received < length:
+            received += len(self.rfile.read(min(1024 * 1024, length - received)))
+
+        url = urlparse(self.path)
+        if not self._simulate("dav_put"):
+            return
+
+        with self.state.lock:
+            if url.path.startswith(DAV_UPLOADS_PREFIX):
+                upload_dir, _, chunk = self._dav_path(DAV_UPLOADS_PREFIX).rpartition("/")
+                if upload_dir not in self.state.uploads:
+                    status = 404
+                else:
+                    self.state.uploads[upload_dir][chunk] = received
+                    status = 201
+            else:
+                path = self._dav_path(DAV_FILES_PREFIX)
+                self.state.add_folder(path.rsplit("/", 1)[0])
+                status = 204 if path in self.state.files else 201
+                self.state.files[path] = received
+                self.state.touch(path)
+                self._store_checksum(path)
+        self._send(status, b"")
+
+    def _store_checksum(self, path):
+        checksum = self.headers.get("OC-Checksum")
+        if checksum:
+            self.state.checksums[path] = checksum
+        else:
+            self.state.checksums.pop(path, None)
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        if url.path.startswith((DAV_FILES_PREFIX, DAV_UPLOADS_PREFIX)):
+            self._receive_file()
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        if not self._simulate("shares_update"):
+            return
+
+        with self.state.lock:
+            share = self._share_from_path(url)
+            if share is not None and "expireDate" in form:
+                share["expiration"] = (form["expireDate"] + " 00:00:00") if form["expireDate"] else None
+            if share is not None and "permissions" in form:
+                share["permissions"] = int(form["permissions"])
+            self.state._full_payload = None
+        if share is None:
+            self._send_missing_share()
+            return
+        self._send(200, ocs_payload(share))
+
+    def do_DELETE(self):
+        url = urlparse(self.path)
+        if not self._simulate("shares_delete"):
+            return
+
+        with self.state.lock:
+            share = self._share_from_path(url)
+            if share is not None:
+                del self.state.shares[share["id"]]
+            if share is not None:
+                self.state.by_path[share["path"]].remove(share)
+                self.state.by_parent[share["path"].rsplit("/", 1)[0]].remove(share)
+                self.state._full_payload = None
+                self.state.log_activity("unshared_link_self", share["path"])
+        if share is None:
+            self._send_missing_share()
+            return
+        self._send(200, ocs_payload([]))
+
+    def do_PROPFIND(self):
+        # WebDAV mínimo: Depth 0/1/infinity sobre las carpetas, los ficheros con shares y los subidos
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if not url.path.startswith((DAV_FILES_PREFIX, DAV_UPLOADS_PREFIX)):
+            self._send(404, b"")
+            return
+
+        if not self._simulate("propfind"):
+            return
+
+        if url.path.startswith(DAV_UPLOADS_PREFIX):
+            self._propfind_upload(url)
+            return
+
+        rest = unquote(url.path[len(DAV_FILES_PREFIX):])
+        user, _, path = rest.partition("/")
+        path = "/" + path.strip("/")
+        depth = self.headers.get("Depth", "1")
+
+        entries = []
+        if path in self.state.folders or path == "/":
+            entries.append((path, True))
+            if depth != "0":
+                prefix = path.rstrip("/") + "/"
+
+                def listed(child):
+                    return child.startswith(prefix) and (depth == "infinity" or "/" not in child[len(prefix):])
+
+                entries.extend((folder, True) for folder in sorted(self.state.folders) if listed(folder))
+                if depth == "infinity":
+                    entries.extend((file_path, False) for file_path in self.state.by_path if listed(file_path))
+                else:
+                    entries.extend((share["path"], False) for share in self.state.by_parent.get(path, []))
+                entries.extend((file_path, False) for file_path in list(self.state.files)
+                               if listed(file_path) and file_path not in self.state.by_path)
+        elif path in self.state.by_path or path in self.state.files:
+            entries.append((path, False))
+        else:
+            self._send(404, b"")
+            return
+
+        # En las carpetas el tercer valor es su versión (solo se usa para la etag)
+        self._send_multistatus(DAV_FILES_PREFIX + quote(user), [
+            (entry_path, is_folder, self.state.folder_versions.get(entry_path, 0) if is_folder
+             else self.state.files.get(entry_path, 1048576)) for entry_path, is_folder in entries
+        ])
+
+    def _propfind_upload(self, url):
+        rest = unquote(url.path[len(DAV_UPLOADS_PREFIX):])
+        user, _, path = rest.partition("/")
+        path = "/" + path.strip("/")
+        with self.state.lock:
+            chunks = dict(self.state.uploads.get(path) or {}) if path in self.state.uploads else None
+        if chunks is None:
+            self._send(404, b"")
+            return
+
+        entries = [(path, True, 0)] + [(f"{path}/{name}", False, size) for name, size in chunks.items()]
+        self._send_multistatus(DAV_UPLOADS_PREFIX + quote(user), entries)
+
+    def _send_multistatus(self, href_prefix, entries):
+        responses = []
+        for entry_path, is_folder, entry_size in entries:
+            href = href_prefix + quote(entry_path) + ("/" if is_folder else "")
+            etag = '"%08x"' % (hash((entry_path, entry_size)) & 0xffffffff)
+            resource = "<d:collection/>" if is_folder else ""
+            size = "" if is_folder else f"<d:getcontentlength>{entry_size}</d:getcontentlength>"
+            checksum = self.state.checksums.get(entry_path) if href_prefix.startswith(DAV_FILES_PREFIX) else None
+            if checksum:
+                size += f"<oc:checksums><oc:checksum>{checksum}</oc:checksum></oc:checksums>"
+            responses.append(
+                f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>"
+                f"<d:getetag>{etag}</d:getetag><d:resourcetype>{resource}</d:resourcetype>{size}"
+                f"<d:getlastmodified>{formatdate(0, usegmt=True)}</d:getlastmodified>"
+                f"</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+            )
+
+        body = ('<?xml version="1.0"?><d:multistatus xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">'
+                + "".join(responses) + "</d:multistatus>").encode("utf-8")
+        self._send(207, body, "application/xml; charset=utf-8")
+
+
+def start_server(state, host="127.0.0.1", port=0):
+    # Arranca el servidor en un hilo y devuelve (servidor, url base)
+    handler = type("Handler", (FakeNextcloudHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Nextcloud OCS/WebDAV server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--shares", type=int, default=1000)
+    parser.add_argument("--project-fraction", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = FakeNextcloudState(args.shares, project_fraction=args.project_fraction,
+                               latency_ms=args.latency_ms, error_rate=args.error_rate)
+    server, url = start_server(state, port=args.port)
+    print(f"Fake Nextcloud listening on {url} with {args.shares} shares")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()